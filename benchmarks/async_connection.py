@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import libtwitch
+from benchmarks import fake_tmi
+
+EGRESS_RATE = 10000 # Do not let the egress rate limit the benchmark
+
+class CountingConnection(libtwitch.IrcConnection):
+  def on_ready(self):
+    self.count = 0
+
+  def on_privmsg(self, msg : libtwitch.IrcMessage):
+    self.count += 1
+
+class AsyncCountingConnection(libtwitch.AsyncIrcConnection):
+  def on_ready(self):
+    self.count = 0
+
+  def on_privmsg(self, msg : libtwitch.IrcMessage):
+    self.count += 1
+
+def _run_threaded(port : int, connections : int) -> tuple[int, float, float]:
+  wall_start = time.perf_counter()
+  cpu_start = time.process_time()
+  clients = []
+  for i in range(connections):
+    client = CountingConnection("benchbot%s" % i, "oauth:none")
+    client.connect(fake_tmi.HOST, port)
+    client.join_channel("channel%s" % i)
+    client.start(EGRESS_RATE)
+    clients.append(client)
+  for client in clients:
+    client._ingress_thread.join()
+    client._dispatcher.wait_idle()
+  wall = time.perf_counter() - wall_start
+  cpu = time.process_time() - cpu_start
+  for client in clients:
+    client.stop()
+  return sum(client.count for client in clients), wall, cpu
+
+async def _run_async_impl(port : int, connections : int) -> int:
+  clients = []
+  for i in range(connections):
+    client = AsyncCountingConnection("benchbot%s" % i, "oauth:none")
+    await client.connect(fake_tmi.HOST, port)
+    client.join_channel("channel%s" % i)
+    client.start(EGRESS_RATE)
+    clients.append(client)
+  for client in clients:
+    await client.wait_closed()
+  count = sum(client.count for client in clients)
+  for client in clients:
+    await client.stop()
+  return count
+
+def _run_async(port : int, connections : int) -> tuple[int, float, float]:
+  wall_start = time.perf_counter()
+  cpu_start = time.process_time()
+  count = asyncio.run(_run_async_impl(port, connections))
+  return count, time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+def run(connection_counts : tuple = (1, 10, 50), messages_per_connection : int = 20000) -> dict[str, dict]:
+  port = fake_tmi.free_port()
+  server = fake_tmi.start_process(port, messages_per_connection)
+  results = {}
+  try:
+    for connections in connection_counts:
+      for name, func in [("threaded", _run_threaded), ("asyncio", _run_async)]:
+        count, wall, cpu = func(port, connections)
+        results["%s_%s" % (name, connections)] = {
+          "connections": connections,
+          "messages": count,
+          "messages_per_second": count / wall,
+          "messages_per_cpu_second": count / cpu,
+        }
+  finally:
+    server.terminate()
+  return results
+
+if __name__ == '__main__':
+  for name, result in run().items():
+    print("%-12s %4d connections %10.0f msg/s %10.0f msg/cpu-s" % (name, result["connections"], result["messages_per_second"], result["messages_per_cpu_second"]))
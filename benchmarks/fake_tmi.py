@@ -0,0 +1,395 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import multiprocessing
+import random
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from libtwitch.irc.egress import EgressLatency, RateWindow, JOIN_WINDOW_SECONDS, LIMIT_JOIN, LIMIT_MODERATOR, LIMIT_USER, WINDOW_SECONDS
+from libtwitch.irc.parser import parse_line
+
+HOST = "127.0.0.1"
+SERVER = "tmi.twitch.tv"
+
+PRIVMSG_FORMAT = "@badge-info=;badges=;color=#1E90FF;display-name=Viewer%s;emotes=;flags=;id=%s;mod=0;room-id=12345;" \
+                 "subscriber=0;tmi-sent-ts=1633000000000;turbo=0;user-id=%s;user-type= " \
+                 ":viewer%s!viewer%s@viewer%s.tmi.twitch.tv PRIVMSG #%s :message number %s Kappa"
+
+CHAT_FORMAT = "@badge-info=;badges=%s;color=#1E90FF;display-name=%s;emotes=%s;flags=;id=%s;mod=0;room-id=%s;" \
+              "subscriber=%s;tmi-sent-ts=%d;turbo=0;user-id=%s;user-type= :%s!%s@%s.tmi.twitch.tv PRIVMSG #%s :%s"
+
+EMOTE_TEXTS = [
+  ("Kappa", "25"),
+  ("PogChamp", "305954156"),
+  ("LUL", "425618"),
+  ("BibleThump", "86"),
+]
+CAPS_TEXTS = ["THIS IS THE BEST STREAM EVER", "WHAT WAS THAT PLAY", "LETS GOOOOO CHAT"]
+LINK_TEXTS = ["check this out https://example.com/clip", "free followers at example.org", "see www.example.net/watch?v=1"]
+COMMAND_TEXTS = ["!8ball will we win?", "!8ball is this real?", "!quote"]
+PLAIN_TEXTS = ["hello chat", "how is everyone doing", "nice play", "gg", "what game is this", "first time here, love it"]
+
+@dataclass
+class LoadProfile:
+  """
+  the chat load the server synthesizes for every channel the bot joins
+  the ratios are the share of messages of each kind, the rest is plain chat
+  """
+  messages_per_second : float = 20.0 # per channel
+  chatters : int = 500 # per channel
+  emote_ratio : float = 0.2
+  caps_ratio : float = 0.05
+  link_ratio : float = 0.02
+  command_ratio : float = 0.02
+  sub_ratio : float = 0.005
+  raid_interval : float = 0.0 # seconds between raids per channel, 0 disables raids
+  raid_size : int = 1000 # chatters joining with a raid
+  raid_messages : int = 300 # messages sent as fast as possible right after a raid
+  duration : float = 30.0 # seconds of load after the bot joined the first channel
+  grace : float = 3.0 # seconds to wait for late replies before the server closes the connection
+  bot_is_moderator : bool = True
+  ping_interval : float = 60.0
+  seed : Optional[int] = None
+
+class _Client:
+  """
+  the state of one bot connection
+  """
+  def __init__(self, writer : asyncio.StreamWriter, profile : Optional[LoadProfile]):
+    self.writer : asyncio.StreamWriter = writer
+    self.profile : Optional[LoadProfile] = profile
+    self.nick : Optional[str] = None
+    self.channels : dict[str, int] = {} # name -> room id
+    self.random : random.Random = random.Random(profile.seed if profile is not None else None)
+    self.ids = itertools.count()
+
+    self.join_window : RateWindow = RateWindow(LIMIT_JOIN, JOIN_WINDOW_SECONDS)
+    self.user_window : RateWindow = RateWindow(LIMIT_USER, WINDOW_SECONDS)
+    self.moderator_window : RateWindow = RateWindow(LIMIT_MODERATOR, WINDOW_SECONDS)
+
+    self.pending_commands : dict[str, deque[float]] = {} # channel -> send times of unanswered commands
+    self.pending_moderation : dict[tuple[str, str], tuple[float, str]] = {} # (channel, login) -> (send time, message id)
+    self.pending_deletes : dict[tuple[str, str], str] = {} # (channel, message id) -> login
+    self.moderated : set[tuple[str, str]] = set() # (channel, login) of moderated chatters
+
+    self.reply_latency : EgressLatency = EgressLatency()
+    self.moderation_latency : EgressLatency = EgressLatency()
+    self.counters : dict[str, int] = {
+      "sent_messages": 0,
+      "sent_usernotices": 0,
+      "sent_joins": 0,
+      "received_lines": 0,
+      "received_privmsgs": 0,
+      "moderation_commands": 0,
+      "unexpected_moderation": 0,
+      "moderation_notices": 0,
+      "unmatched_replies": 0,
+      "rate_limited_privmsgs": 0,
+      "rate_limited_joins": 0,
+      "pongs": 0,
+    }
+
+  def write(self, line : str) -> None:
+    self.writer.write((line + "\r\n").encode("utf-8"))
+
+  def report(self) -> dict:
+    def summary(latency : EgressLatency) -> dict:
+      return {
+        "count": latency.count,
+        "mean": latency.mean,
+        "p50": latency.percentile(50),
+        "p99": latency.percentile(99),
+        "max": latency.max,
+      }
+    result = dict(self.counters)
+    result["nick"] = self.nick
+    result["channels"] = len(self.channels)
+    result["unanswered_commands"] = sum(len(pending) for pending in self.pending_commands.values())
+    result["missed_moderation"] = len(self.pending_moderation)
+    result["reply_latency"] = summary(self.reply_latency)
+    result["moderation_latency"] = summary(self.moderation_latency)
+    return result
+
+class FakeTmiServer:
+  """
+  a local stand-in for the twitch irc servers
+  without a profile every JOIN is answered with a burst of messages_per_join PRIVMSGs, after which the server stops sending
+  with a profile the server speaks the login handshake, answers JOIN/PART/PING, synthesizes chat load,
+  enforces the twitch rate limits on what the bot sends and measures the bot's reply and moderation latencies
+  """
+  def __init__(self, messages_per_join : int = 1000, profile : Optional[LoadProfile] = None, reports = None):
+    """
+    :param reports: a queue (e.g. multiprocessing.Queue) every client report is put into when the client disconnects
+    """
+    self.messages_per_join : int = messages_per_join
+    self.profile : Optional[LoadProfile] = profile
+    self.reports = reports
+
+  async def _blast(self, client : _Client, channel : str):
+    writer = client.writer
+    for i in range(self.messages_per_join):
+      viewer = i % 500
+      writer.write((PRIVMSG_FORMAT % (viewer, i, viewer, viewer, viewer, viewer, channel, i) + "\r\n").encode("utf-8"))
+      if i % 100 == 0:
+        await writer.drain()
+    await writer.drain()
+    writer.write_eof()
+
+  def _handle_login(self, client : _Client, nick : str):
+    client.nick = nick.lower()
+    for number, text in [("001", "Welcome, GLHF!"), ("002", "Your host is %s" % SERVER), ("003", "This server is rather new"),
+                         ("004", "-"), ("375", "-"), ("372", "You are in a maze of twisty passages, all alike."), ("376", ">")]:
+      client.write(":%s %s %s :%s" % (SERVER, number, client.nick, text))
+
+  def _handle_join(self, client : _Client, channels : str):
+    now = time.monotonic()
+    for name in channels.split(','):
+      name = name.strip().removeprefix('#').lower()
+      if len(name) == 0:
+        continue
+      if client.join_window.available(now) == 0:
+        client.counters["rate_limited_joins"] += 1
+        continue
+      client.join_window.consume(now)
+      if name in client.channels:
+        continue
+      client.channels[name] = 10000 + len(client.channels)
+      nick = client.nick
+      badges = "moderator/1" if self.profile.bot_is_moderator else ""
+      client.write(":%s!%s@%s.tmi.twitch.tv JOIN #%s" % (nick, nick, nick, name))
+      client.write("@badge-info=;badges=%s;color=;display-name=%s;emote-sets=0;mod=%d;subscriber=0;user-type= :%s USERSTATE #%s" %
+                   (badges, nick, int(self.profile.bot_is_moderator), SERVER, name))
+      client.write("@emote-only=0;followers-only=-1;r9k=0;room-id=%s;slow=0;subs-only=0 :%s ROOMSTATE #%s" % (client.channels[name], SERVER, name))
+      client.write(":%s.tmi.twitch.tv 353 %s = #%s :%s" % (nick, nick, name, nick))
+      client.write(":%s.tmi.twitch.tv 366 %s #%s :End of /NAMES list" % (nick, nick, name))
+
+  def _handle_part(self, client : _Client, channels : str):
+    for name in channels.split(','):
+      name = name.strip().removeprefix('#').lower()
+      if client.channels.pop(name, None) is not None:
+        client.write(":%s!%s@%s.tmi.twitch.tv PART #%s" % (client.nick, client.nick, client.nick, name))
+
+  def _handle_privmsg(self, client : _Client, channel : str, text : str):
+    now = time.monotonic()
+    client.counters["received_privmsgs"] += 1
+    channel = channel.removeprefix('#')
+    if self.profile.bot_is_moderator:
+      windows = [client.moderator_window]
+    else:
+      windows = [client.moderator_window, client.user_window]
+    if any(window.available(now) == 0 for window in windows):
+      client.counters["rate_limited_privmsgs"] += 1 # Twitch silently drops these
+      return
+    for window in windows:
+      window.consume(now)
+
+    if text.startswith('.') or text.startswith('/'):
+      self._handle_moderation(client, channel, text[1:].split(' '), now)
+      return
+
+    if text.startswith('@'): # Warnings like "@viewer1 -> No links please." answer a moderated message, not a command
+      mention = (channel, text[1:].split(' ')[0].rstrip(',').lower())
+      if mention in client.moderated or mention in client.pending_moderation:
+        client.counters["moderation_notices"] += 1
+        return
+
+    pending = client.pending_commands.get(channel)
+    if pending is None or len(pending) == 0:
+      client.counters["unmatched_replies"] += 1
+      return
+    client.reply_latency.record(now - pending.popleft())
+
+  def _handle_moderation(self, client : _Client, channel : str, args : list[str], now : float):
+    if len(args) < 2 or not args[0] in ("delete", "timeout", "ban"):
+      return
+    client.counters["moderation_commands"] += 1
+    if args[0] == "delete":
+      login = client.pending_deletes.pop((channel, args[1]), None)
+    else:
+      login = args[1].lower()
+      client.moderated.add((channel, login))
+    pending = client.pending_moderation.pop((channel, login), None) if login is not None else None
+    if pending is None:
+      client.counters["unexpected_moderation"] += 1
+      return
+    sent, message_id = pending
+    client.pending_deletes.pop((channel, message_id), None)
+    client.moderation_latency.record(now - sent)
+
+  def _chat_line(self, client : _Client, channel : str, chatter : int, text : str, emotes : str = "", kind : str = "plain") -> str:
+    now = time.monotonic()
+    message_id = "%08x-%s" % (chatter, next(client.ids))
+    login = "viewer%d" % chatter
+    if kind == "command":
+      client.pending_commands.setdefault(channel, deque()).append(now)
+    elif kind in ("caps", "link") and not (channel, login) in client.pending_moderation:
+      client.pending_moderation[(channel, login)] = (now, message_id)
+      client.pending_deletes[(channel, message_id)] = login
+    subscriber = chatter % 7 == 0
+    badges = "subscriber/12" if subscriber else ""
+    client.counters["sent_messages"] += 1
+    return CHAT_FORMAT % (badges, "Viewer%d" % chatter, emotes, message_id, client.channels.get(channel, 0), int(subscriber),
+                          int(time.time() * 1000), 50000 + chatter, login, login, login, channel, text)
+
+  def _random_line(self, client : _Client, channel : str, chatter : Optional[int] = None) -> str:
+    profile = self.profile
+    rng = client.random
+    if chatter is None:
+      chatter = rng.randrange(profile.chatters)
+    roll = rng.random()
+
+    if roll < profile.sub_ratio:
+      client.counters["sent_usernotices"] += 1
+      login = "viewer%d" % chatter
+      return "@badge-info=subscriber/3;badges=subscriber/3;display-name=Viewer%d;emotes=;id=%s;login=%s;mod=0;msg-id=resub;" \
+             "msg-param-cumulative-months=3;msg-param-should-share-streak=0;msg-param-streak-months=0;msg-param-sub-plan=1000;" \
+             "msg-param-sub-plan-name=Channel\\sSubscription;room-id=%s;subscriber=1;system-msg=Viewer%d\\ssubscribed\\sat\\sTier\\s1.;" \
+             "tmi-sent-ts=%d;user-id=%d;user-type= :%s USERNOTICE #%s :three months already" % \
+             (chatter, next(client.ids), login, client.channels.get(channel, 0), chatter, int(time.time() * 1000), 50000 + chatter, SERVER, channel)
+    roll -= profile.sub_ratio
+
+    if roll < profile.emote_ratio:
+      name, emote_id = rng.choice(EMOTE_TEXTS)
+      count = rng.randint(1, 4)
+      text = " ".join([name] * count)
+      ranges = ",".join("%d-%d" % (i * (len(name) + 1), i * (len(name) + 1) + len(name) - 1) for i in range(count))
+      return self._chat_line(client, channel, chatter, text, "%s:%s" % (emote_id, ranges))
+    roll -= profile.emote_ratio
+
+    if roll < profile.caps_ratio:
+      return self._chat_line(client, channel, chatter, rng.choice(CAPS_TEXTS), kind="caps")
+    roll -= profile.caps_ratio
+
+    if roll < profile.link_ratio:
+      return self._chat_line(client, channel, chatter, rng.choice(LINK_TEXTS), kind="link")
+    roll -= profile.link_ratio
+
+    if roll < profile.command_ratio:
+      return self._chat_line(client, channel, chatter, rng.choice(COMMAND_TEXTS), kind="command")
+
+    return self._chat_line(client, channel, chatter, rng.choice(PLAIN_TEXTS))
+
+  def _raid(self, client : _Client, channel : str):
+    profile = self.profile
+    raider = "raider%d" % client.random.randrange(1000)
+    client.counters["sent_usernotices"] += 1
+    client.write("@badge-info=;badges=;color=;display-name=%s;emotes=;flags=;id=%s;login=%s;mod=0;msg-id=raid;msg-param-displayName=%s;"
+                 "msg-param-login=%s;msg-param-viewerCount=%d;room-id=%s;subscriber=0;system-msg=%d\\sraiders\\sfrom\\s%s\\shave\\sjoined!;"
+                 "tmi-sent-ts=%d;user-id=1;user-type= :%s USERNOTICE #%s" %
+                 (raider, next(client.ids), raider, raider, raider, profile.raid_size, client.channels.get(channel, 0), profile.raid_size,
+                  raider, int(time.time() * 1000), SERVER, channel))
+    first_raider = profile.chatters
+    for i in range(profile.raid_size):
+      login = "viewer%d" % (first_raider + i)
+      client.write(":%s!%s@%s.tmi.twitch.tv JOIN #%s" % (login, login, login, channel))
+      client.counters["sent_joins"] += 1
+    for i in range(profile.raid_messages):
+      client.write(self._random_line(client, channel, first_raider + i % max(1, profile.raid_size)))
+
+  async def _generate_load(self, client : _Client):
+    profile = self.profile
+    tick = 0.05
+    start = time.monotonic()
+    next_ping = start + profile.ping_interval
+    next_raid = start + profile.raid_interval if profile.raid_interval > 0 else None
+    owed = 0.0 # Messages per channel that are due but not sent yet
+    while time.monotonic() - start < profile.duration:
+      await asyncio.sleep(tick)
+      now = time.monotonic()
+      owed += profile.messages_per_second * tick
+      count = int(owed)
+      owed -= count
+      channels = list(client.channels)
+      for channel in channels:
+        for _ in range(count):
+          client.write(self._random_line(client, channel))
+      if next_raid is not None and now >= next_raid:
+        next_raid = now + profile.raid_interval
+        for channel in channels:
+          self._raid(client, channel)
+      if now >= next_ping:
+        next_ping = now + profile.ping_interval
+        client.write("PING :%s" % SERVER)
+      await client.writer.drain()
+
+    await asyncio.sleep(profile.grace)
+    client.writer.write_eof()
+
+  async def _handle_client(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter):
+    client = _Client(writer, self.profile)
+    load_task = None
+    eof_sent = False
+    while True:
+      line = await reader.readline()
+      if len(line) == 0:
+        break
+      line = line.decode("utf-8").strip()
+      if self.profile is None:
+        # Blast mode
+        if eof_sent or not line.startswith("JOIN #"):
+          continue
+        await self._blast(client, line[6:].split(',')[0])
+        eof_sent = True
+        continue
+
+      client.counters["received_lines"] += 1
+      parsed = parse_line(line)
+      if parsed is None:
+        continue
+      command = parsed.command
+      if command == "NICK":
+        self._handle_login(client, parsed.param(0) or "justinfan")
+      elif command == "CAP":
+        client.write(":%s CAP * ACK :%s" % (SERVER, parsed.params[-1]))
+      elif command == "JOIN":
+        self._handle_join(client, parsed.param(0) or "")
+        if load_task is None and len(client.channels) > 0:
+          load_task = asyncio.ensure_future(self._generate_load(client))
+      elif command == "PART":
+        self._handle_part(client, parsed.param(0) or "")
+      elif command == "PING":
+        client.write(":%s PONG %s :%s" % (SERVER, SERVER, parsed.param(0) or SERVER))
+      elif command == "PONG":
+        client.counters["pongs"] += 1
+      elif command == "PRIVMSG" and len(parsed.params) >= 2:
+        self._handle_privmsg(client, parsed.params[0], parsed.params[1])
+      await writer.drain()
+
+    if load_task is not None:
+      load_task.cancel()
+    if self.profile is not None and self.reports is not None and client.nick is not None: # Skip readiness probes
+      self.reports.put(client.report())
+    writer.close()
+
+  async def serve(self, port : int):
+    server = await asyncio.start_server(self._handle_client, HOST, port)
+    async with server:
+      await server.serve_forever()
+
+def _run(port : int, messages_per_join : int, profile : Optional[LoadProfile], reports):
+  asyncio.run(FakeTmiServer(messages_per_join, profile, reports).serve(port))
+
+def free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind((HOST, 0))
+    return sock.getsockname()[1]
+
+def start_process(port : int, messages_per_join : int = 1000, profile : Optional[LoadProfile] = None, reports = None) -> multiprocessing.Process:
+  """
+  runs the server in a separate process so it does not compete with the bot for cpu time
+  :param reports: a multiprocessing.Queue that receives one report per disconnected client (profile mode only)
+  """
+  process = multiprocessing.Process(target=_run, args=(port, messages_per_join, profile, reports), daemon=True)
+  process.start()
+  for _ in range(100):
+    try:
+      socket.create_connection((HOST, port)).close()
+      break
+    except OSError:
+      time.sleep(0.05)
+  return process
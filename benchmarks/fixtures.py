@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional
+
+import libtwitch
+
+# The extensions src/main.py loads, except viewerlist_bot_remover which needs the network
+STOCK_EXTENSIONS = ["8ball", "quotes", "caps", "length", "links", "symbols", "me", "emote", "barcode"]
+
+# Offline stand-ins for the emote APIs UtilEmote queries
+BTTV_GLOBAL_EMOTES = [{"code": code, "id": "bttv%d" % i} for i, code in enumerate(["catJAM", "monkaS", "PepeHands", "FeelsGoodMan", "KEKW", "OMEGALUL"])]
+BTTV_CHANNEL_EMOTES = {
+  "channelEmotes": [{"code": code, "id": "bttvc%d" % i} for i, code in enumerate(["benchHype", "benchLove"])],
+  "sharedEmotes": [{"code": code, "id": "bttvs%d" % i} for i, code in enumerate(["pepeD", "ratJAM", "Clap"])],
+}
+FFZ_GLOBAL_EMOTES = {"sets": {"3": {"emoticons": [{"name": name, "id": 1000 + i} for i, name in enumerate(["LilZ", "ZreknarF", "BeanieHipster"])]}}}
+FFZ_CHANNEL_EMOTES = {"sets": {"12345": {"emoticons": [{"name": name, "id": 2000 + i} for i, name in enumerate(["monkaW", "Pog", "5Head"])]}}}
+
+FIXTURE_RESPONSES = {
+  "https://api.betterttv.net/3/cached/emotes/global": json.dumps(BTTV_GLOBAL_EMOTES),
+  "https://api.betterttv.net/3/cached/users/twitch/": json.dumps(BTTV_CHANNEL_EMOTES),
+  "https://api.frankerfacez.com/v1/set/global": json.dumps(FFZ_GLOBAL_EMOTES),
+  "https://api.frankerfacez.com/v1/room/id/": json.dumps(FFZ_CHANNEL_EMOTES),
+}
+
+# (emotes tag, text) pairs covering what the stock moderation extensions look for
+CHAT_SAMPLES = [
+  ("", "hello chat, how is everyone doing today?"),
+  ("", "nice play"),
+  ("25:0-4,6-10,12-16", "Kappa Kappa Kappa"),
+  ("25:0-4/305954156:6-13", "Kappa PogChamp catJAM catJAM KEKW pepeD benchHype Pog"),
+  ("", "THIS IS THE BEST STREAM EVER, LETS GOOOOO"),
+  ("", "check this out https://example.com/clip?t=10"),
+  ("", "←↑→↓ look at these ①②③"),
+  ("", "lIlIlIlIlIlIlIlIlIlIlIlIlIl"),
+  ("", "\x01ACTION dances\x01"),
+  ("", "!8ball will this benchmark be fast?"),
+  ("", "a very long message " * 20),
+  ("", "Clap " * 40),
+]
+
+# (emotes tag, text) pairs of the emote walls a raid floods the chat with
+RAID_SAMPLES = [
+  ("", "benchHype " * 25),
+  ("25:0-4,6-10,12-16,18-22", "Kappa Kappa Kappa Kappa catJAM pepeD ratJAM Clap Pog monkaW KEKW OMEGALUL LilZ 5Head"),
+  ("", " ".join(["catJAM", "benchLove", "Pog", "LilZ", "RAID"] * 20)),
+  ("", "OMEGALUL  OMEGALUL  OMEGALUL  raid hype  monkaS  PepeHands  FeelsGoodMan"),
+]
+
+# Emote ids of the twitch emotes emote_wall puts into the emotes tag
+TWITCH_EMOTE_IDS = {"Kappa": "25", "PogChamp": "305954156"}
+
+def emote_wall(words : list[str], length : int = 500) -> tuple[str, str]:
+  """
+  :return: the emotes tag and the text of a message repeating the words until it is length characters long
+  """
+  text = ""
+  positions : dict[str, list[str]] = {}
+  index = 0
+  while len(text) + len(words[index % len(words)]) <= length:
+    word = words[index % len(words)]
+    if word in TWITCH_EMOTE_IDS:
+      positions.setdefault(TWITCH_EMOTE_IDS[word], []).append("%d-%d" % (len(text), len(text) + len(word) - 1))
+    text += word + " "
+    index += 1
+  return "/".join("%s:%s" % (emote_id, ",".join(spans)) for emote_id, spans in positions.items()), text.rstrip(" ")
+
+# (emotes tag, text) pairs of 500 character emote walls
+EMOTE_WALL_SAMPLES = [
+  emote_wall(["Kappa"]),
+  emote_wall(["Kappa", "PogChamp", "KEKW", "OMEGALUL"]),
+  emote_wall(["OMEGALUL", "KEKW", "benchHype", "LOL"]),
+  emote_wall(["PogChamp", "GG", "WP", "Pog", "EZ"]),
+]
+
+def chat_tags(index : int, emotes : str = "", room_id : int = 12345) -> str:
+  return "badge-info=;badges=;color=#1E90FF;display-name=Viewer%d;emotes=%s;flags=;id=bench-%d;mod=0;room-id=%d;" \
+         "subscriber=0;tmi-sent-ts=1633000000000;turbo=0;user-id=%d;user-type=" % (index, emotes, index, room_id, 1000 + index)
+
+class FixtureRequestHandler:
+  """
+  answers the web requests of the stock extensions from FIXTURE_RESPONSES instead of the network
+  """
+  def __init__(self):
+    self.request_count : int = 0
+
+  def get_request_sync(self, url : str, cache_behaviour = None) -> tuple[bool, Optional[str]]:
+    self.request_count += 1
+    for prefix, response in FIXTURE_RESPONSES.items():
+      if url.startswith(prefix):
+        return True, response
+    return False, None
+
+class NullSocket:
+  """
+  stands in for the server connection, everything sent is counted and dropped
+  """
+  def __init__(self):
+    self._closed : threading.Event = threading.Event()
+    self.sent_bytes : int = 0
+
+  def send(self, data : bytes) -> int:
+    self.sent_bytes += len(data)
+    return len(data)
+
+  def recv_into(self, buffer) -> int:
+    self._closed.wait() # Nothing is received, the lines are fed directly
+    return 0
+
+  def shutdown(self, how) -> None:
+    self._closed.set()
+
+  def close(self) -> None:
+    self._closed.set()
+
+class NullDatastore(libtwitch.Datastore):
+  """
+  keeps everything in memory so benchmarks do not touch ./data
+  """
+  def __init__(self):
+    self._data : dict = {} # (subject, key) -> value
+
+  def get(self, subject, key : str, fallback = None):
+    return self._data.get((subject, key), fallback)
+
+  def set(self, subject, key : str, value) -> None:
+    self._data[(subject, key)] = value
+
+  def has(self, subject, key : str) -> bool:
+    return (subject, key) in self._data
+
+  def rem(self, subject, key : str) -> None:
+    self._data.pop((subject, key), None)
+
+  def keys(self, subject) -> list[str]:
+    return [key for key_subject, key in self._data if key_subject is subject]
+
+  def sync(self):
+    pass
+
+class BenchBot(libtwitch.Bot):
+  """
+  a bot that runs offline: in-memory datastore, fixture web requests, no socket
+  the config and data directories are in a temporary directory (the shipped config is copied), cleanup removes it
+  """
+  def __init__(self, nickname : str = "benchbot", datastore : Optional[libtwitch.Datastore] = None):
+    self._directory : tempfile.TemporaryDirectory = tempfile.TemporaryDirectory(prefix="benchbot-")
+    if os.path.isdir(libtwitch.Bot.get_config_dir()):
+      shutil.copytree(libtwitch.Bot.get_config_dir(), self.get_config_dir())
+    super().__init__(nickname, "oauth:bench", datastore if datastore is not None else NullDatastore())
+    self.request_handler : FixtureRequestHandler = FixtureRequestHandler()
+    self.privmsg_count : int = 0
+    self._socket = NullSocket()
+
+  def get_config_dir(self) -> str:
+    return os.path.join(self._directory.name, "config")
+
+  def get_data_dir(self) -> str:
+    return os.path.join(self._directory.name, "data")
+
+  def cleanup(self) -> None:
+    self._directory.cleanup()
+
+  def on_privmsg(self, raw_msg : libtwitch.IrcMessage):
+    self.privmsg_count += 1
+    super().on_privmsg(raw_msg)
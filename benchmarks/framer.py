@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import time
+
+from libtwitch.irc.framer import LineFramer
+from benchmarks.irc_parser import SAMPLE_LINES
+
+class FakeSocket:
+  def __init__(self, data : bytes):
+    self._data : memoryview = memoryview(data)
+    self._offset : int = 0
+    self.calls : int = 0
+
+  def recv(self, size : int) -> bytes:
+    self.calls += 1
+    chunk = bytes(self._data[self._offset:self._offset + size])
+    self._offset += len(chunk)
+    return chunk
+
+  def recv_into(self, buffer) -> int:
+    self.calls += 1
+    chunk = self._data[self._offset:self._offset + len(buffer)]
+    buffer[:len(chunk)] = chunk
+    self._offset += len(chunk)
+    return len(chunk)
+
+def _make_stream(rounds : int) -> tuple[bytes, int]:
+  lines = []
+  for i in range(rounds):
+    lines.extend(SAMPLE_LINES)
+    lines.append(":viewer%s!viewer%s@viewer%s.tmi.twitch.tv PRIVMSG #channel :Grüße aus Köln 🎉 ✨" % (i, i, i))
+  return ("\r\n".join(lines) + "\r\n").encode("utf-8"), len(lines)
+
+def _legacy(data : bytes) -> tuple[int, int]:
+  # The recv(1024) framing that IrcConnection._read_line used before LineFramer
+  sock = FakeSocket(data)
+  back_buffer = []
+  count = 0
+  while True:
+    if len(back_buffer) == 0 or (len(back_buffer) == 1 and not back_buffer[0].endswith(b'\n')):
+      buffer = sock.recv(1024)
+      if len(buffer) == 0:
+        break
+      back_buffer = buffer.split(b'\r\n')
+    line = back_buffer.pop(0)
+    try:
+      line.decode("utf-8")
+    except UnicodeDecodeError:
+      continue
+    if len(line) > 0:
+      count += 1
+  return count, sock.calls
+
+def _framer(data : bytes, recv_size : int) -> tuple[int, int]:
+  sock = FakeSocket(data)
+  framer = LineFramer(recv_size)
+  count = 0
+  while True:
+    lines = framer.recv(sock)
+    if lines is None:
+      break
+    count += len(lines)
+  return count, sock.calls
+
+def run(rounds : int = 20000) -> dict[str, dict[str, float]]:
+  data, expected = _make_stream(rounds)
+  results = {}
+  for name, func in [("legacy_recv_1024", _legacy),
+                     ("framer_4k", lambda d: _framer(d, 4096)),
+                     ("framer_16k", lambda d: _framer(d, 16384)),
+                     ("framer_64k", lambda d: _framer(d, 65536))]:
+    start = time.perf_counter()
+    count, calls = func(data)
+    duration = time.perf_counter() - start
+    results[name] = {
+      "lines_per_second": count / duration,
+      "syscalls": calls,
+      "lines_lost": expected - count,
+    }
+  return results
+
+if __name__ == '__main__':
+  for name, result in run().items():
+    print("%-18s %12.0f lines/s %8d syscalls %8d lines lost" % (name, result["lines_per_second"], result["syscalls"], result["lines_lost"]))
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import re
+import time
+
+import libtwitch
+from libtwitch.irc.parser import parse_line
+
+# The regex cascade that IrcConnection._handle_response used before the IRCv3 tokenizer
+RE_TAG_PART = r"(?:@([^\s=;]+=[^\s;]*(?:;(?:[^\s=;]+=[^\s;]*))*))?\s?"
+RE_CHAT_MSG = r"^%s:([^\s!]+)!(?:[^\s@]+)@(?:[^\s\.]+)(?:\.tmi\.twitch\.tv PRIVMSG) #([^\s!]+) :(.+)$" % RE_TAG_PART
+RE_USERNOTICE = r"^%s:(?:tmi\.twitch\.tv USERNOTICE) #([^\s!]+)(?: :(.+))?$" % RE_TAG_PART
+RE_ROOMSTATE = r"^%s:(?:tmi\.twitch\.tv ROOMSTATE) #([^\s!]+)$" % RE_TAG_PART
+RE_JOIN = r"^:([^\s!]+)!(?:[^\s@]+)@(?:[^\s\.]+)(?:\.tmi\.twitch\.tv JOIN) #([^\s!]+)$"
+RE_PART = r"^:([^\s!]+)!(?:[^\s@]+)@(?:[^\s\.]+)(?:\.tmi\.twitch\.tv PART) #([^\s!]+)$"
+
+PRIVMSG_TAGS = "@badge-info=;badges=premium/1;client-nonce=d9b3c1a1;color=#1E90FF;display-name=Viewer%s;emotes=25:0-4;" \
+               "first-msg=0;flags=;id=9b1f6a2c-%04d;mod=0;room-id=12345;subscriber=0;tmi-sent-ts=1633000000000;turbo=0;" \
+               "user-id=%s;user-type="
+
+SAMPLE_LINES = [
+  PRIVMSG_TAGS % (1, 1, 1001) + " :viewer1!viewer1@viewer1.tmi.twitch.tv PRIVMSG #channel :Kappa hello chat",
+  PRIVMSG_TAGS % (2, 2, 1002) + " :viewer2!viewer2@viewer2.tmi.twitch.tv PRIVMSG #channel :PogChamp PogChamp PogChamp",
+  PRIVMSG_TAGS % (3, 3, 1003) + " :viewer3!viewer3@viewer3.tmi.twitch.tv PRIVMSG #channel :!8ball will this work?",
+  PRIVMSG_TAGS % (4, 4, 1004) + " :viewer4!viewer4@viewer4.tmi.twitch.tv PRIVMSG #channel :WELCOME RAIDERS",
+  ":viewer5!viewer5@viewer5.tmi.twitch.tv JOIN #channel",
+  ":viewer6!viewer6@viewer6.tmi.twitch.tv PART #channel",
+  "@badge-info=;badges=;color=;display-name=Raider;emotes=;flags=;id=3d830f12;login=raider;mod=0;msg-id=raid;"
+  "msg-param-displayName=Raider;msg-param-login=raider;msg-param-viewerCount=1500;room-id=12345;subscriber=0;"
+  "system-msg=1500\\sraiders\\sfrom\\sRaider;tmi-sent-ts=1633000000000;user-id=2001;user-type= :tmi.twitch.tv USERNOTICE #channel",
+  "@emote-only=0;followers-only=-1;r9k=0;rituals=0;room-id=12345;slow=0;subs-only=0 :tmi.twitch.tv ROOMSTATE #channel",
+  "@ban-duration=600;room-id=12345;target-user-id=1005;tmi-sent-ts=1633000000000 :tmi.twitch.tv CLEARCHAT #channel :viewer5",
+  "PING :tmi.twitch.tv",
+]
+
+def _legacy_match(line : str):
+  match = re.match(RE_CHAT_MSG, line)
+  if line == "PING :tmi.twitch.tv":
+    return "PING"
+  if match is not None:
+    return match
+  join_match = re.match(RE_JOIN, line)
+  part_match = re.match(RE_PART, line)
+  roomstate_match = re.match(RE_ROOMSTATE, line)
+  usernotice_match = re.match(RE_USERNOTICE, line)
+  return join_match or part_match or roomstate_match or usernotice_match
+
+def _parse_and_dispatch(connection : libtwitch.IrcConnection):
+  handlers = connection._command_handlers
+  def parse(line : str):
+    parsed = parse_line(line)
+    return handlers.get(parsed.command)
+  return parse
+
+def _measure(func, lines : list[str], rounds : int) -> float:
+  start = time.perf_counter()
+  for _ in range(rounds):
+    for line in lines:
+      func(line)
+  duration = time.perf_counter() - start
+  return (rounds * len(lines)) / duration
+
+def run(rounds : int = 20000) -> dict[str, float]:
+  connection = libtwitch.IrcConnection("benchbot", "oauth:none")
+  connection.join_channel("channel")
+
+  results = {
+    "regex_cascade": _measure(_legacy_match, SAMPLE_LINES, rounds),
+    "tokenizer": _measure(_parse_and_dispatch(connection), SAMPLE_LINES, rounds),
+    "handle_response": _measure(connection._handle_response, SAMPLE_LINES, rounds),
+  }
+  return results
+
+if __name__ == '__main__':
+  for name, lines_per_second in run().items():
+    print("%-16s %12.0f lines/s" % (name, lines_per_second))
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import tempfile
+import time
+
+import libtwitch
+from benchmarks.fixtures import STOCK_EXTENSIONS, BenchBot
+from benchmarks.irc_parser import SAMPLE_LINES
+from libtwitch.irc.capture import TrafficRecorder, read_capture, replay_capture
+
+def write_synthetic_capture(path : str, rounds : int = 2000) -> None:
+  recorder = TrafficRecorder(path)
+  for _ in range(rounds):
+    for line in SAMPLE_LINES:
+      recorder.record(line)
+  recorder.close()
+
+def _captured_channels(path : str) -> list[str]:
+  channels = set()
+  for _, line in read_capture(path):
+    parsed = libtwitch.parse_line(line)
+    if parsed is not None and parsed.channel_name is not None:
+      channels.add(parsed.channel_name)
+  return sorted(channels)
+
+def run(path : str, speed : float = None, workers : int = libtwitch.DISPATCH_WORKERS, extensions : list[str] = None, nickname : str = "replaybot", shedding : bool = True) -> dict:
+  """
+  replays a capture through a bot with the stock extensions
+  :param speed: 1.0 replays at the recorded speed, 10.0 ten times faster, None as fast as possible
+  """
+  bot = BenchBot(nickname)
+  for extension in (STOCK_EXTENSIONS if extensions is None else extensions):
+    bot.load_extension(extension)
+
+  socket = bot._socket
+  bot.join_channels(_captured_channels(path))
+  bot.dispatch_workers = workers
+  if not shedding: # Measure the full pipeline even if it falls behind
+    bot.overload.start_depth = math.inf
+    bot.overload.start_lag = math.inf
+  bot.start()
+
+  cpu_start = time.process_time()
+  result = replay_capture(bot, path, speed)
+  cpu = time.process_time() - cpu_start
+  bot.stop()
+  bot.cleanup()
+
+  return {
+    "lines": result.line_count,
+    "privmsgs": bot.privmsg_count,
+    "recorded_seconds": result.recorded_duration,
+    "replay_seconds": result.duration,
+    "lines_per_second": result.lines_per_second,
+    "lines_per_cpu_second": result.line_count / cpu if cpu > 0 else 0.0,
+    "sent_bytes": socket.sent_bytes,
+    "shed": dict(bot.overload.shed),
+  }
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="replays a capture recorded with IrcConnection.start_capture (CAPTURE_FILE in src/main.py)")
+  parser.add_argument("capture", nargs='?', help="the capture file, a synthetic capture is used if omitted")
+  parser.add_argument("--speed", type=float, default=None, help="replay speed factor (1 = recorded speed), as fast as possible if omitted")
+  parser.add_argument("--workers", type=int, default=libtwitch.DISPATCH_WORKERS)
+  parser.add_argument("--no-shedding", action="store_true", help="never shed load, even if the replay falls behind")
+  parser.add_argument("--nickname", default="replaybot", help="the nickname the capture was recorded with")
+  args = parser.parse_args()
+
+  capture_path = args.capture
+  if capture_path is None:
+    capture_path = os.path.join(tempfile.mkdtemp(), "synthetic.capture.gz")
+    write_synthetic_capture(capture_path)
+
+  for name, value in run(capture_path, args.speed, args.workers, nickname=args.nickname, shedding=not args.no_shedding).items():
+    print("%-20s %s" % (name, value))
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+
+from benchmarks import fake_tmi
+from benchmarks.fixtures import STOCK_EXTENSIONS, BenchBot
+
+class SoakBot(BenchBot):
+  def __init__(self, nickname : str):
+    super().__init__(nickname)
+    self.shedding_episodes : int = 0
+
+  def on_shedding_start(self, queue_depth : int, lag : float):
+    self.shedding_episodes += 1
+
+def run(profile : fake_tmi.LoadProfile = None, channels : int = 5, extensions : list[str] = None, nickname : str = "soakbot") -> dict:
+  """
+  runs a bot with the stock extensions against the fake tmi server until the server ends the load
+  :return: the server's report on what the bot sent plus the bot's own counters
+  """
+  if profile is None:
+    profile = fake_tmi.LoadProfile(duration=10.0)
+  port = fake_tmi.free_port()
+  reports = multiprocessing.Queue()
+  server = fake_tmi.start_process(port, profile=profile, reports=reports)
+  try:
+    bot = SoakBot(nickname)
+    for extension in (STOCK_EXTENSIONS if extensions is None else extensions):
+      bot.load_extension(extension)
+    bot.connect(fake_tmi.HOST, port)
+    bot.join_channels(["channel%d" % i for i in range(channels)])
+    bot.start()
+    bot._ingress_thread.join() # The server closes the connection once the load is over
+    bot._dispatcher.wait_idle()
+    bot.stop()
+    bot.cleanup()
+    report = reports.get(timeout=10)
+  finally:
+    server.terminate()
+
+  report["bot_privmsgs"] = bot.privmsg_count
+  report["bot_shed"] = dict(bot.overload.shed)
+  report["bot_shedding_episodes"] = bot.shedding_episodes
+  report["bot_egress_saved"] = bot.egress_saved
+  report["bot_latency"] = {stage: channels[''] for stage, channels in bot.latency.report().items()}
+  return report
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="end to end load test against a local fake tmi server")
+  parser.add_argument("--channels", type=int, default=5)
+  parser.add_argument("--rate", type=float, default=20.0, help="messages per second per channel")
+  parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+  parser.add_argument("--raid-interval", type=float, default=0.0, help="seconds between raids per channel, 0 disables raids")
+  parser.add_argument("--raid-size", type=int, default=1000)
+  parser.add_argument("--not-moderator", action="store_true", help="the server does not grant the bot moderator rate limits")
+  args = parser.parse_args()
+
+  load = fake_tmi.LoadProfile(messages_per_second=args.rate, duration=args.duration, raid_interval=args.raid_interval,
+                              raid_size=args.raid_size, bot_is_moderator=not args.not_moderator)
+  print(json.dumps(run(load, args.channels), indent=2))
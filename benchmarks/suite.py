@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+import libtwitch
+from benchmarks.fixtures import CHAT_SAMPLES, EMOTE_WALL_SAMPLES, RAID_SAMPLES, STOCK_EXTENSIONS, BenchBot, chat_tags
+from benchmarks.irc_parser import SAMPLE_LINES
+from libtwitch.irc.capture import read_capture
+from libtwitch.irc.tags import parse_tags
+from src import textutil
+
+MODERATION_PLUGINS = ["mod.caps", "mod.emote", "mod.links", "mod.symbols", "mod.barcode", "mod.length", "mod.me"]
+CHATTERS = 200
+
+def rate(func : Callable[[], int], repeat : int = 3) -> float:
+  """
+  :param func: runs the workload once and returns the number of operations it did
+  :return: the best operations per second over repeat runs
+  """
+  best = 0.0
+  for _ in range(repeat):
+    start = time.perf_counter()
+    count = func()
+    duration = time.perf_counter() - start
+    if duration > 0:
+      best = max(best, count / duration)
+  return best
+
+def _load_bot(extensions : list[str]) -> BenchBot:
+  bot = BenchBot()
+  with contextlib.redirect_stdout(io.StringIO()):
+    for extension in extensions:
+      bot.load_extension(extension)
+  util_emote = bot.get_plugin("util.emote")
+  if util_emote is not None:
+    util_emote.refresh_channel_emotes(12345) # The channel the benchmarks join, as if its ROOMSTATE arrived
+  return bot
+
+def bench_handle_response(lines : list[str], rounds : int) -> dict:
+  connection = libtwitch.IrcConnection("benchbot", "oauth:none")
+  for line in lines:
+    parsed = libtwitch.parse_line(line)
+    if parsed is not None and parsed.channel_name is not None:
+      connection.join_channel(parsed.channel_name)
+
+  def workload():
+    for _ in range(rounds):
+      for line in lines:
+        connection._handle_response(line)
+    return rounds * len(lines)
+  return {"lines_per_second": rate(workload)}
+
+def bench_bot_privmsg(rounds : int, extensions : list[str]) -> dict:
+  bot = _load_bot(extensions)
+  channel = bot.join_channel("channel")
+  channel._id = 12345
+  samples = [("viewer%d" % (i % CHATTERS), text, chat_tags(i % CHATTERS, emotes)) for i, (emotes, text) in enumerate(CHAT_SAMPLES * 20)]
+
+  def workload():
+    for _ in range(rounds):
+      for author, text, tags in samples:
+        channel.handle_privmsg(author, text, parse_tags(tags))
+    return rounds * len(samples)
+
+  with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull): # util.console prints every message
+    result = {"messages_per_second": rate(workload)}
+  result["extensions"] = [extension for extension in extensions]
+  result["plugins"] = list(bot._plugins)
+  bot.cleanup()
+  return result
+
+def bench_moderate(rounds : int) -> dict:
+  bot = _load_bot(STOCK_EXTENSIONS)
+  channel = bot.join_channel("channel")
+  channel._id = 12345
+  messages = []
+  for i, (emotes, text) in enumerate(CHAT_SAMPLES):
+    chatter = libtwitch.IrcChatter(channel, "viewer%d" % i)
+    chatter._id = 1000 + i
+    messages.append(libtwitch.BotMessage(channel, chatter, text, parse_tags(chat_tags(i, emotes))))
+
+  results = {}
+  for name in MODERATION_PLUGINS:
+    plugin = bot.get_plugin(name)
+    if plugin is None:
+      continue
+    def workload():
+      for _ in range(rounds):
+        for message in messages:
+          message.custom_data.clear() # Measure the analysis the plugin needs, not a cached one
+          plugin.on_moderate(message)
+      return rounds * len(messages)
+    calls_per_second = rate(workload)
+    results[name] = {
+      "calls_per_second": calls_per_second,
+      "microseconds_per_call": 1000000 / calls_per_second if calls_per_second > 0 else 0.0,
+    }
+
+  def pipeline():
+    for _ in range(rounds):
+      for message in messages:
+        message.custom_data.clear()
+        bot._moderate(message)
+    return rounds * len(messages)
+  calls_per_second = rate(pipeline)
+  results["pipeline"] = {
+    "calls_per_second": calls_per_second,
+    "microseconds_per_call": 1000000 / calls_per_second if calls_per_second > 0 else 0.0,
+  }
+  bot.cleanup()
+  return results
+
+def bench_emotes(rounds : int) -> dict:
+  bot = _load_bot(["emote"])
+  util_emote = bot.get_plugin("util.emote")
+  channel = bot.join_channel("channel")
+  channel._id = 12345
+  messages = []
+  for i, (emotes, text) in enumerate(RAID_SAMPLES):
+    chatter = libtwitch.IrcChatter(channel, "raider%d" % i)
+    messages.append(libtwitch.BotMessage(channel, chatter, text, parse_tags(chat_tags(i, emotes))))
+  emotes_per_round = sum(len(util_emote.get_emotes(message)) for message in messages)
+
+  def workload():
+    for _ in range(rounds):
+      for message in messages:
+        util_emote.get_emotes(message)
+    return rounds * len(messages)
+  messages_per_second = rate(workload)
+  bot.cleanup()
+  return {
+    "messages_per_second": messages_per_second,
+    "emotes_per_second": messages_per_second * emotes_per_round / len(messages),
+    "emotes_per_message": emotes_per_round / len(messages),
+  }
+
+def bench_caps(rounds : int) -> dict:
+  bot = _load_bot(["emote", "caps"])
+  caps = bot.get_plugin("mod.caps")
+  channel = bot.join_channel("channel")
+  channel._id = 12345
+  messages = []
+  for i, (emotes, text) in enumerate(EMOTE_WALL_SAMPLES):
+    chatter = libtwitch.IrcChatter(channel, "viewer%d" % i)
+    messages.append(libtwitch.BotMessage(channel, chatter, text, parse_tags(chat_tags(i, emotes))))
+
+  def workload():
+    for _ in range(rounds):
+      for message in messages:
+        message.custom_data.clear()
+        caps._on_moderate_impl(message) # Only the detection, on_moderate would also record a strike
+    return rounds * len(messages)
+  messages_per_second = rate(workload)
+  bot.cleanup()
+  return {
+    "emote_walls_per_second": messages_per_second,
+    "microseconds_per_wall": 1000000 / messages_per_second if messages_per_second > 0 else 0.0,
+    "characters_per_wall": sum(len(message.text) for message in messages) / len(messages),
+  }
+
+def bench_datastore(chatters : int, keys : int) -> dict:
+  path = tempfile.mkdtemp()
+  try:
+    store = libtwitch.FileDatastore(path, None)
+    connection = libtwitch.IrcConnection("benchbot", "oauth:none")
+    channel = connection.join_channel("channel")
+    subjects = []
+    for i in range(chatters):
+      chatter = libtwitch.IrcChatter(channel, "viewer%d" % i)
+      chatter._id = 1000 + i
+      subjects.append(chatter)
+
+    def set_workload():
+      for subject in subjects:
+        for key in range(keys):
+          store.set(subject, "key%d" % key, key)
+      return chatters * keys
+
+    def get_workload():
+      for subject in subjects:
+        for key in range(keys):
+          store.get(subject, "key%d" % key)
+      return chatters * keys
+
+    def sync_dirty_workload():
+      for subject in subjects:
+        store.set(subject, "key0", 1)
+      store.sync()
+      return chatters
+
+    def sync_clean_workload():
+      store.sync()
+      return 1
+
+    with contextlib.redirect_stdout(io.StringIO()): # FileDatastore.sync prints every file it writes
+      return {
+        "sets_per_second": rate(set_workload),
+        "gets_per_second": rate(get_workload),
+        "dirty_files_synced_per_second": rate(sync_dirty_workload),
+        "clean_syncs_per_second": rate(sync_clean_workload),
+        "files": chatters,
+      }
+  finally:
+    shutil.rmtree(path, ignore_errors=True)
+
+def bench_textutil(rounds : int) -> dict:
+  texts = [text for _, text in CHAT_SAMPLES]
+  template = "@{user.name} -> you have been timed out for {duration} seconds ({reason})."
+  variables = {"user.name": "viewer1", "duration": 600, "reason": "Writing Links"}
+
+  def contains_symbols_workload():
+    for _ in range(rounds):
+      for text in texts:
+        textutil.contains_symbols(text)
+    return rounds * len(texts)
+
+  batch = texts * rounds
+  def contains_symbols_batch_workload():
+    textutil.contains_symbols_batch(batch)
+    return len(batch)
+
+  def substitute_variables_workload():
+    for _ in range(rounds * len(texts)):
+      textutil.substitute_variables(template, variables)
+    return rounds * len(texts)
+
+  return {
+    "contains_symbols_per_second": rate(contains_symbols_workload),
+    "contains_symbols_batch_per_second": rate(contains_symbols_batch_workload),
+    "substitute_variables_per_second": rate(substitute_variables_workload),
+  }
+
+def bench_symbols_capture(lines : list[str]) -> dict:
+  texts = []
+  for line in lines:
+    parsed = libtwitch.parse_line(line)
+    if parsed is not None and parsed.command == "PRIVMSG" and len(parsed.params) > 1:
+      texts.append(parsed.params[-1])
+
+  def workload():
+    textutil.contains_symbols_batch(texts)
+    return len(texts)
+  return {
+    "messages_per_second": rate(workload) if len(texts) > 0 else 0.0,
+    "messages": len(texts),
+  }
+
+def run(rounds : int = 200, capture : Optional[str] = None) -> dict:
+  """
+  :param rounds: scales the work done by every benchmark
+  :param capture: a capture file (see IrcConnection.start_capture) to use as recorded input
+  """
+  results = {
+    "handle_response": bench_handle_response(SAMPLE_LINES, rounds * 10),
+    "bot_privmsg": bench_bot_privmsg(max(1, rounds // 100), STOCK_EXTENSIONS),
+    "bot_privmsg_console": bench_bot_privmsg(max(1, rounds // 100), STOCK_EXTENSIONS + ["console"]),
+    "moderate": bench_moderate(rounds // 4),
+    "emotes": bench_emotes(rounds * 5),
+    "caps": bench_caps(rounds),
+    "datastore": bench_datastore(rounds, 10),
+    "textutil": bench_textutil(rounds),
+  }
+  if capture is not None:
+    lines = [line for _, line in read_capture(capture)]
+    results["handle_response_capture"] = bench_handle_response(lines, 1)
+    results["handle_response_capture"]["lines"] = len(lines)
+    results["symbols_capture"] = bench_symbols_capture(lines)
+  return {
+    "meta": {
+      "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+      "python": sys.version.split()[0],
+      "implementation": platform.python_implementation(),
+      "platform": platform.platform(),
+      "rounds": rounds,
+      "capture": capture,
+    },
+    "results": results,
+  }
+
+def _flatten(data : dict, prefix : str = "") -> dict[str, float]:
+  flat = {}
+  for key, value in data.items():
+    if isinstance(value, dict):
+      flat.update(_flatten(value, prefix + key + "."))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+      flat[prefix + key] = value
+  return flat
+
+def compare(baseline : dict, current : dict) -> dict[str, float]:
+  """
+  :return: the relative change of every numeric result present in both runs (0.1 = 10% higher)
+  """
+  old = _flatten(baseline["results"])
+  new = _flatten(current["results"])
+  return {key: (new[key] - old[key]) / old[key] for key in sorted(old) if key in new and old[key] != 0}
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="end to end benchmark suite, prints or writes the results as json")
+  parser.add_argument("--rounds", type=int, default=200)
+  parser.add_argument("--capture", help="a capture file to benchmark _handle_response with recorded traffic")
+  parser.add_argument("--output", help="write the results to this file instead of stdout")
+  parser.add_argument("--compare", help="a previous result file to compare against")
+  parser.add_argument("--verbose", action="store_true", help="keep the plugin log output")
+  args = parser.parse_args()
+
+  if not args.verbose:
+    logging.disable(logging.INFO) # util.emote logs every channel emote lookup
+  current = run(args.rounds, args.capture)
+  if args.output is not None:
+    with io.open(args.output, mode="w", encoding="utf-8") as f:
+      json.dump(current, f, indent=2)
+  else:
+    print(json.dumps(current, indent=2))
+
+  if args.compare is not None:
+    with io.open(args.compare, mode="r", encoding="utf-8") as f:
+      baseline = json.load(f)
+    for key, change in compare(baseline, current).items():
+      print("%-60s %+7.1f%%" % (key, change * 100), file=sys.stderr)
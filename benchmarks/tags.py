@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+from typing import Optional
+
+import libtwitch
+from benchmarks.fake_tmi import CHAT_FORMAT
+from benchmarks.fixtures import CHAT_SAMPLES, RAID_SAMPLES
+from benchmarks.suite import rate
+from libtwitch.irc.capture import TrafficRecorder, read_capture
+from libtwitch.irc.parser import parse_line
+from libtwitch.irc.tags import parse_tags
+
+# The keys the connection, the channel and the stock extensions read from a chat message
+ACCESSED_KEYS = ['id', 'tmi-sent-ts', 'emotes', 'room-id']
+
+def _split_tags(tags_str : str) -> dict[str, str]:
+  # The split IrcConnection._parse_tags did before values were unescaped
+  tags = {}
+  for tags_part in tags_str.split(';'):
+    parts = tags_part.split('=')
+    if len(parts) != 2:
+      continue
+    tags[parts[0]] = parts[1]
+  return tags
+
+def write_raid_capture(path : str, raiders : int = 2000, channel : str = "channel") -> None:
+  """
+  records the traffic of a raid, the raid notice, the joins of the raiders and the emote walls they post
+  """
+  recorder = TrafficRecorder(path)
+  recorder.record("@badge-info=;badges=;color=;display-name=Raider;emotes=;flags=;id=raid-0;login=raider;mod=0;msg-id=raid;"
+                  "msg-param-displayName=Raider;msg-param-login=raider;msg-param-viewerCount=%d;room-id=12345;subscriber=0;"
+                  "system-msg=%d\\sraiders\\sfrom\\sRaider\\shave\\sjoined!;tmi-sent-ts=1633000000000;user-id=1;user-type= "
+                  ":tmi.twitch.tv USERNOTICE #%s" % (raiders, raiders, channel))
+  for i in range(raiders):
+    login = "raider%d" % i
+    recorder.record(":%s!%s@%s.tmi.twitch.tv JOIN #%s" % (login, login, login, channel))
+  samples = RAID_SAMPLES * 4 + CHAT_SAMPLES
+  for i in range(raiders):
+    login = "raider%d" % i
+    emotes, text = samples[i % len(samples)]
+    subscriber = i % 7 == 0
+    recorder.record(CHAT_FORMAT % ("subscriber/12" if subscriber else "", "Raider%d" % i, emotes, "raid-%d" % (i + 1), 12345,
+                                   int(subscriber), 1633000000000 + i, 50000 + i, login, login, login, channel, text))
+  recorder.close()
+
+def _capture_lines(path : str) -> list[str]:
+  return [line for _, line in read_capture(path)]
+
+def _raw_tags(lines : list[str]) -> list[str]:
+  result = []
+  for line in lines:
+    parsed = parse_line(line)
+    if parsed is not None and parsed.tags is not None:
+      result.append(parsed.tags)
+  return result
+
+def _measure(factory, raw_tags : list[str], keys : list[str], rounds : int) -> float:
+  def workload():
+    for _ in range(rounds):
+      for raw in raw_tags:
+        tags = factory(raw)
+        for key in keys:
+          tags.get(key)
+    return rounds * len(raw_tags)
+  return rate(workload)
+
+def _measure_lines(connection : libtwitch.IrcConnection, lines : list[str], rounds : int) -> float:
+  def workload():
+    for _ in range(rounds):
+      for line in lines:
+        connection._handle_response(line)
+    return rounds * len(lines)
+  return rate(workload)
+
+def _connection(lines : list[str]) -> libtwitch.IrcConnection:
+  connection = libtwitch.IrcConnection("benchbot", "oauth:none")
+  for line in lines:
+    parsed = parse_line(line)
+    if parsed is not None and parsed.channel_name is not None:
+      connection.join_channel(parsed.channel_name)
+  return connection
+
+def run(capture : Optional[str] = None, rounds : int = 20) -> dict[str, float]:
+  """
+  :param capture: a capture file (see IrcConnection.start_capture), a recorded raid is used if omitted
+  """
+  if capture is None:
+    capture = os.path.join(tempfile.mkdtemp(), "raid.capture.gz")
+    write_raid_capture(capture)
+  lines = _capture_lines(capture)
+  raw_tags = _raw_tags(lines)
+
+  split_connection = _connection(lines)
+  split_connection._parse_tags = lambda tags_str: _split_tags(tags_str) if tags_str is not None else {}
+  parse_connection = _connection(lines)
+
+  return {
+    "split_typical": _measure(_split_tags, raw_tags, ACCESSED_KEYS, rounds),
+    "parse_typical": _measure(parse_tags, raw_tags, ACCESSED_KEYS, rounds),
+    "split_lines": _measure_lines(split_connection, lines, rounds),
+    "parse_lines": _measure_lines(parse_connection, lines, rounds),
+  }
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="compares parse_tags with the plain split it replaced on captured traffic")
+  parser.add_argument("capture", nargs='?', help="the capture file, a recorded raid is used if omitted")
+  parser.add_argument("--rounds", type=int, default=20)
+  args = parser.parse_args()
+  for name, per_second in run(args.capture, args.rounds).items():
+    print("%-16s %12.0f %s/s" % (name, per_second, "lines" if name.endswith("_lines") else "tag sets"))
@@ -2,10 +2,13 @@ import io
 import os
 import random
 
-from libtwitch import Bot, BotMessage, Plugin
+from libtwitch import Bot, BotMessage, Command, Plugin
+
+USER_COOLDOWN = 10 # seconds
 
 class Fun8Ball(Plugin):
   name = "fun.8ball"
+  sheddable = True
   def __init__(self, bot):
     super().__init__(bot)
     self.responses = []
@@ -32,10 +35,10 @@ class Fun8Ball(Plugin):
           self.emotes.append(emote)
       self.logger.info("Loaded %s emotes." % len(self.emotes))
 
-  def on_command(self, message : BotMessage, cmd : str, args : dict[str, str]):
-    if cmd != "8ball":
-      return
+  def get_commands(self) -> list[Command]:
+    return [Command("8ball", self._on_8ball, user_cooldown=USER_COOLDOWN)]
 
+  def _on_8ball(self, message : BotMessage, args : list[str]):
     line = random.choice(self.responses) + " " + random.choice(self.emotes)
     message.channel.chat(line)
 
@@ -1,14 +1,13 @@
 import re
+from functools import lru_cache
 from typing import Optional
 
-from libtwitch import Bot, BotMessage, ModerationAction, Plugin
+from libtwitch import Bot, BotMessage, ModerationAction
 from src import modutil, pluginutil
 
-class ModBarcode(Plugin):
+class ModBarcode(modutil.ModerationPlugin):
   name = "mod.barcode"
-  def __init__(self, bot):
-    super().__init__(bot)
-    self.config = None
+  moderation_cost = 2
 
   def on_load(self):
     self.config = pluginutil.load_config(self, {
@@ -30,13 +29,15 @@ class ModBarcode(Plugin):
     })
 
   @staticmethod
-  def _detect_barcode(text: str, length: int):
-    regex = r"[Il]{%s,}" % length
-    matches = re.findall(regex, text)
-    return len(matches) > 0
+  @lru_cache(maxsize=None)
+  def _barcode_pattern(length : int) -> re.Pattern:
+    return re.compile(r"[Il]{%d,}" % length) # Compiled once per configured length
+
+  def _detect_barcode(self, text: str, length: int):
+    return self._barcode_pattern(length).search(text) is not None
 
   def _on_moderate_impl(self, message : BotMessage) -> bool:
-    if self._detect_barcode(message.text, self.config['min_message']):
+    if modutil.get_message_analysis(self.bot, message).longest_barcode >= self.config['min_message']:
       return True
 
     if self._detect_barcode(message.author.display_name, self.config['min_username']):
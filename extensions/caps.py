@@ -1,14 +1,11 @@
 from typing import Optional
 
-from extensions.emote import Emote, UtilEmote
-from libtwitch import Bot, BotMessage, ModerationAction, Plugin
+from libtwitch import Bot, BotMessage, ModerationAction
 from src import modutil, pluginutil
 
-class ModCaps(Plugin):
+class ModCaps(modutil.ModerationPlugin):
   name = "mod.caps"
-  def __init__(self, bot):
-    super().__init__(bot)
-    self.config = None
+  moderation_cost = 5
 
   def on_load(self):
     self.config = pluginutil.load_config(self, {
@@ -30,32 +27,13 @@ class ModCaps(Plugin):
       ]
     })
 
-  @staticmethod
-  def _remove_emotes(text: str, emotes: list[Emote]) -> str:
-    res = ''
-    for index in range(0, len(text)):
-      in_emote = False
-      for emote in emotes:
-        if emote.start <= index <= emote.end:
-          in_emote = True
-          break
-      if in_emote:
-        continue
-      res += text[index]
-    return res
-
   def _on_moderate_impl(self, message : BotMessage) -> bool:
-    text = message.text
-    util_emote_plugin : Optional[UtilEmote] = self.bot.get_plugin("util.emote")
-    if util_emote_plugin is not None:
-      emotes = util_emote_plugin.get_emotes(message)
-      text = self._remove_emotes(text, emotes)
+    analysis = modutil.get_message_analysis(self.bot, message)
+    if analysis.caps < self.config['min']:
+      return False # Removing the emotes can only lower the count, skip the expensive emote lookup
 
-    num_caps = 0
-    length = len(text)
-    for char in text:
-      if 'A' <= char <= 'Z':
-        num_caps += 1
+    num_caps = analysis.stripped_caps
+    length = analysis.stripped_length
 
     if num_caps < self.config['min']:
       return False
@@ -144,6 +144,7 @@ class ConsoleTextBuilder:
 
 class UtilConsole(Plugin):
   name = "util.console"
+  sheddable = True
   def __init__(self, bot):
     super().__init__(bot)
     self.include_channel_name = False
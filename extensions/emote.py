@@ -1,11 +1,17 @@
 import json
-from dataclasses import dataclass
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
 from enum import Enum, auto
 from typing import Optional, Union
 
 from libtwitch import Bot, BotMessage, IrcChannel, ModerationAction, Plugin
 from src import modutil, pluginutil
 
+CHANNEL_EMOTES_TTL = 600 # Seconds until the emote sets of a channel are refreshed in the background
+
 class EmoteSource(Enum):
   Twitch = auto()
   BttvGlobal = auto()
@@ -21,18 +27,48 @@ class Emote:
   start: int = 0
   end: int = 0
 
+@dataclass
+class ChannelEmotes:
+  bttv: dict[str, int] = field(default_factory=dict)
+  frankerfacez: dict[str, int] = field(default_factory=dict)
+  time: float = 0 # Unix time the sets were downloaded
+  index: Optional[dict[str, tuple[EmoteSource, str]]] = None # Built on first use (see UtilEmote.get_emote_index)
+
+  def is_stale(self, ttl : float) -> bool:
+    return time.time() - self.time > ttl
+
+  def to_json(self) -> dict:
+    return {
+      "bttv": self.bttv,
+      "frankerfacez": self.frankerfacez,
+      "time": self.time
+    }
+
+  @classmethod
+  def from_json(cls, jdata : dict):
+    return cls(jdata['bttv'], jdata['frankerfacez'], jdata['time'])
+
 class UtilEmote(Plugin):
   name = "util.emote"
   def __init__(self, bot):
     super().__init__(bot)
     self._bttv_global_emotes = {}
     self._frankerfacez_global_emotes = {}
+    self._global_emote_index : dict[str, tuple[EmoteSource, str]] = {}
     self.config = None
 
+    # Channel emote sets are only read on the message threads and downloaded on the refresh thread
+    self._channel_emotes : dict[int, ChannelEmotes] = {}
+    self._channel_emotes_lock : threading.Lock = threading.Lock()
+    self._pending_refreshes : set[int] = set()
+    self._refresh_queue : queue.Queue = queue.Queue()
+    self._refresh_thread : Optional[threading.Thread] = None
+
   def on_load(self):
     self.config = pluginutil.load_config(self, {
       "use_bttv": True,
-      "use_frankerfacez": True
+      "use_frankerfacez": True,
+      "channel_emotes_ttl": CHANNEL_EMOTES_TTL
     })
 
     if self.config['use_bttv']:
@@ -54,6 +90,93 @@ class UtilEmote(Plugin):
             self._frankerfacez_global_emotes[jemote['name']] = jemote['id']
       self.logger.info("Loaded %s FrankerFaceZ global emotes." % len(self._frankerfacez_global_emotes))
 
+    self._global_emote_index = self._build_emote_index(None)
+    self._load_channel_emotes()
+    self._refresh_thread = threading.Thread(target=self._refresh_thread_func, daemon=True)
+    self._refresh_thread.start()
+
+  def on_unload(self):
+    if self._refresh_thread is None:
+      return
+    self._refresh_queue.put(None)
+    self._refresh_thread.join()
+    self._refresh_thread = None
+
+  def on_roomstate(self, channel : IrcChannel, tags : dict[str, str]):
+    if "room-id" in tags:
+      self.get_channel_emotes(int(tags["room-id"])) # Download the sets before the first message needs them
+
+  def _get_channel_emotes_path(self) -> str:
+    return self.get_data_dir() + "/channel_emotes.json"
+
+  def _load_channel_emotes(self) -> None:
+    path = self._get_channel_emotes_path()
+    if not os.path.exists(path):
+      return
+
+    with open(path, 'r', encoding='utf-8') as f:
+      jdata = json.load(f)
+    with self._channel_emotes_lock:
+      for channel_id, jchannel in jdata.items():
+        self._channel_emotes[int(channel_id)] = ChannelEmotes.from_json(jchannel)
+    self.logger.info("Loaded cached emotes of %s channels." % len(jdata))
+
+  def _save_channel_emotes(self) -> None:
+    with self._channel_emotes_lock:
+      data = {str(channel_id): channel_emotes.to_json() for channel_id, channel_emotes in self._channel_emotes.items()}
+
+    path = self._get_channel_emotes_path()
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+      json.dump(data, f)
+    os.replace(path + ".tmp", path) # A restart never finds a half written file
+
+  def _refresh_thread_func(self):
+    while True:
+      channel_id = self._refresh_queue.get()
+      if channel_id is None:
+        return
+      try:
+        self.refresh_channel_emotes(channel_id)
+      except Exception as e:
+        self.logger.warning("Can not refresh the emotes of channel_id %s: %s" % (channel_id, e))
+      finally:
+        with self._channel_emotes_lock:
+          self._pending_refreshes.discard(channel_id)
+
+  def refresh_channel_emotes(self, channel_id : int) -> ChannelEmotes:
+    """
+    downloads the emote sets of a channel, blocks until they are downloaded
+    """
+    channel_emotes = ChannelEmotes(time=time.time())
+    if self.config['use_bttv']:
+      channel_emotes.bttv = self.list_bttv_channel_emotes(channel_id)
+    if self.config['use_frankerfacez']:
+      channel_emotes.frankerfacez = self.list_frankerfacez_channel_emotes(channel_id)
+    channel_emotes.index = self._build_emote_index(channel_emotes)
+
+    with self._channel_emotes_lock:
+      self._channel_emotes[channel_id] = channel_emotes
+    self._save_channel_emotes()
+    return channel_emotes
+
+  def get_channel_emotes(self, channel_id : Optional[int]) -> Optional[ChannelEmotes]:
+    """
+    never blocks, missing or stale sets are downloaded in the background while the stale ones are still used
+    :return: the last downloaded emote sets of the channel or None if there are none yet
+    """
+    if not channel_id:
+      return None
+
+    ttl = self.config.get('channel_emotes_ttl', CHANNEL_EMOTES_TTL)
+    channel_emotes = self._channel_emotes.get(channel_id)
+    if channel_emotes is None or channel_emotes.is_stale(ttl):
+      with self._channel_emotes_lock:
+        if channel_id in self._pending_refreshes:
+          return channel_emotes
+        self._pending_refreshes.add(channel_id)
+      self._refresh_queue.put(channel_id)
+    return channel_emotes
+
   @staticmethod
   def _get_twitch_emotes(message: BotMessage) -> list[Emote]:
     emotes : list[Emote] = []
@@ -75,23 +198,38 @@ class UtilEmote(Plugin):
           emotes.append(emote)
     return emotes
 
-  @staticmethod
-  def _get_emotes(message: BotMessage, set: dict[str, int], source: EmoteSource) -> list[Emote]:
-    emotes : list[Emote] = []
-    words = message.text.split(' ')
-
-    index = 0
-    for word in words:
-      if word in set:
-        emote = Emote()
-        emote.source = source
-        emote.text = word
-        emote.id = set[word]
-        emote.start = index
-        emote.end = index + len(word)
-        emotes.append(emote)
-      index += 1 + len(word)
-    return emotes
+  def _build_emote_index(self, channel_emotes : Optional[ChannelEmotes]) -> dict[str, tuple[EmoteSource, str]]:
+    """
+    :return: the code of every third party emote usable in a channel -> its source and id,
+             channel emotes take precedence over global ones and bttv over FrankerFaceZ
+    """
+    sets : list[tuple[EmoteSource, dict[str, int]]] = []
+    if self.config['use_frankerfacez']:
+      sets.append((EmoteSource.FrankerFaceZGlobal, self._frankerfacez_global_emotes))
+    if self.config['use_bttv']:
+      sets.append((EmoteSource.BttvGlobal, self._bttv_global_emotes))
+    if channel_emotes is not None and self.config['use_frankerfacez']:
+      sets.append((EmoteSource.FrankerFaceZChannel, channel_emotes.frankerfacez))
+    if channel_emotes is not None and self.config['use_bttv']:
+      sets.append((EmoteSource.BttvChannel, channel_emotes.bttv))
+
+    index = {}
+    for source, emote_set in sets: # Later sets overwrite earlier ones
+      for code, emote_id in emote_set.items():
+        index[code] = (source, emote_id)
+    return index
+
+  def get_emote_index(self, channel_id : Optional[int]) -> dict[str, tuple[EmoteSource, str]]:
+    """
+    never blocks, the index of a channel is rebuilt after its emote sets were refreshed
+    :return: the code of every third party emote usable in the channel -> its source and id
+    """
+    channel_emotes = self.get_channel_emotes(channel_id)
+    if channel_emotes is None:
+      return self._global_emote_index
+    if channel_emotes.index is None:
+      channel_emotes.index = self._build_emote_index(channel_emotes)
+    return channel_emotes.index
 
   def list_bttv_channel_emotes(self, channel: Union[IrcChannel, int]) -> dict[str, int]:
     if isinstance(channel, IrcChannel):
@@ -143,21 +281,31 @@ class UtilEmote(Plugin):
     emotes : list[Emote] = []
     emotes.extend(self._get_twitch_emotes(message))
 
-    if self.config['use_bttv']:
-      emotes.extend(self._get_emotes(message, self.list_bttv_global_emotes(), EmoteSource.BttvGlobal))
-      emotes.extend(self._get_emotes(message, self.list_bttv_channel_emotes(message.channel), EmoteSource.BttvChannel))
-
-    if self.config['use_frankerfacez']:
-      emotes.extend(self._get_emotes(message, self.list_frankerfacez_global_emotes(), EmoteSource.FrankerFaceZGlobal))
-      emotes.extend(self._get_emotes(message, self.list_frankerfacez_channel_emotes(message.channel), EmoteSource.FrankerFaceZChannel))
+    channel_id = message.channel.id
+    if not channel_id and 'room-id' in message.tags:
+      channel_id = int(message.tags['room-id'])
+    index = self.get_emote_index(channel_id) # Only the global emotes until the channel sets are downloaded
+    if len(index) == 0:
+      return emotes
+
+    twitch_starts = {emote.start for emote in emotes}
+    start = 0
+    for word in message.text.split(' '):
+      entry = index.get(word)
+      if entry is not None and start not in twitch_starts:
+        emote = Emote()
+        emote.source, emote.id = entry
+        emote.text = word
+        emote.start = start
+        emote.end = start + len(word) - 1 # Inclusive like the positions in the emotes tag
+        emotes.append(emote)
+      start += len(word) + 1
 
     return emotes
 
-class ModEmote(Plugin):
+class ModEmote(modutil.ModerationPlugin):
   name = "mod.emote"
-  def __init__(self, bot):
-    super().__init__(bot)
-    self.config = None
+  moderation_cost = 8
 
   def on_load(self):
     self.config = pluginutil.load_config(self, {
@@ -180,15 +328,15 @@ class ModEmote(Plugin):
     })
 
   def _on_moderate_impl(self, message : BotMessage) -> bool:
-    util_plugin : Optional[UtilEmote] = self.bot.get_plugin("util.emote")
-    if util_plugin is None:
+    analysis = modutil.get_message_analysis(self.bot, message)
+    if not analysis.has_emotes:
       return False
 
-    length = len(message.text)
-    emotes = util_plugin.get_emotes(message)
+    if analysis.words < self.config['min']:
+      return False # Every emote is a word of its own, skip the expensive emote lookup
 
-    num_emotes = len(emotes)
-    char_count = 0
+    length = analysis.length
+    num_emotes = len(analysis.emotes)
 
     if num_emotes < self.config['min']:
       return False
@@ -196,10 +344,7 @@ class ModEmote(Plugin):
     if num_emotes > self.config['max']:
       return True
 
-    for emote in emotes:
-      char_count += emote.end - emote.start
-
-    if char_count / length > self.config["percent"]:
+    if analysis.emote_chars / length > self.config["percent"]:
       return True
 
     return False
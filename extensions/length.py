@@ -1,13 +1,11 @@
 from typing import Optional
 
-from libtwitch import Bot, BotMessage, ModerationAction, Plugin
+from libtwitch import Bot, BotMessage, ModerationAction
 from src import modutil, pluginutil
 
-class ModLength(Plugin):
+class ModLength(modutil.ModerationPlugin):
   name = "mod.length"
-  def __init__(self, bot):
-    super().__init__(bot)
-    self.config = None
+  moderation_cost = 1
 
   def on_load(self):
     self.config = pluginutil.load_config(self, {
@@ -29,7 +27,7 @@ class ModLength(Plugin):
 
   def _on_moderate_impl(self, message : BotMessage) -> bool:
     length = self.config["length"]
-    return len(message.text) > length
+    return modutil.get_message_analysis(self.bot, message).length > length
 
   def on_moderate(self, message : BotMessage) -> Optional[ModerationAction]:
     if not self._on_moderate_impl(message):
@@ -1,14 +1,11 @@
-import re
 from typing import Optional
 
-from libtwitch import Bot, BotMessage, ModerationAction, Plugin
+from libtwitch import Bot, BotMessage, ModerationAction
 from src import modutil, pluginutil
 
-class ModLinks(Plugin):
+class ModLinks(modutil.ModerationPlugin):
   name = "mod.links"
-  def __init__(self, bot):
-    super().__init__(bot)
-    self.config = None
+  moderation_cost = 3
 
   def on_load(self):
     self.config = pluginutil.load_config(self, {
@@ -28,15 +25,10 @@ class ModLinks(Plugin):
       "whitelist": []
     })
 
-  @staticmethod
-  def _on_moderate_impl(message : BotMessage) -> bool:
+  def _on_moderate_impl(self, message : BotMessage) -> bool:
     # TODO: Allow specific domains and paths
 
-    # findall() has been used with valid conditions for urls in string
-    regex = r"((https?://)?(([^\s()<>]+)\.)*([a-z0-9\-.]+)\.([a-z]{2,})([^\s()<>?#]*)(?:\?([^\s()<>=#&]+=[^\s()<>=#&]*)(&([^\s()<>=#&]+=[^\s()<>=#&]*))*)?(?:#([^\s()<>]*))?)"
-    urls = re.findall(regex, message.text, re.IGNORECASE)
-
-    return len(urls) > 0
+    return len(modutil.get_message_analysis(self.bot, message).urls) > 0
 
   def on_moderate(self, message : BotMessage) -> Optional[ModerationAction]:
     if not self._on_moderate_impl(message):
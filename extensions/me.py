@@ -1,13 +1,11 @@
 from typing import Optional
 
-from libtwitch import Bot, BotMessage, ModerationAction, Plugin
+from libtwitch import Bot, BotMessage, ModerationAction
 from src import modutil, pluginutil
 
-class ModMe(Plugin):
+class ModMe(modutil.ModerationPlugin):
   name = "mod.me"
-  def __init__(self, bot):
-    super().__init__(bot)
-    self.config = None
+  moderation_cost = 1
 
   def on_load(self):
     self.config = pluginutil.load_config(self, {
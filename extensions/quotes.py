@@ -6,7 +6,7 @@ from dataclasses import dataclass
 from datetime import datetime
 
 import libtwitch
-from libtwitch import Bot, BotMessage, Plugin
+from libtwitch import Bot, BotMessage, ChatterType, Command, Plugin
 from src import pluginutil, textutil
 
 @dataclass
@@ -27,6 +27,7 @@ class Quote:
 
 class FunQuotes(Plugin):
   name = "fun.quotes"
+  sheddable = True
   def __init__(self, bot):
     super().__init__(bot)
     self.config = None
@@ -115,7 +116,6 @@ class FunQuotes(Plugin):
     message.response = textutil.substitute_variables(self.config['format'], data)
 
   def _on_add_quote(self, message : BotMessage, args : list[str]):
-    # TODO: Only allow moderators and the broadcaster
     quotes = self._load_quotes(message.channel)
 
     data = {
@@ -136,7 +136,6 @@ class FunQuotes(Plugin):
     self._save_quotes(message.channel, quotes)
 
   def _on_rem_quote(self, message : BotMessage, args : list[str]):
-    # TODO: Only allow moderators and the broadcaster
     quotes = self._load_quotes(message.channel)
 
     data = {
@@ -170,13 +169,12 @@ class FunQuotes(Plugin):
 
     self._save_quotes(message.channel, quotes)
 
-  def on_command(self, message : BotMessage, cmd : str, args : list[str]):
-    if cmd == "quote":
-      return self._on_quote(message, args)
-    elif cmd in ["addquote", "quote+"]:
-      return self._on_add_quote(message, args)
-    elif cmd in ["removequote", "deletequote", "remquote", "delquote", "quote-"]:
-      return self._on_rem_quote(message, args)
+  def get_commands(self) -> list[Command]:
+    return [
+      Command("quote", self._on_quote),
+      Command("addquote", self._on_add_quote, ["quote+"], required_type=ChatterType.Moderator),
+      Command("removequote", self._on_rem_quote, ["deletequote", "remquote", "delquote", "quote-"], required_type=ChatterType.Moderator),
+    ]
 
 def setup(bot : Bot):
   bot.register_plugin(FunQuotes(bot))
@@ -1,13 +1,11 @@
 from typing import Optional
 
-from libtwitch import Bot, BotMessage, ModerationAction, Plugin
-from src import modutil, pluginutil, textutil
+from libtwitch import Bot, BotMessage, ModerationAction
+from src import modutil, pluginutil
 
-class ModSymbols(Plugin):
+class ModSymbols(modutil.ModerationPlugin):
   name = "mod.symbols"
-  def __init__(self, bot):
-    super().__init__(bot)
-    self.config = None
+  moderation_cost = 3
 
   def on_load(self):
     self.config = pluginutil.load_config(self, {
@@ -30,7 +28,7 @@ class ModSymbols(Plugin):
     })
 
   def on_moderate(self, message : BotMessage) -> Optional[ModerationAction]:
-    contains, symol_range = textutil.contains_symbols(message.text)
+    contains, symol_range = modutil.get_message_analysis(self.bot, message).symbols
     if not contains:
       return None
 
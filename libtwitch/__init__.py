@@ -3,12 +3,24 @@ __author__ = 'Andr3as07'
 
 __version__ = '1.0.0'
 
-from libtwitch.irc.enums import ChatterType, SubscriptionTier, SubGiftEventType, SubEventType, RitualType, str2ritual, str2subtier
+from libtwitch.metrics.registry import Counter, Gauge, Histogram, MetricsRegistry, REGISTRY
+from libtwitch.metrics.exporter import MetricsLogger, MetricsServer
+
+from libtwitch.irc.enums import ChatterType, DuplicateMode, EgressLane, EgressPriority, LatencyStage, SubscriptionTier, SubGiftEventType, SubEventType, RitualType, str2ritual, str2subtier
 from libtwitch.irc.channel import IrcChannel
 from libtwitch.irc.chatter import IrcChatter
 from libtwitch.irc.message import IrcMessage
-from libtwitch.irc.events import ChatEvent, RaidEvent, SubEvent, SubGiftEvent, MessageEvent, RitualType, SubEventType, SubGiftEventType, ChannelEvent, RitualEvent
-from libtwitch.irc.connection import IrcConnection, RATE_USER, RATE_MODERATOR
+from libtwitch.irc.events import ChatEvent, RaidEvent, SubEvent, SubGiftEvent, MessageEvent, RitualType, SubEventType, SubGiftEventType, ChannelEvent, RitualEvent, ClearChatEvent, ClearMessageEvent, NoticeEvent
+from libtwitch.irc.parser import IrcLine, parse_line
+from libtwitch.irc.framer import LineFramer
+from libtwitch.irc.tags import parse_tags, unescape_tag_value
+from libtwitch.irc.dispatch import ChannelDispatcher, DISPATCH_WORKERS
+from libtwitch.irc.overload import OverloadController
+from libtwitch.irc.latency import LatencyHistogram, LatencyStats, latency_origin
+from libtwitch.irc.capture import TrafficRecorder, ReplayResult, read_capture, replay_capture
+from libtwitch.irc.connection import IrcConnection, JoinProgress, RATE_USER, RATE_MODERATOR
+from libtwitch.irc.async_connection import AsyncIrcConnection
+from libtwitch.irc.pool import ConnectionPool, PooledConnection
 
 from libtwitch.api.enums import BroadcasterType, UserType, RequestCacheBehaviour, RequestRatelimitBehaviour, RequestPriority
 from libtwitch.api.dataclasses import User, Follow
@@ -17,7 +29,11 @@ from libtwitch.api.client import TwitchAPIClient
 
 from libtwitch.bot.enums import PluginEvent, ModerationActionType
 from libtwitch.bot.message import BotMessage
+from libtwitch.bot.profiler import PluginProfiler, ProfileEntry
+from libtwitch.bot.command import Command, CommandRegistry, CooldownTracker
 from libtwitch.bot.bot import Bot
+from libtwitch.bot.async_bot import AsyncBot
+from libtwitch.bot.pooled_bot import PooledBot
 from libtwitch.bot.plugin import Plugin
 from libtwitch.bot.moderation_action import ModerationAction
 
@@ -1,5 +1,6 @@
 import threading
 from queue import PriorityQueue
+from time import perf_counter
 from typing import Optional
 
 import requests
@@ -7,6 +8,18 @@ from redis import Redis
 from requests import Response
 
 import libtwitch
+from libtwitch.metrics.registry import REGISTRY
+
+CACHE_LOOKUPS = REGISTRY.counter("twitch_api_cache_lookups", "Request cache lookups", ("result",))
+REQUEST_SECONDS = REGISTRY.histogram("twitch_api_request_seconds", "Duration of web requests")
+QUEUE_DEPTH = REGISTRY.gauge("twitch_api_queue_depth", "Requests waiting for the request thread")
+
+def _timed_get(url : str) -> Response:
+  start = perf_counter()
+  try:
+    return requests.get(url)
+  finally:
+    REQUEST_SECONDS.observe(perf_counter() - start)
 
 class RequestHandler:
   def __init__(self, cache_duration : int = 60, redis : Optional[Redis] = None):
@@ -19,6 +32,11 @@ class RequestHandler:
     self._request_thread : Optional[threading.Thread] = None
     self._running : bool = False
 
+    QUEUE_DEPTH.track(self._queue_depth_metric)
+
+  def _queue_depth_metric(self) -> int:
+    return self._queue.qsize()
+
   def _queue_request(self, priority : int, url : str, callback):
     with self._queue_lock:
       print("_queue_request: priority=%s, url=%s" % (priority, url))
@@ -27,12 +45,12 @@ class RequestHandler:
   @staticmethod
   def get_request_web_sync(url: str) -> str:
     print("get_request_web_sync: url=%s" % url)
-    response = requests.get(url)
+    response = _timed_get(url)
     return response.text
 
   @staticmethod
   def _get_request_web(url : str, callback : callable = None) -> None:
-    response = requests.get(url)
+    response = _timed_get(url)
     callback(response.text)
 
   def get_request_redis_sync(self, url : str) -> Optional[dict]:
@@ -41,7 +59,9 @@ class RequestHandler:
 
     raw_str = self._redis.get("GET %s" % url)
     if raw_str is None:
+      CACHE_LOOKUPS.inc(("miss",))
       return None
+    CACHE_LOOKUPS.inc(("hit",))
 
     return raw_str
 
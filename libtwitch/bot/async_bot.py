@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import inspect
+
+import libtwitch
+from libtwitch.bot.bot import Bot
+from libtwitch.irc.async_connection import AsyncIrcConnection
+from libtwitch.irc.latency import latency_origin
+
+class AsyncBot(Bot, AsyncIrcConnection):
+  """
+  a Bot running on an AsyncIrcConnection
+  plugin handlers may be coroutines, they are awaited in plugin order before the next line is dispatched
+  """
+  def _on_event(self, event : libtwitch.PluginEvent, *args, **kwargs):
+    for plugin_name, handler in self._event_handlers(event):
+      result = self._call_plugin(plugin_name, handler, event, args, kwargs)
+      if inspect.isawaitable(result):
+        self._defer(result)
+
+  def _run_command(self, msg : libtwitch.BotMessage, cmd : str, args : list[str]):
+    result = super()._run_command(msg, cmd, args)
+    if inspect.isawaitable(result):
+      self._defer(result)
+    return None
+
+  async def _on_event_async(self, event : libtwitch.PluginEvent, *args, **kwargs):
+    for plugin_name, handler in self._event_handlers(event):
+      result = self._call_plugin(plugin_name, handler, event, args, kwargs)
+      if inspect.isawaitable(result):
+        await result
+
+  async def _moderate_async(self, msg : libtwitch.BotMessage):
+    steps = self._moderation_steps(msg)
+    try:
+      action = next(steps)
+      while True:
+        if inspect.isawaitable(action):
+          action = await action
+        action = steps.send(action)
+    except StopIteration:
+      pass
+
+  def on_privmsg(self, raw_msg : libtwitch.IrcMessage):
+    self._defer(self._on_privmsg_async(raw_msg))
+
+  async def _on_privmsg_async(self, raw_msg : libtwitch.IrcMessage):
+    msg = libtwitch.BotMessage.from_raw_message(raw_msg)
+
+    # Ignore self (echo)
+    if msg.author.login.strip().lower() == self.nickname:
+      return
+
+    await self._moderate_async(msg)
+
+    await self._on_event_async(libtwitch.PluginEvent.Message.Privmsg, msg)
+
+    # Handle command
+    is_command = self._handle_command(msg)
+    if not is_command:
+      # This is a normal message
+      self.on_message(msg)
+    with latency_origin(libtwitch.LatencyStage.CommandToReply, msg.parsed if is_command else None):
+      await self._drain_deferred() # Replies of coroutine command handlers are sent from here
+
+    self._respond(msg, is_command)
+    self.datastore.sync()
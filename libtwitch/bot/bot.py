@@ -2,10 +2,35 @@ from __future__ import annotations
 import importlib
 import logging
 import sys
-from typing import Any
+from time import monotonic, perf_counter
+from typing import Any, Callable, Generator, Iterator, Optional
 
 import libtwitch
+from libtwitch.bot.command import CommandRegistry
+from libtwitch.bot.profiler import PluginProfiler
 from libtwitch.datastore.datastore import Datastore
+from libtwitch.irc.latency import latency_origin
+from libtwitch.metrics.registry import REGISTRY
+
+# Events that are withheld from sheddable plugins while the bot is overloaded
+SHEDDABLE_EVENTS = [
+  libtwitch.PluginEvent.RawIngress,
+  libtwitch.PluginEvent.RawEgress,
+  libtwitch.PluginEvent.ChatterJoin,
+  libtwitch.PluginEvent.ChatterPart,
+  libtwitch.PluginEvent.Privmsg,
+  libtwitch.PluginEvent.Message,
+  libtwitch.PluginEvent.Command,
+]
+
+EVENTS = REGISTRY.counter("twitch_bot_events", "Plugin events raised by the bot", ("event",))
+HANDLER_SECONDS = REGISTRY.histogram("twitch_bot_handler_seconds", "Time plugins spent handling events", ("plugin",))
+COMMANDS = REGISTRY.counter("twitch_bot_commands", "Registered commands used in chat", ("command", "result"))
+MODERATION_SHORT_CIRCUITS = REGISTRY.counter("twitch_bot_moderation_short_circuits", "Messages whose moderation stopped before every plugin ran")
+MODERATION_SKIPPED = REGISTRY.counter("twitch_bot_moderation_skipped", "Moderation plugins skipped because they could not decide a harsher action", ("plugin",))
+
+# Severity of a moderation plugin that does not know its harshest action, nothing is harsher
+UNBOUNDED_SEVERITY = (float("inf"), float("inf"))
 
 class Bot(libtwitch.IrcConnection):
   def __init__(self, nickname : str, token : str, store : Datastore, prefix : str = '!'):
@@ -18,6 +43,11 @@ class Bot(libtwitch.IrcConnection):
 
     self._extensions : dict[str, Any] = {}
     self._plugins : dict[str, libtwitch.Plugin] = {}
+    self._handlers : dict[libtwitch.PluginEvent, list[tuple[str, libtwitch.Plugin, Callable]]] = self._build_handlers()
+    self._moderators : list[tuple[str, Callable, tuple]] = self._build_moderators()
+    self.moderation_short_circuit : bool = True # Skip moderation plugins that can not decide a harsher action
+    self.profiler : PluginProfiler = PluginProfiler() # Disabled until profiler.enable() is called
+    self.commands : CommandRegistry = CommandRegistry()
 
   def get_logger_for_plugin(self, plugin: libtwitch.Plugin) -> logging.Logger:
     logger : logging.Logger = logging.getLogger(plugin.get_name())
@@ -48,7 +78,12 @@ class Bot(libtwitch.IrcConnection):
 
     name = plugin.get_name()
     self._plugins[name] = plugin
+    self._handlers = self._build_handlers()
     plugin.on_event(libtwitch.PluginEvent.SelfLoad)
+    self._moderators = self._build_moderators() # The harshest actions depend on the loaded config
+    for command in plugin.get_commands():
+      for conflict in self.commands.register(command, name):
+        self.logger.warning("Plugin %s can not register command %s, it is already taken." % (name, conflict))
 
     for other_plugin_name in self._plugins: # Inform all other plugins
       if other_plugin_name == name:
@@ -64,13 +99,81 @@ class Bot(libtwitch.IrcConnection):
     plugin = self._plugins.pop(name, None)
     if plugin is None:
       return
+    self._handlers = self._build_handlers()
+    self._moderators = self._build_moderators()
+    self.commands.unregister_plugin(name)
 
     plugin.on_event(libtwitch.PluginEvent.SelfUnload) # Inform the plugin of it's own unloading
     self._on_event(libtwitch.PluginEvent.PluginUnload, name) # Inform all other plugins
 
+  def _build_handlers(self) -> dict[libtwitch.PluginEvent, list[tuple[str, libtwitch.Plugin, Callable]]]:
+    """
+    :return: per event the name, the plugin and the bound handler of only the plugins that handle it, in registration order
+    """
+    handlers = {event: [] for event in libtwitch.PluginEvent}
+    for plugin_name, plugin in self._plugins.items():
+      for event, handler in plugin.get_event_handlers().items():
+        handlers[event].append((plugin_name, plugin, handler))
+    return handlers
+
+  def _build_moderators(self) -> list[tuple[str, Callable, tuple]]:
+    """
+    :return: the name, the bound on_moderate and the harshest severity it or any later plugin can decide
+             for every moderation plugin, cheapest first
+    """
+    moderators = sorted(self._handlers[libtwitch.PluginEvent.Moderate], key=lambda entry: entry[1].moderation_cost)
+    result = []
+    remaining = None
+    for plugin_name, plugin, handler in reversed(moderators):
+      max_action = plugin.get_max_moderation_action()
+      severity = UNBOUNDED_SEVERITY if max_action is None else max_action.severity
+      if remaining is None or severity > remaining:
+        remaining = severity
+      result.append((plugin_name, handler, remaining))
+    result.reverse()
+    return result
+
+  def _skip_moderators(self, moderators : list[tuple[str, Callable, tuple]], index : int, harshest_action : libtwitch.ModerationAction) -> bool:
+    """
+    :param index: the first moderation plugin that did not run yet
+    :return: whether none of the remaining plugins can decide a harsher action, in which case they are counted as skipped
+    """
+    if harshest_action is None or not self.moderation_short_circuit or harshest_action.severity < moderators[index][2]:
+      return False
+    MODERATION_SHORT_CIRCUITS.inc()
+    for plugin_name, _, _ in moderators[index:]:
+      MODERATION_SKIPPED.inc((plugin_name,))
+    return True
+
+  def _event_handlers(self, event : libtwitch.PluginEvent) -> Iterator[tuple[str, Callable]]:
+    """
+    counts the event
+    :return: the name and the handler of every plugin the event is delivered to, sheddable plugins are left out while shedding
+    """
+    EVENTS.inc((event.name,))
+    shedding = self.is_shedding and event in SHEDDABLE_EVENTS
+    for plugin_name, plugin, handler in self._handlers[event]:
+      if shedding and plugin.sheddable:
+        self.overload.count("plugin_event")
+        continue
+      yield plugin_name, handler
+
   def _on_event(self, event : libtwitch.PluginEvent, *args, **kwargs):
-    for plugin_name in self._plugins:
-      self._plugins[plugin_name].on_event(event, *args, **kwargs)
+    for plugin_name, handler in self._event_handlers(event):
+      self._call_plugin(plugin_name, handler, event, args, kwargs)
+
+  def _call_plugin(self, plugin_name : str, handler : Callable, event : libtwitch.PluginEvent, args, kwargs):
+    profiler = self.profiler
+    start = perf_counter()
+    if profiler.capture_plugin == plugin_name:
+      result = profiler.run_captured(handler, *args, **kwargs)
+    else:
+      result = handler(*args, **kwargs)
+    duration = perf_counter() - start
+    HANDLER_SECONDS.observe(duration, (plugin_name,))
+    if profiler.enabled:
+      profiler.record(plugin_name, event, duration)
+    return result
 
   def load_extension(self, path : str):
     path = "extensions." + path
@@ -225,27 +328,82 @@ class Bot(libtwitch.IrcConnection):
       assert False, "unreachable"
     args.pop(0)
 
-    self.on_command(msg, cmd, args)
+    with latency_origin(libtwitch.LatencyStage.CommandToReply, msg.parsed):
+      self.on_command(msg, cmd, args)
     return True
 
   def on_command(self, msg : libtwitch.BotMessage, cmd : str, args : list[str]):
+    self._run_command(msg, cmd, args)
     self._on_event(libtwitch.PluginEvent.Command, msg, cmd, args)
 
-  def _moderate(self, msg : libtwitch.BotMessage):
+  def _run_command(self, msg : libtwitch.BotMessage, cmd : str, args : list[str]):
+    """
+    calls the handler of the registered command, if any, unless the chatter lacks the permission or it is cooling down
+    """
+    command = self.commands.get(cmd)
+    if command is None:
+      return None
+    if not command.is_allowed(msg.author):
+      COMMANDS.inc((command.name, "denied"))
+      return None
+    plugin = self._plugins.get(command.plugin_name)
+    if self.is_shedding and plugin is not None and plugin.sheddable:
+      self.overload.count("plugin_event")
+      return None
+    if not self.commands.try_start_cooldown(command, msg.author, monotonic()):
+      COMMANDS.inc((command.name, "cooldown"))
+      return None
+    COMMANDS.inc((command.name, "handled"))
+    return self._call_plugin(command.plugin_name, command.handler, libtwitch.PluginEvent.Command, (msg, args), {})
+
+  def _moderation_steps(self, msg : libtwitch.BotMessage) -> Generator[Any, Optional[libtwitch.ModerationAction], None]:
+    """
+    runs the moderation plugins in cost order until none of the remaining ones can decide a harsher action
+    yields what every on_moderate returned and expects the moderation action back, so coroutines can be awaited in between
+    """
     if msg.author.has_type(libtwitch.ChatterType.Broadcaster) or \
       msg.author.has_type(libtwitch.ChatterType.Twitch) or \
       msg.author.has_type(libtwitch.ChatterType.Moderator):
       return
 
     harshest_action = None
-    for plugin_name in self._plugins:
-      action = self._plugins[plugin_name].on_event(libtwitch.PluginEvent.Moderate, msg)
+    moderators = self._moderators
+    for index, (plugin_name, handler, _) in enumerate(moderators):
+      if self._skip_moderators(moderators, index, harshest_action):
+        break
+      action = yield self._call_plugin(plugin_name, handler, libtwitch.PluginEvent.Moderate, (msg,), {})
       if action is None:
         continue
       if harshest_action is None or action > harshest_action:
         harshest_action = action
     if harshest_action is not None:
       msg.moderation_action = harshest_action
+    self._record_verdict(msg)
+
+  def _moderate(self, msg : libtwitch.BotMessage):
+    steps = self._moderation_steps(msg)
+    try:
+      action = next(steps)
+      while True:
+        action = steps.send(action)
+    except StopIteration:
+      pass
+
+  def _record_verdict(self, msg : libtwitch.BotMessage):
+    msg.verdict_time = monotonic()
+    self.latency.record(libtwitch.LatencyStage.ParseToVerdict, msg.channel.name, msg.verdict_time - msg.parsed)
+
+  def _respond(self, msg : libtwitch.BotMessage, is_command : bool):
+    """
+    applies the moderation verdict and sends the response of a handled message
+    """
+    with latency_origin(libtwitch.LatencyStage.VerdictToEgress, msg.verdict_time):
+      msg.invoke()
+    resp = msg.get_response()
+    if resp is not None:
+      priority = msg.get_response_priority()
+      with latency_origin(libtwitch.LatencyStage.CommandToReply, msg.parsed if is_command and priority == libtwitch.EgressPriority.Reply else None):
+        msg.channel.chat(resp, priority)
 
   def on_message(self, msg : libtwitch.BotMessage):
     self._on_event(libtwitch.PluginEvent.Message, msg)
@@ -265,14 +423,12 @@ class Bot(libtwitch.IrcConnection):
     self._on_event(libtwitch.PluginEvent.Message.Privmsg, msg)
 
     # Handle command
-    if not self._handle_command(msg):
+    is_command = self._handle_command(msg)
+    if not is_command:
       # This is a normal message
       self.on_message(msg)
 
-    msg.invoke()
-    resp = msg.get_response()
-    if resp is not None:
-      msg.channel.chat(resp)
+    self._respond(msg, is_command)
     self.datastore.sync()
 
   def on_subgift(self, event : libtwitch.SubGiftEvent):
@@ -284,6 +440,21 @@ class Bot(libtwitch.IrcConnection):
   def on_ritual(self, event : libtwitch.RitualEvent):
     self._on_event(libtwitch.PluginEvent.Ritual, event)
 
+  def on_clearchat(self, event : libtwitch.ClearChatEvent):
+    self._on_event(libtwitch.PluginEvent.ClearChat, event)
+
+  def on_clearmsg(self, event : libtwitch.ClearMessageEvent):
+    self._on_event(libtwitch.PluginEvent.ClearMessage, event)
+
+  def on_userstate(self, channel : libtwitch.IrcChannel, tags : dict[str, str]):
+    self._on_event(libtwitch.PluginEvent.UserState, channel, tags)
+
+  def on_notice(self, event : libtwitch.NoticeEvent):
+    self._on_event(libtwitch.PluginEvent.Notice, event)
+
+  def on_reconnect(self):
+    self._on_event(libtwitch.PluginEvent.Reconnect)
+
   @staticmethod
   def get_config_dir():
     return "./config"
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import heapq
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Optional
+
+import libtwitch
+from libtwitch.irc.enums import ChatterType
+
+@dataclass
+class Command:
+  """
+  a chat command a plugin handles, the handler is called with the message and the space separated arguments
+  """
+  name : str
+  handler : Callable[[libtwitch.BotMessage, list[str]], Any]
+  aliases : list[str] = field(default_factory=list)
+  required_type : ChatterType = ChatterType.Unknown # The chatter needs one of these types, Unknown allows everyone
+  user_cooldown : float = 0 # Seconds before the same chatter may use the command again in the same channel
+  channel_cooldown : float = 0 # Seconds before anyone may use the command again in the same channel
+  exempt_type : ChatterType = ChatterType.Broadcaster | ChatterType.Moderator # Chatters that ignore the cooldowns
+  plugin_name : Optional[str] = None # Set by the bot when the command is registered
+
+  @property
+  def names(self) -> list[str]:
+    return [self.name] + self.aliases
+
+  def is_allowed(self, chatter : libtwitch.IrcChatter) -> bool:
+    if self.required_type == ChatterType.Unknown:
+      return True
+    if chatter.login == chatter.channel.name: # The broadcaster may use every command
+      return True
+    return chatter.has_type(self.required_type)
+
+class CooldownTracker:
+  """
+  remembers until when keys are cooling down
+  lookups are a single dict access, expired keys are purged in expiry order from a heap whenever a cooldown starts
+  """
+  def __init__(self):
+    self._until : dict[Hashable, float] = {}
+    self._expiry : list[tuple[float, Hashable]] = []
+    self._lock : threading.Lock = threading.Lock() # Channels are handled on several threads
+
+  def remaining(self, key : Hashable, now : float) -> float:
+    """
+    :return: the seconds until the key may be used again, 0 if it is not cooling down
+    """
+    until = self._until.get(key)
+    if until is None or until <= now:
+      return 0
+    return until - now
+
+  def try_start(self, cooldowns : list[tuple[Hashable, float]], now : float) -> bool:
+    """
+    starts all cooldowns at once unless one of the keys is still cooling down
+    :param cooldowns: (key, seconds) pairs, pairs with 0 seconds are ignored
+    :return: whether the cooldowns were started
+    """
+    with self._lock:
+      for key, duration in cooldowns:
+        if duration > 0 and self.remaining(key, now) > 0:
+          return False
+      self._purge(now)
+      for key, duration in cooldowns:
+        if duration <= 0:
+          continue
+        until = now + duration
+        self._until[key] = until
+        heapq.heappush(self._expiry, (until, key))
+      return True
+
+  def _purge(self, now : float) -> None:
+    expiry = self._expiry
+    while len(expiry) > 0 and expiry[0][0] <= now:
+      until, key = heapq.heappop(expiry)
+      if self._until.get(key) == until:
+        del self._until[key]
+
+  def clear(self) -> None:
+    with self._lock:
+      self._until = {}
+      self._expiry = []
+
+  def __len__(self) -> int:
+    return len(self._until)
+
+class CommandRegistry:
+  """
+  maps every command name and alias to its command
+  """
+  def __init__(self):
+    self._commands : dict[str, Command] = {}
+    self.cooldowns : CooldownTracker = CooldownTracker()
+
+  def register(self, command : Command, plugin_name : Optional[str] = None) -> list[str]:
+    """
+    :return: the names that were already taken by another command and were not registered
+    """
+    command.plugin_name = plugin_name
+    conflicts = []
+    commands = dict(self._commands)
+    for name in command.names:
+      name = name.lower()
+      if name in commands:
+        conflicts.append(name)
+        continue
+      commands[name] = command
+    self._commands = commands # Swapped at once, lookups run on the dispatch workers
+    return conflicts
+
+  def unregister_plugin(self, plugin_name : str) -> None:
+    self._commands = {name: command for name, command in self._commands.items() if command.plugin_name != plugin_name}
+
+  def get(self, name : str) -> Optional[Command]:
+    """
+    :param name: the lower case command name or alias
+    """
+    return self._commands.get(name)
+
+  @property
+  def commands(self) -> list[Command]:
+    return list({id(command): command for command in self._commands.values()}.values())
+
+  def try_start_cooldown(self, command : Command, chatter : libtwitch.IrcChatter, now : float) -> bool:
+    """
+    :return: whether the chatter may use the command now, in which case its cooldowns start
+    """
+    if command.user_cooldown <= 0 and command.channel_cooldown <= 0:
+      return True
+    if chatter.has_type(command.exempt_type) or chatter.login == chatter.channel.name:
+      return True
+    channel_name = chatter.channel.name
+    return self.cooldowns.try_start([
+      ((command.name, channel_name, chatter.login), command.user_cooldown),
+      ((command.name, channel_name), command.channel_cooldown),
+    ], now)
@@ -34,6 +34,11 @@ class PluginEvent(Enum):
   Unraid = auto() # TODO
   Ritual = auto() # TODO
   BitsBadgeTier = auto() # TODO
+  ClearChat = auto()
+  ClearMessage = auto()
+  UserState = auto()
+  Notice = auto()
+  Reconnect = auto()
 
   # Community events
   Bits = auto()
@@ -7,13 +7,20 @@ import libtwitch
 class BotMessage(libtwitch.IrcMessage):
   @classmethod
   def from_raw_message(cls, msg : libtwitch.IrcMessage) -> BotMessage:
-    return BotMessage(msg.channel, msg.author, msg.text, msg.tags)
+    result = BotMessage(msg.channel, msg.author, msg.text, msg.tags)
+    result._id = msg._id
+    result._event = msg._event
+    result._received = msg._received
+    result._parsed = msg._parsed
+    result._sent = msg._sent
+    return result
 
   def __init__(self, channel : libtwitch.IrcChannel, author : libtwitch.IrcChatter, text : str, tags : dict[str, str]):
     super().__init__(channel, author, text, tags)
 
     self.response : Optional[str] = None
     self.moderation_action : Optional[libtwitch.ModerationAction] = None
+    self.verdict_time : Optional[float] = None # Monotonic time the moderation plugins decided, None if not moderated
     self.custom_data : dict[str, Any] = {}
 
   def get_response(self) -> str:
@@ -21,6 +28,11 @@ class BotMessage(libtwitch.IrcMessage):
       return self.moderation_action.response
     return self.response
 
+  def get_response_priority(self) -> libtwitch.EgressPriority:
+    if self.moderation_action is not None and self.moderation_action.response is not None:
+      return libtwitch.EgressPriority.Info
+    return libtwitch.EgressPriority.Reply
+
   def invoke(self) -> None:
     from libtwitch import ModerationActionType
 
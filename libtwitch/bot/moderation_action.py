@@ -12,6 +12,15 @@ class ModerationAction:
     self.response : str = response
     self.duration : int = duration
 
+  @property
+  def severity(self) -> tuple[int, float]:
+    """
+    :return: how harsh the action is, ignoring the reason and the response
+    """
+    if self.action == libtwitch.ModerationActionType.Timeout:
+      return int(self.action), self.duration
+    return int(self.action), 0
+
   def __eq__(self, other : ModerationAction) -> bool:
     if self.action == other.action:
       if self.action == libtwitch.ModerationActionType.Timeout:
@@ -2,15 +2,54 @@ from __future__ import annotations
 
 import logging
 import os
-from typing import Union
+from functools import partial
+from typing import Awaitable, Callable, Optional, Union
 
 import libtwitch
 from libtwitch import PluginEvent
 
 DEFAULT_PLUGIN_NAME = 'UNNAMED PLUGIN'
 
+# The handler every event is delivered to, the event arguments are passed on as they are
+EVENT_HANDLERS : dict[PluginEvent, str] = {
+  # Bot events
+  PluginEvent.Destruct: "on_destruct",
+
+  # IRC events
+  PluginEvent.RawIngress: "on_raw_ingress",
+  PluginEvent.RawEgress: "on_raw_egress",
+  PluginEvent.Connect: "on_connect",
+  PluginEvent.Disconnect: "on_disconnect",
+  PluginEvent.Unknown: "on_unknown",
+  PluginEvent.ChannelJoin: "on_channel_join",
+  PluginEvent.ChannelPart: "on_channel_part",
+  PluginEvent.ChatterJoin: "on_chatter_join",
+  PluginEvent.ChatterPart: "on_chatter_part",
+  PluginEvent.Moderate: "on_moderate",
+  PluginEvent.Privmsg: "on_privmsg",
+  PluginEvent.Message: "on_message",
+  PluginEvent.Command: "on_command",
+  PluginEvent.RoomstateChange: "on_roomstate",
+  PluginEvent.SubGift: "on_subgift",
+  PluginEvent.Raid: "on_raid",
+  PluginEvent.Ritual: "on_ritual",
+  PluginEvent.ClearChat: "on_clearchat",
+  PluginEvent.ClearMessage: "on_clearmsg",
+  PluginEvent.UserState: "on_userstate",
+  PluginEvent.Notice: "on_notice",
+  PluginEvent.Reconnect: "on_reconnect",
+
+  # Plugin events
+  PluginEvent.SelfLoad: "on_load",
+  PluginEvent.SelfUnload: "on_unload",
+  PluginEvent.PluginLoad: "on_plugin_load",
+  PluginEvent.PluginUnload: "on_plugin_unload",
+}
+
 class Plugin:
   name = DEFAULT_PLUGIN_NAME
+  sheddable = False # Whether chat events may be withheld from the plugin while the bot is overloaded
+  moderation_cost = 5 # Estimated cost of on_moderate, cheaper plugins moderate a message first
 
   @classmethod
   def get_name(cls):
@@ -22,58 +61,37 @@ class Plugin:
     self.bot = bot
     self.logger : logging.Logger = bot.get_logger_for_plugin(self)
 
-  def on_event(self, plugin_event : PluginEvent, *args, **kwargs) -> Union[None, libtwitch.ModerationAction]:
-    # Bot events
-    if plugin_event == PluginEvent.Destruct:
-      self.on_destruct()
-
-    # IRC events
-    elif plugin_event == PluginEvent.RawIngress:
-      self.on_raw_ingress(args[0])
-    elif plugin_event == PluginEvent.RawEgress:
-      self.on_raw_egress(args[0])
-    elif plugin_event == PluginEvent.Connect:
-      self.on_connect()
-    elif plugin_event == PluginEvent.Disconnect:
-      self.on_disconnect()
-    elif plugin_event == PluginEvent.Unknown:
-      self.on_unknown(args[0])
-    elif plugin_event == PluginEvent.ChannelJoin:
-      self.on_channel_join(args[0])
-    elif plugin_event == PluginEvent.ChannelPart:
-      self.on_channel_part(args[0])
-    elif plugin_event == PluginEvent.ChatterJoin:
-      self.on_chatter_join(args[0])
-    elif plugin_event == PluginEvent.ChatterPart:
-      self.on_chatter_part(args[0])
-    elif plugin_event == PluginEvent.Moderate:
-      return self.on_moderate(args[0])
-    elif plugin_event == PluginEvent.Privmsg:
-      self.on_privmsg(args[0])
-    elif plugin_event == PluginEvent.Message:
-      self.on_message(args[0])
-    elif plugin_event == PluginEvent.Command:
-      self.on_command(args[0], args[1], args[2])
-    elif plugin_event == PluginEvent.RoomstateChange:
-      self.on_roomstate(args[0], args[1])
-    elif plugin_event == PluginEvent.SubGift:
-      self.on_subgift(args[0])
-    elif plugin_event == PluginEvent.Raid:
-      self.on_raid(args[0])
-    elif plugin_event == PluginEvent.Ritual:
-      self.on_ritual(args[0])
-
-    # Plugin events
-    elif plugin_event == PluginEvent.SelfLoad:
-      self.on_load()
-    elif plugin_event == PluginEvent.SelfUnload:
-      self.on_unload()
-    elif plugin_event == PluginEvent.PluginLoad:
-      self.on_plugin_load(args[0])
-    elif plugin_event == PluginEvent.PluginUnload:
-      self.on_plugin_unload(args[0])
-    else:
+  def on_event(self, plugin_event : PluginEvent, *args, **kwargs) -> Union[None, libtwitch.ModerationAction, Awaitable]:
+    handler_name = EVENT_HANDLERS.get(plugin_event)
+    if handler_name is None:
       print("ERROR: Unhandled event %s" % plugin_event)
+      return None
+    return getattr(self, handler_name)(*args)
+
+  def get_event_handlers(self) -> dict[PluginEvent, Callable]:
+    """
+    :return: the bound handler for every event this plugin overrides a handler for,
+             a plugin that overrides on_event itself receives every event through it
+    """
+    cls = type(self)
+    if cls.on_event is not Plugin.on_event:
+      return {event: partial(self.on_event, event) for event in PluginEvent}
+    return {event: getattr(self, name) for event, name in EVENT_HANDLERS.items() if getattr(cls, name) is not getattr(Plugin, name)}
+
+  def get_commands(self) -> list[libtwitch.Command]:
+    """
+    called when the plugin is registered
+    :return: the chat commands this plugin handles, the bot routes matching messages straight to their handlers
+    """
+    return []
+
+  def get_max_moderation_action(self) -> Optional[libtwitch.ModerationAction]:
+    """
+    called after the plugin is loaded
+    :return: the harshest action on_moderate can return, the bot skips the plugin once a harsher or equal action has been
+             decided, None if it is unknown (the plugin is never skipped)
+    """
+    return None
 
   # Bot events
   def on_destruct(self):
@@ -160,6 +178,7 @@ class Plugin:
   def on_command(self, message : libtwitch.BotMessage, cmd : str, args : dict[str, str]):
     """
     called when a command is recognized in a channel
+    note: this is called for every command, commands declared in get_commands are routed to their handler directly
     :param message: the received message
     :param cmd: the recognized command name
     :param args: the parsed arguments of the command
@@ -190,6 +209,37 @@ class Plugin:
     :param event: the event data
     """
 
+  def on_clearchat(self, event : libtwitch.ClearChatEvent):
+    """
+    called when a chatter is timed out or banned or the whole chat is cleared
+    :param event: the event data
+    """
+
+  def on_clearmsg(self, event : libtwitch.ClearMessageEvent):
+    """
+    called when a single message is deleted
+    :param event: the event data
+    """
+
+  def on_userstate(self, channel : libtwitch.IrcChannel, tags : dict[str, str]):
+    """
+    called when the state of the bot user in a channel changes
+    :param channel: the channel
+    :param tags: the new set of tags that are applied to the bot user
+    """
+
+  def on_notice(self, event : libtwitch.NoticeEvent):
+    """
+    called when the server sends a notice
+    note: the channel of the event is None for global notices
+    :param event: the event data
+    """
+
+  def on_reconnect(self):
+    """
+    called when the twitch irc servers request the connection to be reestablished
+    """
+
   # Plugin events
   def on_load(self):
     """
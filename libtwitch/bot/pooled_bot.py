@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from libtwitch.bot.bot import Bot
+from libtwitch.datastore.datastore import Datastore
+from libtwitch.irc.pool import CHANNELS_PER_CONNECTION, ConnectionPool
+
+class PooledBot(Bot, ConnectionPool):
+  """
+  a Bot whose channels are spread across a ConnectionPool
+  """
+  def __init__(self, nickname : str, token : str, store : Datastore, prefix : str = '!',
+               channels_per_connection : int = CHANNELS_PER_CONNECTION):
+    super().__init__(nickname, token, store, prefix)
+    self.channels_per_connection = channels_per_connection
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import cProfile
+import pstats
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import libtwitch
+from libtwitch.irc.latency import LatencySamples
+
+@dataclass
+class ProfileEntry:
+  plugin : str
+  event : libtwitch.PluginEvent
+  count : int
+  total : float # seconds
+  p99 : float # seconds
+  max : float # seconds
+
+  @property
+  def mean(self) -> float:
+    if self.count == 0:
+      return 0
+    return self.total / self.count
+
+class PluginProfiler:
+  """
+  records how long every plugin takes to handle every kind of event while enabled
+  one plugin can additionally be captured with cProfile to see where inside the plugin the time goes
+  """
+  def __init__(self):
+    self.enabled : bool = False
+    self._timings : dict[tuple[str, libtwitch.PluginEvent], LatencySamples] = {}
+    self._lock : threading.Lock = threading.Lock()
+
+    self.capture_plugin : Optional[str] = None
+    self._capture : Optional[cProfile.Profile] = None
+    self._capture_lock : threading.Lock = threading.Lock() # A profile can only run on one thread at a time
+
+  def enable(self) -> None:
+    self.enabled = True
+
+  def disable(self) -> None:
+    self.enabled = False
+
+  def reset(self) -> None:
+    with self._lock:
+      self._timings = {}
+
+  def record(self, plugin_name : str, event : libtwitch.PluginEvent, duration : float) -> None:
+    key = (plugin_name, event)
+    with self._lock:
+      timings = self._timings.get(key)
+      if timings is None:
+        timings = LatencySamples()
+        self._timings[key] = timings
+      timings.record(duration)
+
+  def report(self, sort_by : str = "total") -> list[ProfileEntry]:
+    """
+    :param sort_by: the ProfileEntry field to sort by, descending
+    """
+    with self._lock:
+      entries = [ProfileEntry(plugin, event, timings.count, timings.total, timings.percentile(99), timings.max)
+                 for (plugin, event), timings in self._timings.items()]
+    entries.sort(key=lambda entry: getattr(entry, sort_by), reverse=True)
+    return entries
+
+  def format_report(self, sort_by : str = "total", limit : Optional[int] = None) -> str:
+    entries = self.report(sort_by)
+    if limit is not None:
+      entries = entries[:limit]
+    lines = ["%-24s %-16s %10s %12s %10s %10s %10s" % ("plugin", "event", "calls", "total ms", "mean us", "p99 us", "max us")]
+    for entry in entries:
+      lines.append("%-24s %-16s %10d %12.1f %10.1f %10.1f %10.1f" % (
+        entry.plugin, entry.event.name, entry.count, entry.total * 1000, entry.mean * 1000000, entry.p99 * 1000000, entry.max * 1000000))
+    return "\n".join(lines)
+
+  def start_capture(self, plugin_name : str) -> None:
+    """
+    profiles every call into the plugin with cProfile until stop_capture, calls made while another thread is being
+    profiled are only timed
+    """
+    with self._capture_lock:
+      self._capture = cProfile.Profile()
+      self.capture_plugin = plugin_name
+
+  def stop_capture(self, path : Optional[str] = None) -> Optional[pstats.Stats]:
+    """
+    :param path: also dump the capture to this file (e.g. for snakeviz)
+    :return: the captured statistics or None if nothing was captured
+    """
+    with self._capture_lock:
+      capture = self._capture
+      self._capture = None
+      self.capture_plugin = None
+    if capture is None:
+      return None
+    if path is not None:
+      capture.dump_stats(path)
+    try:
+      return pstats.Stats(capture)
+    except TypeError:
+      return None # The plugin was not called during the capture
+
+  def run_captured(self, func : Callable, *args, **kwargs) -> Any:
+    if not self._capture_lock.acquire(blocking=False):
+      return func(*args, **kwargs)
+    try:
+      capture = self._capture
+      if capture is None:
+        return func(*args, **kwargs)
+      return capture.runcall(func, *args, **kwargs)
+    finally:
+      self._capture_lock.release()
@@ -1,16 +1,27 @@
 import io
 import json
 import os
+import threading
+from time import perf_counter
 from typing import Any, Optional
 from redis import Redis
 
 import libtwitch
+from libtwitch.metrics.registry import REGISTRY
+
+FILE_LOADS = REGISTRY.counter("twitch_datastore_file_loads", "Datastore file lookups by the tier that had the file", ("source",))
+SYNC_SECONDS = REGISTRY.histogram("twitch_datastore_sync_seconds", "Duration of datastore syncs")
+SYNCED_FILES = REGISTRY.counter("twitch_datastore_synced_files", "Dirty files written to disk")
+DIRTY_FILES = REGISTRY.gauge("twitch_datastore_dirty_files", "Files changed since the last sync")
 
 class FileDatastoreFile:
   def __init__(self, key : str, data : dict):
     self.data = data
     self.dirty = False
     self.key = key
+    self.version : int = 0 # Number of the latest redis snapshot, an older snapshot never overwrites a newer one
+    self.published : int = 0 # Number of the snapshot redis holds
+    self.redis_lock : threading.Lock = threading.Lock() # Only writers of the same file wait for each other
 
 def _ensure_dir(file_path : str):
   dir_path = os.path.dirname(file_path)
@@ -22,6 +33,14 @@ class FileDatastore(libtwitch.Datastore):
     self._cache_global = None # TODO
     self._cache : dict[str, FileDatastoreFile] = {}
     self._redis : Optional[Redis] = redis
+    self._lock : threading.RLock = threading.RLock() # Channels are handled on several threads
+    self._sync_lock : threading.Lock = threading.Lock() # Keeps an older snapshot from overwriting a newer one on disk
+
+    DIRTY_FILES.track(self._dirty_files_metric)
+
+  def _dirty_files_metric(self) -> int:
+    with self._lock:
+      return sum(1 for file in self._cache.values() if file.dirty)
 
   def _get_filekey(self, subject : libtwitch.DatastoreDomainType) -> Optional[str]:
     domain = self._get_domain(subject)
@@ -35,10 +54,28 @@ class FileDatastore(libtwitch.Datastore):
       return "global"
     return None
 
-  def _redis_set(self, file : FileDatastoreFile):
-    if self._redis is not None:
-      self._redis.set(file.key, json.dumps(file.data).encode("utf-8"))
-      self._redis.set(file.key + ".dirty", int(file.dirty))
+  def _redis_snapshot(self, file : FileDatastoreFile) -> Optional[tuple[FileDatastoreFile, int, bytes, int]]:
+    """
+    called under the lock, captures the file for _redis_publish which is called once the lock is released
+    """
+    if self._redis is None:
+      return None
+    file.version += 1
+    return file, file.version, json.dumps(file.data).encode("utf-8"), int(file.dirty)
+
+  def _redis_publish(self, snapshot : Optional[tuple[FileDatastoreFile, int, bytes, int]]) -> None:
+    """
+    writes a snapshot to redis without holding the lock, a slow redis must not stall the other channels
+    """
+    if snapshot is None:
+      return
+    file, version, data, dirty = snapshot
+    with file.redis_lock:
+      if version <= file.published:
+        return # A newer snapshot was published meanwhile
+      self._redis.set(file.key, data)
+      self._redis.set(file.key + ".dirty", dirty)
+      file.published = version
 
   def _redis_clear(self, filekey : str):
     if self._redis is not None:
@@ -85,81 +122,116 @@ class FileDatastore(libtwitch.Datastore):
     if filekey is None:
       return None
 
-    # Ram
-    file = self._get_file_from_ram(filekey)
+    with self._lock:
+      file = self._get_file_from_ram(filekey)
     if file is not None:
+      FILE_LOADS.inc(("ram",))
       return file
 
-    # Redis
+    # Redis and the disk are read without the lock, slow storage must not stall the other channels
+    file, source = self._load_file(filekey)
+    with self._lock:
+      cached = self._get_file_from_ram(filekey)
+      if cached is not None: # Loaded by another thread meanwhile
+        FILE_LOADS.inc(("ram",))
+        return cached
+      self._cache[filekey] = file
+      snapshot = self._redis_snapshot(file) if source != "redis" else None
+    FILE_LOADS.inc((source,))
+    self._redis_publish(snapshot)
+    return file
+
+  def _load_file(self, filekey : str) -> tuple[FileDatastoreFile, str]:
+    """
+    :return: the file from redis, from the disk or a new one and the tier it came from
+    """
     file = self._get_file_from_redis(filekey)
     if file is not None:
-      self._cache[filekey] = file
-      return file
+      return file, "redis"
 
-    # Disk
     file = self._get_file_from_disk(filekey)
     if file is not None:
-      self._cache[filekey] = file
-      self._redis_set(file)
-      return file
+      return file, "disk"
 
-    # Create new
-    file = self._gen_file(filekey)
-    self._cache[filekey] = file
-    self._redis_set(file)
-    return file
+    return self._gen_file(filekey), "new"
 
   def get(self, subject : libtwitch.DatastoreDomainType, key : str, fallback = None) -> Any:
     file = self._get_file(subject)
     if file is None:
       return fallback
-    if not key in file.data:
-      return fallback
-    return file.data[key]
+    with self._lock:
+      return file.data.get(key, fallback)
 
   def set(self, subject : libtwitch.DatastoreDomainType, key : str, value) -> None:
     file = self._get_file(subject)
     if file is None:
       return
-    file.data[key] = value
-    file.dirty = True
-    self._redis_set(file)
+    with self._lock:
+      file.data[key] = value
+      file.dirty = True
+      snapshot = self._redis_snapshot(file)
+    self._redis_publish(snapshot)
 
   def has(self, subject : libtwitch.DatastoreDomainType, key : str) -> bool:
     file = self._get_file(subject)
     if file is None:
       return False
-    return key in file.data
+    with self._lock:
+      return key in file.data
 
   def rem(self, subject : libtwitch.DatastoreDomainType, key : str) -> None:
     file = self._get_file(subject)
     if file is None:
       return
-    if not key in file.data:
-      return
-    del file.data[key]
-    file.dirty = True
-    self._redis_set(file)
+    with self._lock:
+      if not key in file.data:
+        return
+      del file.data[key]
+      file.dirty = True
+      snapshot = self._redis_snapshot(file)
+    self._redis_publish(snapshot)
 
   def keys(self, subject : libtwitch.DatastoreDomainType) -> list[str]:
     file = self._get_file(subject)
     if file is None:
       return []
-    keys = []
-    for key in file.data:
-      keys.append(key)
-    return keys
+    with self._lock:
+      return list(file.data)
 
   def sync(self):
-    # TODO: Lock
-    for filekey in self._cache:
-      file = self._cache[filekey]
-      if not file.dirty:
-        continue
-      print("sync %s" % filekey)
-      path = self._filekey2path(filekey)
-      _ensure_dir(path)
-      with io.open(path, mode="w", encoding="utf-8") as f:
-        json.dump(file.data, f)
-      file.dirty = False
-      self._redis_set(file)
\ No newline at end of file
+    """
+    writes the dirty files to disk
+    the files are serialized under the lock and written outside of it, so channels are not blocked by the disk
+    """
+    start = perf_counter()
+    with self._sync_lock:
+      snapshot : list[tuple[str, str]] = []
+      with self._lock:
+        for filekey, file in self._cache.items():
+          if not file.dirty:
+            continue
+          snapshot.append((filekey, json.dumps(file.data)))
+          file.dirty = False
+
+      written = 0
+      try:
+        for filekey, data in snapshot:
+          print("sync %s" % filekey)
+          path = self._filekey2path(filekey)
+          _ensure_dir(path)
+          with io.open(path, mode="w", encoding="utf-8") as f:
+            f.write(data)
+          written += 1
+          SYNCED_FILES.inc()
+      finally:
+        published = []
+        with self._lock:
+          for index, (filekey, _) in enumerate(snapshot):
+            file = self._cache[filekey]
+            if index >= written:
+              file.dirty = True # Not written, retried by the next sync
+            elif not file.dirty: # Files changed while they were written are already marked dirty in redis
+              published.append(self._redis_snapshot(file))
+        for redis_snapshot in published:
+          self._redis_publish(redis_snapshot)
+    SYNC_SECONDS.observe(perf_counter() - start)
\ No newline at end of file
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import traceback
+from collections import deque
+from time import monotonic
+from typing import Awaitable, Optional
+
+from libtwitch.irc.connection import CONNECTS, DISCONNECTS, HOST, LINES_SENT, PORT, RATE_USER, IrcConnection
+from libtwitch.irc.egress import WINDOW_SECONDS
+from libtwitch.irc.enums import EgressPriority
+from libtwitch.irc.framer import RECV_SIZE
+from libtwitch.irc.latency import current_origin
+
+class AsyncIrcConnection(IrcConnection):
+  """
+  an IrcConnection driven by asyncio streams instead of an ingress and an egress thread
+  any number of connections can share one event loop, all on_* hooks are called on that loop
+  """
+  def __init__(self, nickname, token, recv_size : int = RECV_SIZE):
+    self._reader : Optional[asyncio.StreamReader] = None
+    self._writer : Optional[asyncio.StreamWriter] = None
+    self._recv_size : int = recv_size
+
+    self._egress_event : Optional[asyncio.Event] = None
+
+    self._ingress_task : Optional[asyncio.Task] = None
+    self._egress_task : Optional[asyncio.Task] = None
+
+    self._deferred : deque[Awaitable] = deque()
+
+    super().__init__(nickname, token, recv_size)
+
+  async def connect(self, host : str = HOST, port : int = PORT):
+    self._reader, self._writer = await asyncio.open_connection(host, port)
+    CONNECTS.inc()
+    self._send_login()
+
+    self.on_connect()
+
+  def send(self, content : str, priority : Optional[EgressPriority] = None, target : Optional[str] = None) -> None:
+    if priority is None:
+      priority = self._egress_priority(content)
+    if self._egress.put(content, self._egress_lane(content), priority, monotonic(), target, current_origin()) is None:
+      return
+    if self._egress_event is not None:
+      self._egress_event.set()
+
+  def _queue_join(self, name : str) -> None:
+    self._egress.put_join(name, monotonic())
+    if self._egress_event is not None:
+      self._egress_event.set()
+
+  def _cancel_join(self, name : str) -> bool:
+    return self._egress.cancel_join(name)
+
+  def _defer(self, awaitable : Awaitable) -> None:
+    """
+    schedules an awaitable to be awaited after the current line has been dispatched
+    awaitables are awaited in the order they were deferred
+    """
+    self._deferred.append(awaitable)
+
+  async def _await_handler(self, awaitable : Awaitable) -> None:
+    try:
+      await awaitable
+    except Exception:
+      self.on_error(traceback.format_exc()) # Like a dispatch worker, a failing handler does not stop the others
+
+  async def _drain_deferred(self) -> None:
+    while len(self._deferred) > 0:
+      await self._await_handler(self._deferred.popleft())
+
+  async def _report_egress(self, line : str) -> None:
+    """
+    calls on_raw_egress for a line the egress task wrote and awaits what it deferred
+    the awaitables deferred by the line the ingress task is dispatching stay in their own queue
+    """
+    dispatching = self._deferred
+    self._deferred = deque()
+    try:
+      self.on_raw_egress(line)
+    except Exception:
+      self.on_error(traceback.format_exc())
+    finally:
+      reported, self._deferred = self._deferred, dispatching
+    for awaitable in reported:
+      await self._await_handler(awaitable)
+
+  def _dispatch_reported(self, handler, *args) -> None:
+    """
+    calls a handler and reports an exception through on_error, as the dispatch workers of IrcConnection do
+    """
+    try:
+      handler(*args)
+    except Exception:
+      self.on_error(traceback.format_exc())
+
+  async def _ingress_loop(self):
+    while self._running:
+      try:
+        data = await self._reader.read(self._recv_size)
+      except OSError: # e.g. ConnectionResetError, handled like a closed connection
+        data = b""
+      if len(data) == 0:
+        DISCONNECTS.inc()
+        self._dispatch_reported(self.on_disconnect)
+        await self._drain_deferred()
+        return
+      for line in self._framer.feed(data):
+        # Handlers run inline on this task, an exception must not end it
+        self._dispatch_reported(self._handle_response, line)
+        await self._drain_deferred()
+
+  async def _egress_loop(self):
+    while self._running:
+      now = monotonic()
+      item = self._egress.pop(now)
+      if item is None:
+        self._egress_event.clear()
+        try:
+          await asyncio.wait_for(self._egress_event.wait(), self._egress.next_ready(now))
+        except asyncio.TimeoutError:
+          pass
+        continue
+      self._writer.write("{}\r\n".format(item).encode("utf-8"))
+      LINES_SENT.inc()
+      await self._report_egress(item) # The line as written, e.g. a batched JOIN
+      await self._writer.drain()
+
+  def start(self, rate = RATE_USER):
+    """
+    starts the ingress and egress tasks on the running event loop
+    """
+    if self._running:
+      return False
+    self.rate = rate
+    self._egress.set_user_limit(round(rate * WINDOW_SECONDS))
+    self._running = True
+    self._egress_event = asyncio.Event()
+    self._egress_event.set()
+    self._ingress_task = asyncio.ensure_future(self._ingress_loop())
+    self._egress_task = asyncio.ensure_future(self._egress_loop())
+    return True
+
+  async def stop(self):
+    if not self._running:
+      return False
+    self._running = False
+    self._ingress_task.cancel()
+    self._egress_task.cancel()
+    await asyncio.gather(self._ingress_task, self._egress_task, return_exceptions=True)
+    self.stop_capture()
+    self._writer.close()
+    try:
+      await self._writer.wait_closed()
+    except OSError:
+      pass # Already disconnected
+    return True
+
+  async def wait_closed(self):
+    """
+    waits until the server closes the connection
+    """
+    if self._ingress_task is not None:
+      await asyncio.gather(self._ingress_task, return_exceptions=True)
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import gzip
+import threading
+import time
+from dataclasses import dataclass
+from time import monotonic
+from typing import Iterator, Optional
+
+import libtwitch
+
+CAPTURE_HEADER = "#libtwitch-capture 1"
+
+class TrafficRecorder:
+  """
+  writes received raw lines to a gzip compressed capture file
+  every line is stored as "<milliseconds since the previous line>\t<raw line>"
+  """
+  def __init__(self, path : str):
+    self.path : str = path
+    self._file = gzip.open(path, mode="wt", encoding="utf-8", newline="\n")
+    self._file.write("%s %.3f\n" % (CAPTURE_HEADER, time.time()))
+    self._last : float = monotonic()
+    self._lock : threading.Lock = threading.Lock() # A pool records all its connections into one file
+    self.line_count : int = 0
+
+  def record(self, line : str) -> None:
+    with self._lock:
+      if self._file is None:
+        return
+      now = monotonic()
+      self._file.write("%d\t%s\n" % (round((now - self._last) * 1000), line))
+      self._last = now
+      self.line_count += 1
+
+  def close(self) -> None:
+    with self._lock:
+      if self._file is not None:
+        self._file.close()
+        self._file = None
+
+def read_capture(path : str) -> Iterator[tuple[float, str]]:
+  """
+  :return: the recorded lines with their offset in seconds from the first line
+  """
+  with gzip.open(path, mode="rt", encoding="utf-8", newline="\n") as f:
+    header = f.readline()
+    if not header.startswith(CAPTURE_HEADER):
+      raise ValueError("%s is not a capture file" % path)
+    offset = 0
+    first = True
+    for row in f:
+      delay, _, line = row.rstrip('\n').partition('\t')
+      if first: # The delay of the first line is the time between starting the capture and the first line
+        first = False
+      else:
+        offset += int(delay)
+      yield offset / 1000, line
+
+@dataclass
+class ReplayResult:
+  line_count : int = 0
+  recorded_duration : float = 0.0 # seconds between the first and the last recorded line
+  duration : float = 0.0 # seconds the replay took, including the dispatch backlog
+
+  @property
+  def lines_per_second(self) -> float:
+    if self.duration <= 0:
+      return 0.0
+    return self.line_count / self.duration
+
+def replay_capture(connection : libtwitch.IrcConnection, path : str, speed : Optional[float] = 1.0) -> ReplayResult:
+  """
+  feeds a capture file through the connection as if the lines were received from the server
+  :param speed: 1.0 replays at the recorded speed, 10.0 ten times faster, None as fast as possible
+  """
+  result = ReplayResult()
+  start = monotonic()
+  for offset, line in read_capture(path):
+    if speed is not None:
+      delay = start + offset / speed - monotonic()
+      if delay > 0:
+        time.sleep(delay)
+    connection._handle_response(line)
+    result.line_count += 1
+    result.recorded_duration = offset
+  connection._dispatcher.wait_idle()
+  result.duration = monotonic() - start
+  return result
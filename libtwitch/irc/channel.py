@@ -4,8 +4,8 @@ from typing import Optional, Union
 
 import libtwitch
 import libtwitch.irc.connection
-from libtwitch.irc.enums import SubEventType, SubGiftEventType, str2ritual, str2subtier
-from libtwitch.irc.events import ChatEvent, RaidEvent, RitualEvent, SubEvent, SubGiftEvent
+from libtwitch.irc.enums import EgressPriority, LatencyStage, SubEventType, SubGiftEventType, str2ritual, str2subtier
+from libtwitch.irc.events import ChatEvent, ClearChatEvent, ClearMessageEvent, NoticeEvent, RaidEvent, RitualEvent, SubEvent, SubGiftEvent
 from libtwitch.irc.message import MessageEvent
 
 class IrcChannel:
@@ -20,6 +20,8 @@ class IrcChannel:
     self._r9k : bool = False
     self._chatters = {}
     self._tags : dict[str, str] = {}
+    self._userstate : dict[str, str] = {}
+    self._joined : bool = False # Set once the server confirmed the JOIN
 
   @property
   def is_emote_only(self) -> bool:
@@ -63,20 +65,40 @@ class IrcChannel:
   def tags(self) -> dict[str, str]:
     return self._tags
 
+  @property
+  def userstate(self) -> dict[str, str]:
+    return self._userstate
+
+  @property
+  def is_joined(self) -> bool:
+    return self._joined
+
+  @property
+  def is_moderator(self) -> bool:
+    """
+    whether the bot user is a moderator or the broadcaster of this channel (learned from USERSTATE)
+    """
+    if self._name == self._connection.nickname:
+      return True
+    if self._userstate.get("mod") == "1":
+      return True
+    badges = self._userstate.get("badges", "")
+    return "moderator" in badges or "broadcaster" in badges
+
   def part(self) -> None:
     self._connection.part_channel(self)
 
-  def chat(self, text : str) -> None:
-    self._connection.chat(self._name, text)
+  def chat(self, text : str, priority : EgressPriority = EgressPriority.Reply, target : Optional[str] = None) -> None:
+    self._connection.chat(self._name, text, priority, target)
 
   def ban(self, user : Union[libtwitch.IrcChatter, str], reason : str = None) -> None:
     if isinstance(user, libtwitch.IrcChatter):
       user = user.login
 
     if reason is None:
-      self.chat(".ban %s" % user)
+      self.chat(".ban %s" % user, EgressPriority.Moderation)
     else:
-      self.chat(".ban %s %s" % (user, reason))
+      self.chat(".ban %s %s" % (user, reason), EgressPriority.Moderation)
 
   def timeout(self, user : Union[libtwitch.IrcChatter, str], duration : int, reason : str = None):
     if isinstance(user, libtwitch.IrcChatter):
@@ -86,19 +108,23 @@ class IrcChannel:
       return False
 
     if reason is None:
-      self.chat(".timeout %s %s" % (user, duration))
+      self.chat(".timeout %s %s" % (user, duration), EgressPriority.Moderation)
     else:
-      self.chat(".timeout %s %s %s" % (user, duration, reason))
+      self.chat(".timeout %s %s %s" % (user, duration, reason), EgressPriority.Moderation)
 
   def clear(self):
-    self.chat(".clear")
+    self.chat(".clear", EgressPriority.Moderation)
 
   def get_chatter(self, user_name : str) -> Optional[libtwitch.IrcChatter]:
     if user_name in self._chatters:
       return self._chatters[user_name]
     return None
 
-  def handle_privmsg(self, author_name : str, text : str, tags : dict[str, str], event: Optional[MessageEvent] = None):
+  def handle_privmsg(self, author_name : str, text : str, tags : dict[str, str], event: Optional[MessageEvent] = None,
+                     received : Optional[float] = None):
+    """
+    :param received: the unix time the line was read from the socket, now if None
+    """
     chatter = self.get_chatter(author_name)
     if chatter is None:
       chatter = libtwitch.IrcChatter(self, author_name)
@@ -106,14 +132,19 @@ class IrcChannel:
 
     _update_chatter_tags(chatter, tags) # TODO: FIXME
 
-    msg = libtwitch.IrcMessage(self, chatter, text, tags)
+    msg = libtwitch.IrcMessage(self, chatter, text, tags, received)
 
-    if "id" in msg.tags:
-      msg._id = msg.tags["id"]
+    message_id = tags.get("id")
+    if message_id is not None:
+      msg._id = message_id
 
     if event is not None:
       msg._event = event
 
+    server_latency = msg.server_latency
+    if server_latency is not None:
+      self._connection.latency.record(LatencyStage.ServerToParse, self._name, server_latency)
+
     self._connection.on_privmsg(msg)
 
   def handle_join(self, name : str):
@@ -138,6 +169,44 @@ class IrcChannel:
 
     self._connection.on_part(ev)
 
+  def handle_names(self, names : list[str]):
+    for name in names:
+      if not name in self._chatters:
+        self._chatters[name] = libtwitch.IrcChatter(self, name)
+
+  def handle_clearchat(self, login : Optional[str], tags : dict[str, str]):
+    ev = ClearChatEvent()
+    ev.tags = tags
+    ev.channel = self
+    ev.login = login
+    if "ban-duration" in tags:
+      ev.duration = int(tags["ban-duration"])
+
+    self._connection.on_clearchat(ev)
+
+  def handle_clearmsg(self, text : Optional[str], tags : dict[str, str]):
+    ev = ClearMessageEvent()
+    ev.tags = tags
+    ev.channel = self
+    ev.text = text
+    ev.login = tags.get("login")
+    ev.message_id = tags.get("target-msg-id")
+
+    self._connection.on_clearmsg(ev)
+
+  def handle_userstate(self, tags : dict[str, str]):
+    self._userstate = tags
+    self._connection.on_userstate(self, tags)
+
+  def handle_notice(self, text : Optional[str], tags : dict[str, str]):
+    ev = NoticeEvent()
+    ev.tags = tags
+    ev.channel = self
+    ev.text = text
+    ev.msg_id = tags.get("msg-id")
+
+    self._connection.on_notice(ev)
+
   def __eq__(self, other):
     return self._name == other.login
 
@@ -281,18 +350,21 @@ def _update_chatter_type_enum(chatter : libtwitch.IrcChatter, chatter_type : lib
     chatter._type &= ~chatter_type
 
 def _update_chatter_tags(chatter : libtwitch.IrcChatter, tags : dict[str, str]) -> None:
-  if "display-name" in tags:
-    chatter._display = tags["display-name"]
-  if "user-id" in tags:
-    chatter._id = int(tags["user-id"])
-  if "mod" in tags:
-    _update_chatter_type_enum(chatter, libtwitch.ChatterType.Moderator, tags["mod"] == "1")
-  if "badges" in tags:
-    badges = tags["badges"]
+  display_name = tags.get("display-name")
+  if display_name is not None:
+    chatter._display = display_name
+  user_id = tags.get("user-id")
+  if user_id is not None:
+    chatter._id = int(user_id)
+  mod = tags.get("mod")
+  if mod is not None:
+    _update_chatter_type_enum(chatter, libtwitch.ChatterType.Moderator, mod == "1")
+  badges = tags.get("badges")
+  if badges is not None:
     _update_chatter_type_enum(chatter, libtwitch.ChatterType.Twitch, "admin" in badges or "global_mod" in badges or "staff" in badges)
     _update_chatter_type_enum(chatter, libtwitch.ChatterType.Broadcaster, "broadcaster" in badges)
     _update_chatter_type_enum(chatter, libtwitch.ChatterType.Subscriber, "subscriber" in badges)
     _update_chatter_type_enum(chatter, libtwitch.ChatterType.Turbo, "turbo" in badges)
 
-    if not "mod" in tags:
+    if mod is None:
       _update_chatter_type_enum(chatter, libtwitch.ChatterType.Moderator, "moderator" in badges)
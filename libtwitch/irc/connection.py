@@ -2,32 +2,65 @@ from __future__ import annotations
 
 import libtwitch
 import threading
-from queue import Queue
+import time
+from dataclasses import dataclass
 
-from typing import Optional, Union
-from time import sleep
+from typing import Callable, Optional, Union
+from time import monotonic
 import socket
-import re
+
+from libtwitch.irc.capture import TrafficRecorder
+from libtwitch.irc.dispatch import ChannelDispatcher, DISPATCH_WORKERS
+from libtwitch.irc.egress import EgressScheduler, LIMIT_MODERATOR, LIMIT_USER, WINDOW_SECONDS
+from libtwitch.irc.egress import EgressLatency
+from libtwitch.irc.enums import DuplicateMode, EgressLane, EgressPriority
+from libtwitch.irc.framer import LineFramer, RECV_SIZE
+from libtwitch.irc.latency import LatencyStats, current_origin
+from libtwitch.metrics.registry import REGISTRY
+from libtwitch.irc.overload import OverloadController
+from libtwitch.irc.parser import IrcLine, parse_line
+from libtwitch.irc.tags import parse_tags
 
 HOST = "irc.twitch.tv"
 PORT = 6667
-RATE_USER = 20 / 30  # messages per second
-RATE_MODERATOR = 100 / 30  # messages per second
+RATE_USER = LIMIT_USER / WINDOW_SECONDS  # messages per second
+RATE_MODERATOR = LIMIT_MODERATOR / WINDOW_SECONDS  # messages per second
+
+# Commands handled on the ingress thread instead of a dispatch worker
+INLINE_COMMANDS = ["PING"]
+# Membership commands that are dropped while shedding load (unless they concern the bot itself)
+SHED_COMMANDS = ["JOIN", "PART", "353"]
+
+LINES_RECEIVED = REGISTRY.counter("twitch_irc_lines_received", "Raw lines received from the server", ("command",))
+LINES_SENT = REGISTRY.counter("twitch_irc_lines_sent", "Raw lines written to the server")
+CONNECTS = REGISTRY.counter("twitch_irc_connects", "Connections opened to the server")
+DISCONNECTS = REGISTRY.counter("twitch_irc_disconnects", "Connections closed by the server")
+RECONNECT_REQUESTS = REGISTRY.counter("twitch_irc_reconnect_requests", "RECONNECT notices received from the server")
+EGRESS_QUEUE_DEPTH = REGISTRY.gauge("twitch_irc_egress_queue_depth", "Lines waiting for rate limit budget", ("lane",))
+DISPATCH_QUEUE_DEPTH = REGISTRY.gauge("twitch_irc_dispatch_queue_depth", "Received lines waiting for a dispatch worker")
+DISPATCH_LAG = REGISTRY.gauge("twitch_irc_dispatch_lag_seconds", "Seconds the oldest waiting received line has been queued", aggregate="max")
+
+@dataclass
+class JoinProgress:
+  requested : int = 0 # Channels join_channel was called for
+  pending : int = 0 # Channels waiting for join budget
+  confirmed : int = 0 # Channels the server confirmed the JOIN for
 
-RE_TAG_PART = r"(?:@([^\s=;]+=[^\s;]*(?:;(?:[^\s=;]+=[^\s;]*))*))?\s?"
-RE_CHAT_MSG = r"^%s:([^\s!]+)!(?:[^\s@]+)@(?:[^\s\.]+)(?:\.tmi\.twitch\.tv PRIVMSG) #([^\s!]+) :(.+)$" % RE_TAG_PART
-RE_USERNOTICE = r"^%s:(?:tmi\.twitch\.tv USERNOTICE) #([^\s!]+)(?: :(.+))?$" % RE_TAG_PART
-RE_ROOMSTATE = r"^%s:(?:tmi\.twitch\.tv ROOMSTATE) #([^\s!]+)$" % RE_TAG_PART
-RE_JOIN = r"^:([^\s!]+)!(?:[^\s@]+)@(?:[^\s\.]+)(?:\.tmi\.twitch\.tv JOIN) #([^\s!]+)$"
-RE_PART = r"^:([^\s!]+)!(?:[^\s@]+)@(?:[^\s\.]+)(?:\.tmi\.twitch\.tv PART) #([^\s!]+)$"
+  @property
+  def sent(self) -> int:
+    return self.requested - self.pending
+
+  @property
+  def is_done(self) -> bool:
+    return self.confirmed >= self.requested
 
 class IrcConnection:
-  def __init__(self, nickname, token):
+  def __init__(self, nickname, token, recv_size : int = RECV_SIZE):
     self._nickname = nickname.lower()
     self._token : str = token
     self._socket : Optional[socket] = None
     self._channels : dict[str, libtwitch.IrcChannel] = {}
-    self._back_buffer : list[bytes] = []
+    self._framer : LineFramer = LineFramer(recv_size)
 
     self.rate : float = RATE_USER
     self._running : bool = False
@@ -35,8 +68,19 @@ class IrcConnection:
     self._ingress_thread : Optional[threading.Thread] = None
     self._egress_thread : Optional[threading.Thread] = None
 
-    self._egress_queue : Queue = Queue()
-    self._egress_queue_lock : threading.Lock = threading.Lock()
+    self.latency : LatencyStats = LatencyStats()
+    self._egress : EgressScheduler = EgressScheduler(stages=self.latency)
+    self._egress_condition : threading.Condition = threading.Condition()
+
+    self._dispatcher : ChannelDispatcher = ChannelDispatcher(DISPATCH_WORKERS, lambda error: self.on_error(error), self._check_overload)
+    self.overload : OverloadController = OverloadController()
+    self._recorder : Optional[TrafficRecorder] = None
+
+    self._command_handlers : dict[str, Callable[[IrcLine], None]] = self._build_command_handlers()
+
+    EGRESS_QUEUE_DEPTH.track(self._egress_queue_depth_metric)
+    DISPATCH_QUEUE_DEPTH.track(self._dispatch_queue_depth_metric)
+    DISPATCH_LAG.track(self._dispatch_lag_metric)
 
     self.on_ready()
 
@@ -44,162 +88,421 @@ class IrcConnection:
   def nickname(self) -> str:
     return self._nickname
 
-  def connect(self):
-    global HOST
-    global PORT
+  def connect(self, host : str = HOST, port : int = PORT):
     self._socket = socket.socket()
-    self._socket.connect((HOST, PORT))
+    self._socket.connect((host, port))
+    CONNECTS.inc()
+    self._send_login()
+
+    self.on_connect()
+
+  def _send_login(self):
     self.send("PASS %s" % self._token)
     self.send("NICK %s" % self._nickname)
     self.send("CAP REQ :twitch.tv/membership twitch.tv/tags twitch.tv/commands")
 
-    self.on_connect()
+  def _queue_join(self, name : str) -> None:
+    with self._egress_condition:
+      self._egress.put_join(name, monotonic())
+      self._egress_condition.notify()
+
+  def _cancel_join(self, name : str) -> bool:
+    with self._egress_condition:
+      return self._egress.cancel_join(name)
 
   def join_channel(self, name : str):
+    """
+    queues a channel to be joined, joins are packed into batched JOIN lines that respect the join rate limit
+    """
     name = name.removeprefix('#').lower()
     if not name in self._channels:
-      self.send("JOIN #%s" % name)
+      self._queue_join(name)
       new_channel = libtwitch.IrcChannel(self, name)
       self._channels[name] = new_channel
       self.on_channel_join(new_channel)
 
     return self._channels[name]
 
+  def join_channels(self, names : list[str]) -> list[libtwitch.IrcChannel]:
+    return [self.join_channel(name) for name in names]
+
   def part_channel(self, channel : Union[str, libtwitch.IrcChannel]) -> bool:
-    if not channel._name in self._channels:
+    if isinstance(channel, str):
+      channel = self._channels.get(channel.removeprefix('#').lower())
+    if channel is None or not channel.name in self._channels:
       return False
     self.on_channel_part(channel)
     self._channels.pop(channel.name)
-    self.send("PART %s" % channel.name)
+    if not self._cancel_join(channel.name):
+      self.send("PART #%s" % channel.name)
     return True
 
-  def send(self, content : str) -> None:
-    self.on_raw_egress(content)
-    with self._egress_queue_lock:
-      self._egress_queue.put(content)
+  def set_join_limit(self, limit : int) -> None:
+    """
+    :param limit: the number of channels that may be joined per 10 seconds
+    """
+    with self._egress_condition:
+      self._egress.set_join_limit(limit)
 
-  def chat(self, channel_name : str, text : str) -> None:
-    self.send("PRIVMSG #%s :%s" % (channel_name, text))
+  @property
+  def join_progress(self) -> JoinProgress:
+    progress = JoinProgress()
+    progress.requested = len(self._channels)
+    with self._egress_condition:
+      progress.pending = self._egress.pending_joins
+    for channel in list(self._channels.values()):
+      if channel.is_joined:
+        progress.confirmed += 1
+    return progress
+
+  def _egress_lane(self, content : str) -> EgressLane:
+    if not content.startswith("PRIVMSG #"):
+      return EgressLane.Unlimited
+    end = content.find(' ', 9)
+    channel = self._channels.get(content[9:end])
+    if channel is not None and channel.is_moderator:
+      return EgressLane.Moderator
+    return EgressLane.User
 
   @staticmethod
-  def _parse_tags(tags_str : str) -> dict[str, str]:
-    tags : dict = {}
-    tags_parts = tags_str.split(';')
+  def _egress_priority(content : str) -> EgressPriority:
+    if content.startswith("PRIVMSG "):
+      return EgressPriority.Reply
+    return EgressPriority.Protocol
+
+  def send(self, content : str, priority : Optional[EgressPriority] = None, target : Optional[str] = None) -> None:
+    """
+    queues a line for sending, on_raw_egress is called once the line is written to the socket
+    :param content: the raw line
+    :param priority: the egress priority, derived from the line if None
+    :param target: the login of the chatter a moderation line (e.g. .delete) targets, used to coalesce redundant lines
+    """
+    if priority is None:
+      priority = self._egress_priority(content)
+    with self._egress_condition:
+      self._egress.put(content, self._egress_lane(content), priority, monotonic(), target, current_origin())
+      self._egress_condition.notify()
+
+  @property
+  def egress_budget(self) -> dict[EgressLane, Optional[int]]:
+    """
+    the number of lines each lane may send right now (None if the lane is not rate limited)
+    """
+    with self._egress_condition:
+      now = monotonic()
+      return {lane: self._egress.budget(lane, now) for lane in EgressLane}
+
+  @property
+  def egress_queue_depth(self) -> dict[EgressLane, int]:
+    with self._egress_condition:
+      return {lane: self._egress.queue_depth(lane) for lane in EgressLane}
+
+  @property
+  def egress_saved(self) -> dict[str, int]:
+    """
+    the number of lines that were not sent thanks to coalescing, per reason
+    """
+    with self._egress_condition:
+      return dict(self._egress.saved)
+
+  @property
+  def egress_saved_per_minute(self) -> int:
+    with self._egress_condition:
+      return self._egress.saved_per_minute(monotonic())
+
+  @property
+  def duplicate_mode(self) -> DuplicateMode:
+    return self._egress.duplicate_mode
 
-    for tags_part in tags_parts:
-      parts = tags_part.split('=')
-      if len(parts) != 2:
-        continue
+  @duplicate_mode.setter
+  def duplicate_mode(self, mode : DuplicateMode) -> None:
+    self._egress.duplicate_mode = mode
 
-      key = parts[0]
-      value = parts[1]
+  @property
+  def egress_latency(self) -> dict[EgressPriority, EgressLatency]:
+    """
+    the time lines spent in the egress queue per priority class
+    """
+    return {priority: self._egress.latency(priority) for priority in EgressPriority}
 
-      tags[key] = value
+  def chat(self, channel_name : str, text : str, priority : EgressPriority = EgressPriority.Reply, target : Optional[str] = None) -> None:
+    self.send("PRIVMSG #%s :%s" % (channel_name, text), priority, target)
 
-    return tags
+  @staticmethod
+  def _parse_tags(tags_str : Optional[str]) -> dict[str, str]:
+    return parse_tags(tags_str)
+
+  def _get_line_channel(self, line : IrcLine) -> Optional[libtwitch.IrcChannel]:
+    channel_name = line.channel_name
+    if channel_name is None:
+      return None
+    return self._channels.get(channel_name)
+
+  def _handle_message(self, line : IrcLine) -> None:
+    channel = self._get_line_channel(line)
+    if channel is None or len(line.params) < 2:
+      return
+    channel.handle_privmsg(line.nick, line.params[1].strip(), self._parse_tags(line.tags), received=line.received)
 
-  def _handle_message(self, match) -> None:
-    tags_str = match[1]
-    username = match[2]
-    channel_name = match[3]
-    text = match[4].strip()
-    if not channel_name in self._channels:
+  def _handle_join(self, line : IrcLine):
+    channel = self._get_line_channel(line)
+    if channel is None:
       return
-    channel = self._channels[channel_name]
-    tags = self._parse_tags(tags_str)
-    channel.handle_privmsg(username, text, tags)
-
-  def _handle_join(self, match):
-    username = match[1]
-    channelname = match[2]
-    if not channelname in self._channels:
+    if line.nick == self._nickname and not channel.is_joined:
+      channel._joined = True
+      self.on_join_progress(self.join_progress)
+    channel.handle_join(line.nick)
+
+  def _handle_part(self, line : IrcLine):
+    channel = self._get_line_channel(line)
+    if channel is None:
       return
-    channel = self._channels[channelname]
-    channel.handle_join(username)
+    channel.handle_part(line.nick)
 
-  def _handle_part(self, match):
-    username = match[1]
-    channelname = match[2]
-    if not channelname in self._channels:
+  def _handle_roomstate(self, line : IrcLine):
+    channel = self._get_line_channel(line)
+    if channel is None:
       return
-    channel = self._channels[channelname]
-    channel.handle_part(username)
+    channel.handle_roomstate(self._parse_tags(line.tags))
 
-  def _handle_roomstate(self, match):
-    tags_str = match[1]
-    channel_name = match[2]
-    if not channel_name in self._channels:
+  def _handle_usernotice(self, line : IrcLine):
+    channel = self._get_line_channel(line)
+    if channel is None:
       return
-    channel = self._channels[channel_name]
-    tags = self._parse_tags(tags_str)
-    channel.handle_roomstate(tags)
-
-  def _handle_usernotice(self, match):
-    tags_str = match[1]
-    channel_name = match[2]
-    text = None
-    if match[3] is not None:
-      text = match[3].strip()
-
-    if not channel_name in self._channels:
+    text = line.param(1)
+    if text is not None:
+      text = text.strip()
+    channel.handle_usernotice(text, self._parse_tags(line.tags))
+
+  def _handle_clearchat(self, line : IrcLine):
+    channel = self._get_line_channel(line)
+    if channel is None:
       return
-    channel = self._channels[channel_name]
-    tags = self._parse_tags(tags_str)
-    channel.handle_usernotice(text, tags)
+    channel.handle_clearchat(line.param(1), self._parse_tags(line.tags))
 
-  def _read_line(self) -> str:
-    if len(self._back_buffer) == 0 or (len(self._back_buffer) == 1 and not self._back_buffer[0].endswith(b'\n')):
-      buffer = self._socket.recv(1024)
-      self._back_buffer = buffer.split(b'\r\n')
+  def _handle_clearmsg(self, line : IrcLine):
+    channel = self._get_line_channel(line)
+    if channel is None:
+      return
+    channel.handle_clearmsg(line.param(1), self._parse_tags(line.tags))
 
-    line = self._back_buffer[0]
-    self._back_buffer.pop(0)
-    return line.decode("utf-8")
+  def _handle_userstate(self, line : IrcLine):
+    channel = self._get_line_channel(line)
+    if channel is None:
+      return
+    channel.handle_userstate(self._parse_tags(line.tags))
+
+  def _handle_notice(self, line : IrcLine):
+    tags = self._parse_tags(line.tags)
+    channel = self._get_line_channel(line)
+    if channel is not None:
+      channel.handle_notice(line.param(1), tags)
+      return
+
+    # Global notice (e.g. failed authentication)
+    ev = libtwitch.NoticeEvent()
+    ev.tags = tags
+    ev.text = line.param(1)
+    ev.msg_id = tags.get("msg-id")
+    self.on_notice(ev)
+
+  def _handle_names(self, line : IrcLine):
+    # :<user>.tmi.twitch.tv 353 <user> = #<channel> :<user> <user2> <user3>
+    if len(line.params) < 4:
+      return
+    channel = self._channels.get(line.params[2].removeprefix('#'))
+    if channel is None:
+      return
+    channel.handle_names(line.params[3].split())
+
+  def _handle_ping(self, line : IrcLine):
+    self.send("PONG :%s" % (line.param(0) or "tmi.twitch.tv"))
+
+  def _handle_reconnect(self, line : IrcLine):
+    RECONNECT_REQUESTS.inc()
+    self.on_reconnect()
+
+  def _handle_ignored(self, line : IrcLine):
+    pass
+
+  def _build_command_handlers(self) -> dict[str, Callable[[IrcLine], None]]:
+    return {
+      "PRIVMSG": self._handle_message,
+      "JOIN": self._handle_join,
+      "PART": self._handle_part,
+      "ROOMSTATE": self._handle_roomstate,
+      "USERNOTICE": self._handle_usernotice,
+      "CLEARCHAT": self._handle_clearchat,
+      "CLEARMSG": self._handle_clearmsg,
+      "USERSTATE": self._handle_userstate,
+      "NOTICE": self._handle_notice,
+      "PING": self._handle_ping,
+      "RECONNECT": self._handle_reconnect,
+      "353": self._handle_names, # RPL_NAMREPLY
+      "366": self._handle_ignored, # RPL_ENDOFNAMES
+      "001": self._handle_ignored, # RPL_WELCOME
+      "002": self._handle_ignored, # RPL_YOURHOST
+      "003": self._handle_ignored, # RPL_CREATED
+      "004": self._handle_ignored, # RPL_MYINFO
+      "372": self._handle_ignored, # RPL_MOTD
+      "375": self._handle_ignored, # RPL_MOTDSTART
+      "376": self._handle_ignored, # RPL_ENDOFMOTD
+      "CAP": self._handle_ignored,
+      "GLOBALUSERSTATE": self._handle_ignored,
+      "HOSTTARGET": self._handle_ignored,
+    }
+
+  def _read_lines(self) -> Optional[list[str]]:
+    return self._framer.recv(self._socket)
 
   def _handle_response(self, response):
-    self.on_raw_ingress(response)
-    message_match = re.match(RE_CHAT_MSG, response)
-    if response == "PING :tmi.twitch.tv":  # On Ping
-      self.send("PONG :tmi.twitch.tv")
+    recorder = self._recorder
+    if recorder is not None:
+      recorder.record(response)
+    shedding = self._check_overload()
+    if not shedding or self.overload.sample_raw_ingress():
+      self.on_raw_ingress(response)
+    received = time.time() # Taken here, the line may wait for a dispatch worker before it is handled
+    line = parse_line(response)
+    if line is None:
+      LINES_RECEIVED.inc(("unknown",))
+      self.on_unknown(response)
+      return
+
+    handler = self._command_handlers.get(line.command)
+    if handler is None:
+      LINES_RECEIVED.inc(("unknown",))
+      self.on_unknown(response)
+      return
+    LINES_RECEIVED.inc((line.command,))
+    line.received = received
+    if shedding and line.command in SHED_COMMANDS and line.nick != self._nickname:
+      self.overload.count("membership")
       return
-    if message_match is not None:  # On Message
-      self._handle_message(message_match)
-    else:  # Other message
-      join_match = re.match(RE_JOIN, response)
-      part_match = re.match(RE_PART, response)
-      roomstate_match = re.match(RE_ROOMSTATE, response)
-      usernotice_match = re.match(RE_USERNOTICE, response)
-      if join_match is not None:  # On Join
-        self._handle_join(join_match)
-      elif part_match is not None:  # On Part
-        self._handle_part(part_match)
-      elif roomstate_match is not None:
-        self._handle_roomstate(roomstate_match)
-      elif usernotice_match is not None:
-        self._handle_usernotice(usernotice_match)
-      else:
-        self.on_unknown(response)
+    if line.command in INLINE_COMMANDS:
+      handler(line)
+    else:
+      self._dispatcher.submit(self._dispatch_key(line), handler, line)
+
+  @staticmethod
+  def _dispatch_key(line : IrcLine) -> str:
+    """
+    lines with the same key are handled in order, lines that are not bound to a channel share the empty key
+    """
+    if line.command == "353" and len(line.params) > 2: # RPL_NAMREPLY
+      return line.params[2].removeprefix('#')
+    return line.channel_name or ''
+
+  def start_capture(self, path : str) -> TrafficRecorder:
+    """
+    records every received line (including the ones shed under load) to a capture file that replay_capture can feed back
+    """
+    self.stop_capture()
+    self._recorder = TrafficRecorder(path)
+    return self._recorder
+
+  def stop_capture(self) -> None:
+    recorder = self._recorder
+    self._recorder = None
+    if recorder is not None:
+      recorder.close()
+
+  def _check_overload(self) -> bool:
+    """
+    called for every received line and after every handled line
+    :return: whether low value events should be dropped
+    """
+    if not self._dispatcher.is_running:
+      return False
+    now = monotonic()
+    depth = self._dispatcher.total_depth
+    if self.overload.is_check_due(depth, now):
+      lag = self._dispatcher.max_lag
+      changed = self.overload.update(depth, lag, now)
+      if changed is True:
+        self.on_shedding_start(depth, lag)
+      elif changed is False:
+        self.on_shedding_stop(dict(self.overload.episode_shed))
+    return self.overload.is_shedding
+
+  @property
+  def is_shedding(self) -> bool:
+    return self.overload.is_shedding
+
+  @property
+  def dispatch_workers(self) -> int:
+    return self._dispatcher.workers
+
+  @dispatch_workers.setter
+  def dispatch_workers(self, workers : int) -> None:
+    """
+    the number of threads handling received lines, takes effect on start
+    """
+    self._dispatcher.workers = workers
+
+  @property
+  def dispatch_queue_depth(self) -> dict[str, int]:
+    """
+    the number of received lines waiting to be handled per channel
+    """
+    return self._dispatcher.queue_depth
+
+  @property
+  def dispatch_lag(self) -> dict[str, float]:
+    """
+    the time in seconds the oldest waiting line of each channel has been queued
+    """
+    return self._dispatcher.lag
+
+  def _egress_queue_depth_metric(self) -> dict[tuple[str], int]:
+    return {(lane.name,): depth for lane, depth in self.egress_queue_depth.items()}
+
+  def _dispatch_queue_depth_metric(self) -> int:
+    return self._dispatcher.total_depth
+
+  def _dispatch_lag_metric(self) -> float:
+    return self._dispatcher.max_lag
 
   def _ingress_thread_func(self):
-    # TODO: Error
     while self._running:
-      response = self._read_line()
-      self._handle_response(response)
+      try:
+        lines = self._read_lines()
+      except OSError: # e.g. ConnectionResetError, handled like a closed connection
+        lines = None
+      if lines is None:
+        DISCONNECTS.inc()
+        self.on_disconnect()
+        return
+      for line in lines:
+        self._handle_response(line)
 
   def _egress_thread_func(self):
-    while self._running:
-      # TODO: Maybe this could lead to a race condition?
-      item = self._egress_queue.get()
-      with self._egress_queue_lock:
-        self._socket.send("{}\r\n".format(item).encode("utf-8"))
-        self._egress_queue.task_done()
-      sleep(1 / self.rate)
+    while True:
+      with self._egress_condition:
+        item = None
+        while self._running:
+          now = monotonic()
+          item = self._egress.pop(now)
+          if item is not None:
+            break
+          self._egress_condition.wait(self._egress.next_ready(now))
+      if item is None: # Stopped
+        return
+      self._socket.send("{}\r\n".format(item).encode("utf-8"))
+      LINES_SENT.inc()
+      self.on_raw_egress(item) # The line as written, e.g. a batched JOIN
 
   def start(self, rate = RATE_USER):
+    """
+    :param rate: the rate for channels where the bot is not known to be a moderator,
+                 channels where USERSTATE reports moderator privileges always use RATE_MODERATOR
+    """
     if self._running:
       return False
     self.rate = rate
+    self._egress.set_user_limit(round(rate * WINDOW_SECONDS))
     self._running = True
+    self._dispatcher.start()
     self._ingress_thread = threading.Thread(target=self._ingress_thread_func)
     self._egress_thread = threading.Thread(target=self._egress_thread_func)
     self._ingress_thread.start()
@@ -210,8 +513,17 @@ class IrcConnection:
     if not self._running:
       return False
     self._running = False
+    with self._egress_condition:
+      self._egress_condition.notify_all() # Wake up the egress thread
+    try:
+      self._socket.shutdown(socket.SHUT_RDWR) # Wake up the ingress thread
+    except OSError:
+      pass # Already disconnected
     self._ingress_thread.join()
     self._egress_thread.join()
+    self._dispatcher.stop()
+    self.stop_capture()
+    self._socket.close()
     return True
 
   @property
@@ -248,6 +560,9 @@ class IrcConnection:
   def on_channel_part(self, channel : libtwitch.IrcChannel):
     pass
 
+  def on_join_progress(self, progress : JoinProgress):
+    pass
+
   def on_join(self, join_event : libtwitch.ChatEvent):
     pass
 
@@ -267,4 +582,25 @@ class IrcConnection:
     pass
 
   def on_ritual(self, event : libtwitch.RitualEvent):
+    pass
+
+  def on_clearchat(self, event : libtwitch.ClearChatEvent):
+    pass
+
+  def on_clearmsg(self, event : libtwitch.ClearMessageEvent):
+    pass
+
+  def on_userstate(self, channel : libtwitch.IrcChannel, tags : dict[str, str]):
+    pass
+
+  def on_notice(self, event : libtwitch.NoticeEvent):
+    pass
+
+  def on_reconnect(self):
+    pass
+
+  def on_shedding_start(self, queue_depth : int, lag : float):
+    pass
+
+  def on_shedding_stop(self, shed : dict[str, int]):
     pass
\ No newline at end of file
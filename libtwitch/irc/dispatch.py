@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import threading
+import traceback
+from collections import deque
+from time import monotonic
+from typing import Callable, Optional
+
+DISPATCH_WORKERS = 4
+
+class DispatchQueue:
+  """
+  the lines of one channel that are waiting to be handled, in the order they were received
+  """
+  __slots__ = ('items', 'scheduled', 'processed', 'last_lag')
+
+  def __init__(self):
+    self.items : deque[tuple[float, Callable, tuple]] = deque() # (enqueued, handler, args)
+    self.scheduled : bool = False # Whether the queue is in the ready list or being worked on
+    self.processed : int = 0
+    self.last_lag : float = 0.0 # Time the last handled item spent in the queue
+
+  def lag(self, now : float) -> float:
+    """
+    the time the oldest waiting item has spent in the queue
+    """
+    if len(self.items) == 0:
+      return 0.0
+    return now - self.items[0][0]
+
+class ChannelDispatcher:
+  """
+  runs handlers on a pool of worker threads
+  handlers submitted with the same key run one after another in submission order,
+  handlers with different keys run in parallel, so a slow channel only stalls itself
+  """
+  def __init__(self, workers : int = DISPATCH_WORKERS, on_error : Optional[Callable[[str], None]] = None, on_handled : Optional[Callable[[], None]] = None):
+    """
+    :param on_error: called with the traceback when a handler raises
+    :param on_handled: called on the worker thread after each handler
+    """
+    self.workers : int = workers
+    self._on_error : Optional[Callable[[str], None]] = on_error
+    self._on_handled : Optional[Callable[[], None]] = on_handled
+    self._pending : int = 0 # Waiting items across all keys
+
+    self._queues : dict[str, DispatchQueue] = {}
+    self._ready : deque[str] = deque() # Keys with waiting items that no worker is handling
+    self._condition : threading.Condition = threading.Condition()
+    self._threads : list[threading.Thread] = []
+    self._running : bool = False
+
+  @property
+  def is_running(self) -> bool:
+    return self._running
+
+  def submit(self, key : str, handler : Callable, *args) -> None:
+    """
+    queues a handler, it is run right away if the dispatcher is not running
+    :param key: the ordering key (e.g. the channel name)
+    """
+    if not self._running:
+      handler(*args)
+      return
+    with self._condition:
+      queue = self._queues.get(key)
+      if queue is None:
+        queue = DispatchQueue()
+        self._queues[key] = queue
+      queue.items.append((monotonic(), handler, args))
+      self._pending += 1
+      if not queue.scheduled:
+        queue.scheduled = True
+        self._ready.append(key)
+        self._condition.notify()
+
+  def _next(self) -> Optional[tuple[str, DispatchQueue, float, Callable, tuple]]:
+    with self._condition:
+      while self._running and len(self._ready) == 0:
+        self._condition.wait()
+      if not self._running:
+        return None
+      key = self._ready.popleft()
+      queue = self._queues[key]
+      enqueued, handler, args = queue.items.popleft()
+      self._pending -= 1
+      return key, queue, enqueued, handler, args
+
+  def _worker_func(self):
+    while True:
+      item = self._next()
+      if item is None: # Stopped
+        return
+      key, queue, enqueued, handler, args = item
+      start = monotonic()
+      try:
+        handler(*args)
+      except Exception:
+        if self._on_error is not None:
+          self._on_error(traceback.format_exc())
+
+      with self._condition:
+        queue.processed += 1
+        queue.last_lag = start - enqueued
+        if len(queue.items) > 0:
+          self._ready.append(key) # Go to the back of the line so other channels get their turn
+          self._condition.notify()
+        else:
+          queue.scheduled = False
+          self._condition.notify_all() # Wake up wait_idle
+      if self._on_handled is not None:
+        self._on_handled()
+
+  def start(self) -> bool:
+    if self._running:
+      return False
+    self._running = True
+    self._threads = [threading.Thread(target=self._worker_func, daemon=True) for _ in range(self.workers)]
+    for thread in self._threads:
+      thread.start()
+    return True
+
+  def stop(self, wait : bool = True) -> bool:
+    """
+    stops the workers after their current handler, waiting items are dropped
+    :param wait: whether to wait for the workers to finish their current handler
+    """
+    with self._condition:
+      if not self._running:
+        return False
+      self._running = False
+      self._condition.notify_all()
+    current = threading.current_thread()
+    for thread in self._threads:
+      if wait and thread is not current: # A handler may stop its own connection
+        thread.join()
+    with self._condition:
+      self._queues.clear()
+      self._ready.clear()
+      self._pending = 0
+    return True
+
+  def wait_idle(self, timeout : Optional[float] = None) -> bool:
+    """
+    waits until every submitted handler has run
+    :return: False if the timeout expired first
+    """
+    with self._condition:
+      return self._condition.wait_for(lambda: not self._running or all(not queue.scheduled for queue in self._queues.values()), timeout)
+
+  @property
+  def queue_depth(self) -> dict[str, int]:
+    """
+    the number of waiting items per key
+    """
+    with self._condition:
+      return {key: len(queue.items) for key, queue in self._queues.items()}
+
+  @property
+  def total_depth(self) -> int:
+    return self._pending
+
+  @property
+  def lag(self) -> dict[str, float]:
+    """
+    the time in seconds the oldest waiting item of each key has been queued
+    """
+    now = monotonic()
+    with self._condition:
+      return {key: queue.lag(now) for key, queue in self._queues.items()}
+
+  @property
+  def max_lag(self) -> float:
+    """
+    the time in seconds the oldest waiting item of any key has been queued
+    """
+    now = monotonic()
+    with self._condition:
+      return max((queue.lag(now) for queue in self._queues.values()), default=0.0)
+
+  @property
+  def last_lag(self) -> dict[str, float]:
+    """
+    the time in seconds the most recently handled item of each key spent in the queue
+    """
+    with self._condition:
+      return {key: queue.last_lag for key, queue in self._queues.items()}
+
+  @property
+  def processed(self) -> dict[str, int]:
+    with self._condition:
+      return {key: queue.processed for key, queue in self._queues.items()}
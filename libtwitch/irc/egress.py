@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Optional
+
+from libtwitch.irc.enums import DuplicateMode, EgressLane, EgressPriority, LatencyStage
+from libtwitch.irc.latency import LatencySamples, LatencyStats
+
+WINDOW_SECONDS = 30
+LIMIT_USER = 20 # messages per window in channels where the bot is not a moderator
+LIMIT_MODERATOR = 100 # messages per window in channels where the bot is a moderator
+JOIN_WINDOW_SECONDS = 10
+LIMIT_JOIN = 20 # channels joined per join window (verified bots may join 2000)
+MAX_LINE_LENGTH = 510 # bytes per line without the trailing CRLF
+AGING_SECONDS = 5.0 # seconds of waiting that raise a queued line by one priority class
+DUPLICATE_WINDOW_SECONDS = 30 # twitch drops identical messages sent within this window
+DUPLICATE_SUFFIX = " \U000E0000" # invisible tag character that makes a line unique again
+DEFAULT_TIMEOUT = 600 # seconds, the duration twitch applies to a timeout without a duration
+
+class RateWindow:
+  """
+  an exact sliding window budget: at most limit lines within any window seconds
+  """
+  def __init__(self, limit : int, window : float = WINDOW_SECONDS):
+    self.limit : int = limit
+    self.window : float = window
+    self._sent : deque[float] = deque()
+
+  def _expire(self, now : float) -> None:
+    sent = self._sent
+    while len(sent) > 0 and sent[0] <= now - self.window:
+      sent.popleft()
+
+  def available(self, now : float) -> int:
+    self._expire(now)
+    return max(0, self.limit - len(self._sent))
+
+  def next_available(self, now : float) -> float:
+    """
+    :return: the number of seconds until the budget allows another line
+    """
+    if self.limit <= 0:
+      return self.window # Nothing may be sent until the limit is raised, check again after a window
+    self._expire(now)
+    if len(self._sent) < self.limit:
+      return 0
+    return self._sent[len(self._sent) - self.limit] + self.window - now
+
+  def consume(self, now : float) -> None:
+    self._sent.append(now)
+
+EgressLatency = LatencySamples # The time lines of one priority class spent in the egress queue
+
+class EgressEntry:
+  __slots__ = ('sequence', 'enqueued', 'line', 'lane', 'priority', 'channel', 'text', 'target', 'severity', 'origin')
+
+  def __init__(self, sequence : int, enqueued : float, line : str, lane : EgressLane, priority : EgressPriority):
+    self.sequence : int = sequence
+    self.enqueued : float = enqueued
+    self.line : str = line
+    self.lane : EgressLane = lane
+    self.priority : EgressPriority = priority
+    self.channel : Optional[str] = None # Only set for chat lines
+    self.text : Optional[str] = None # Only set for chat lines
+    self.target : Optional[str] = None # The login of the chatter a moderation line targets
+    self.severity : Optional[float] = None # Only set for timeouts and bans
+    self.origin : Optional[tuple[LatencyStage, float]] = None # The stage and start time the send latency is recorded for
+
+def _parse_chat(entry : EgressEntry) -> None:
+  line = entry.line
+  if not line.startswith("PRIVMSG #"):
+    return
+  end = line.find(' :', 9)
+  if end < 0:
+    return
+  entry.channel = line[9:end]
+  entry.text = line[end + 2:]
+
+  if entry.text[:1] not in ('.', '/'):
+    return
+  parts = entry.text[1:].split(' ', 3)
+  if len(parts) < 2:
+    return
+  if parts[0] == 'ban':
+    entry.target = parts[1].lower()
+    entry.severity = math.inf
+  elif parts[0] == 'timeout':
+    entry.target = parts[1].lower()
+    try:
+      entry.severity = int(parts[2]) if len(parts) > 2 else DEFAULT_TIMEOUT
+    except ValueError:
+      entry.severity = DEFAULT_TIMEOUT
+
+class EgressScheduler:
+  """
+  queues outgoing lines per lane and priority and releases them as soon as the budgets of their lane allow
+  every chat line counts towards the moderator budget, lines in the user lane additionally count towards the user budget
+  among sendable lines the most urgent priority wins, every aging seconds of waiting raise a line by one priority class
+
+  redundant lines are coalesced while queued: timeouts and bans for the same chatter are merged into the harshest one,
+  deletions of messages by a chatter that is about to be timed out or banned are dropped
+  and identical chat lines within the duplicate window are handled according to duplicate_mode
+
+  channels to join are queued by name and packed into comma separated JOIN lines when they are sent,
+  each line holds as many channels as the join budget and the line length allow
+
+  this class does no locking or waiting, the connection drives it from its egress thread or task
+  """
+  def __init__(self, user_limit : int = LIMIT_USER, moderator_limit : int = LIMIT_MODERATOR, window : float = WINDOW_SECONDS,
+               aging : float = AGING_SECONDS, duplicate_mode : DuplicateMode = DuplicateMode.Vary,
+               duplicate_window : float = DUPLICATE_WINDOW_SECONDS, join_limit : int = LIMIT_JOIN,
+               join_window : float = JOIN_WINDOW_SECONDS, stages : Optional[LatencyStats] = None):
+    self._user_window : RateWindow = RateWindow(user_limit, window)
+    self._moderator_window : RateWindow = RateWindow(moderator_limit, window)
+    self._aging : float = aging
+    self._queues : dict[EgressLane, dict[EgressPriority, deque[EgressEntry]]] = {
+      lane: {priority: deque() for priority in EgressPriority} for lane in EgressLane
+    }
+    self._latency : dict[EgressPriority, EgressLatency] = {priority: EgressLatency() for priority in EgressPriority}
+    self._sequence : int = 0
+    self.stages : Optional[LatencyStats] = stages # Receives the latency of lines sent with an origin
+
+    self._join_window : RateWindow = RateWindow(join_limit, join_window)
+    self._pending_joins : dict[str, tuple[int, float]] = {} # channel name -> (sequence, enqueue time)
+
+    self.duplicate_mode : DuplicateMode = duplicate_mode
+    self._duplicate_window : float = duplicate_window
+    self._pending_actions : dict[tuple[str, str], EgressEntry] = {} # (channel, target) -> queued timeout or ban
+    self._pending_deletes : dict[tuple[str, str], list[EgressEntry]] = {} # (channel, target) -> queued deletions
+    self._pending_texts : dict[tuple[str, str], int] = {} # (channel, text) -> number of queued lines
+    self._sent_texts : dict[tuple[str, str], float] = {} # (channel, text) -> last send time
+    self._sent_texts_order : deque[tuple[float, tuple[str, str]]] = deque()
+
+    self.saved : dict[str, int] = {
+      "merged_actions": 0,
+      "dropped_deletes": 0,
+      "suppressed_duplicates": 0,
+    }
+    self.varied_duplicates : int = 0
+    self._saved_times : deque[float] = deque()
+
+  def _windows(self, lane : EgressLane) -> list[RateWindow]:
+    if lane == EgressLane.User:
+      return [self._user_window, self._moderator_window]
+    elif lane == EgressLane.Moderator:
+      return [self._moderator_window]
+    return []
+
+  def _save(self, reason : str, now : float, count : int = 1) -> None:
+    self.saved[reason] += count
+    for _ in range(count):
+      self._saved_times.append(now)
+
+  def saved_per_minute(self, now : float) -> int:
+    """
+    :return: the number of lines that were not sent thanks to coalescing within the last minute
+    """
+    while len(self._saved_times) > 0 and self._saved_times[0] <= now - 60:
+      self._saved_times.popleft()
+    return len(self._saved_times)
+
+  def _is_duplicate(self, key : tuple[str, str], now : float) -> bool:
+    if key in self._pending_texts:
+      return True
+    while len(self._sent_texts_order) > 0 and self._sent_texts_order[0][0] <= now - self._duplicate_window:
+      sent, old_key = self._sent_texts_order.popleft()
+      if self._sent_texts.get(old_key) == sent:
+        del self._sent_texts[old_key]
+    return key in self._sent_texts
+
+  def _drop_deletes(self, key : tuple[str, str], now : float) -> None:
+    deletes = self._pending_deletes.pop(key, None)
+    if deletes is None:
+      return
+    for entry in deletes:
+      self._queues[entry.lane][entry.priority].remove(entry)
+    self._save("dropped_deletes", now, len(deletes))
+
+  def _coalesce(self, entry : EgressEntry, now : float) -> bool:
+    """
+    :return: whether the entry still has to be queued
+    """
+    if entry.severity is not None:
+      key = (entry.channel, entry.target)
+      self._drop_deletes(key, now)
+      pending = self._pending_actions.get(key)
+      if pending is None:
+        self._pending_actions[key] = entry
+        return True
+      if entry.severity > pending.severity:
+        pending.line = entry.line
+        pending.text = entry.text
+        pending.severity = entry.severity
+      self._save("merged_actions", now)
+      return False
+
+    if entry.target is not None: # Deletion
+      key = (entry.channel, entry.target)
+      if key in self._pending_actions:
+        self._save("dropped_deletes", now)
+        return False
+      self._pending_deletes.setdefault(key, []).append(entry)
+      return True
+
+    if entry.text is None or entry.text[:1] in ('.', '/') or self.duplicate_mode == DuplicateMode.Allow:
+      return True
+
+    key = (entry.channel, entry.text)
+    if self._is_duplicate(key, now):
+      if self.duplicate_mode == DuplicateMode.Suppress:
+        self._save("suppressed_duplicates", now)
+        return False
+      varied_key = (entry.channel, entry.text + DUPLICATE_SUFFIX)
+      if self._is_duplicate(varied_key, now):
+        self._save("suppressed_duplicates", now)
+        return False
+      entry.text += DUPLICATE_SUFFIX
+      entry.line += DUPLICATE_SUFFIX
+      key = varied_key
+      self.varied_duplicates += 1
+    self._pending_texts[key] = self._pending_texts.get(key, 0) + 1
+    return True
+
+  def put(self, line : str, lane : EgressLane, priority : EgressPriority, now : float, target : Optional[str] = None,
+          origin : Optional[tuple[LatencyStage, float]] = None) -> Optional[str]:
+    """
+    :param target: the login of the chatter a moderation line without a login in its text (e.g. .delete) targets
+    :param origin: the latency stage and its start time, recorded in stages once the line is sent
+    :return: the line as it is queued or None if it was coalesced with an already queued line,
+             a harsher timeout or ban for the same chatter put later replaces the queued line (pop returns what is sent)
+    """
+    self._sequence += 1
+    entry = EgressEntry(self._sequence, now, line, lane, priority)
+    _parse_chat(entry)
+    if target is not None and entry.target is None and entry.channel is not None:
+      entry.target = target.lower()
+    entry.origin = origin
+
+    if not self._coalesce(entry, now):
+      return None
+    self._queues[lane][priority].append(entry)
+    return entry.line
+
+  def put_join(self, channel_name : str, now : float) -> None:
+    if channel_name in self._pending_joins:
+      return
+    self._sequence += 1
+    self._pending_joins[channel_name] = (self._sequence, now)
+
+  def cancel_join(self, channel_name : str) -> bool:
+    """
+    :return: whether the channel was still waiting to be joined
+    """
+    return self._pending_joins.pop(channel_name, None) is not None
+
+  def _pop_join(self, now : float) -> str:
+    available = self._join_window.available(now)
+    line = "JOIN "
+    names = []
+    for name in self._pending_joins:
+      extra = len(name) + 1 if len(names) == 0 else len(name) + 2
+      if len(names) >= available:
+        break
+      # A name too long to share a line is still sent alone, a bare "JOIN " is never written
+      if len(names) > 0 and len(line.encode("utf-8")) + extra > MAX_LINE_LENGTH:
+        break
+      names.append(name)
+      line += "#%s" % name if len(names) == 1 else ",#%s" % name
+
+    for name in names:
+      _, enqueued = self._pending_joins.pop(name)
+      self._join_window.consume(now)
+      self._latency[EgressPriority.Protocol].record(now - enqueued)
+    return line
+
+  @property
+  def pending_joins(self) -> int:
+    return len(self._pending_joins)
+
+  def _forget(self, entry : EgressEntry, now : float) -> None:
+    if entry.channel is None:
+      return
+    if entry.severity is not None:
+      self._pending_actions.pop((entry.channel, entry.target), None)
+    elif entry.target is not None:
+      key = (entry.channel, entry.target)
+      deletes = self._pending_deletes.get(key)
+      if deletes is not None:
+        deletes.remove(entry)
+        if len(deletes) == 0:
+          del self._pending_deletes[key]
+    elif entry.text[:1] not in ('.', '/'):
+      key = (entry.channel, entry.text)
+      count = self._pending_texts.get(key)
+      if count is not None:
+        if count <= 1:
+          del self._pending_texts[key]
+        else:
+          self._pending_texts[key] = count - 1
+      self._sent_texts[key] = now
+      self._sent_texts_order.append((now, key))
+
+  def pop(self, now : float) -> Optional[str]:
+    """
+    :return: the most urgent line whose lane has budget left or None if no line may be sent right now
+    """
+    best_queue = None
+    best_key = None
+    for lane, queues in self._queues.items():
+      if lane != EgressLane.Unlimited and self.next_ready_in_lane(lane, now) > 0:
+        continue
+      for priority, queue in queues.items():
+        if len(queue) == 0:
+          continue
+        head = queue[0]
+        key = (int(priority) - (now - head.enqueued) / self._aging, head.sequence)
+        if best_key is None or key < best_key:
+          best_queue = queue
+          best_key = key
+
+    if len(self._pending_joins) > 0 and self._join_window.available(now) > 0:
+      sequence, enqueued = next(iter(self._pending_joins.values()))
+      key = (int(EgressPriority.Protocol) - (now - enqueued) / self._aging, sequence)
+      if best_key is None or key < best_key:
+        return self._pop_join(now)
+
+    if best_queue is None:
+      return None
+
+    entry = best_queue.popleft()
+    for window in self._windows(entry.lane):
+      window.consume(now)
+    self._forget(entry, now)
+    self._latency[entry.priority].record(now - entry.enqueued)
+    if entry.origin is not None and entry.channel is not None and self.stages is not None:
+      stage, start = entry.origin
+      self.stages.record(stage, entry.channel, now - start)
+    return entry.line
+
+  def next_ready_in_lane(self, lane : EgressLane, now : float) -> float:
+    wait = 0
+    for window in self._windows(lane):
+      wait = max(wait, window.next_available(now))
+    return wait
+
+  def next_ready(self, now : float) -> Optional[float]:
+    """
+    :return: the number of seconds until the next queued line may be sent or None if nothing is queued
+    """
+    result = None
+    for lane in EgressLane:
+      if self.queue_depth(lane) == 0:
+        continue
+      wait = self.next_ready_in_lane(lane, now)
+      if result is None or wait < result:
+        result = wait
+    if len(self._pending_joins) > 0:
+      wait = self._join_window.next_available(now)
+      if result is None or wait < result:
+        result = wait
+    return result
+
+  def budget(self, lane : EgressLane, now : float) -> Optional[int]:
+    """
+    :return: the number of lines the lane may send right now or None if the lane is not rate limited
+    """
+    windows = self._windows(lane)
+    if len(windows) == 0:
+      return None
+    return min(window.available(now) for window in windows)
+
+  def queue_depth(self, lane : EgressLane, priority : Optional[EgressPriority] = None) -> int:
+    if priority is not None:
+      return len(self._queues[lane][priority])
+    return sum(len(queue) for queue in self._queues[lane].values())
+
+  def latency(self, priority : EgressPriority) -> EgressLatency:
+    return self._latency[priority]
+
+  def set_user_limit(self, limit : int) -> None:
+    self._user_window.limit = limit
+
+  def set_join_limit(self, limit : int) -> None:
+    self._join_window.limit = limit
@@ -1,4 +1,4 @@
-from enum import Enum, IntFlag, auto, unique
+from enum import Enum, IntEnum, IntFlag, auto, unique
 
 @unique
 class ChatterType(IntFlag):
@@ -48,4 +48,30 @@ def str2ritual(text: str) -> RitualType:
   if text == 'new_chatter':
     return RitualType.NewChatter
   else:
-    assert False, 'unreachable'
\ No newline at end of file
+    assert False, 'unreachable'
+
+@unique
+class EgressLane(Enum):
+  Unlimited = auto() # Protocol lines that do not count towards the chat rate limits
+  User = auto() # Chat lines in channels where the bot is not a moderator
+  Moderator = auto() # Chat lines in channels where the bot is a moderator or the broadcaster
+
+@unique
+class EgressPriority(IntEnum):
+  Protocol = 0 # Keepalive and connection management (PONG, JOIN, ...)
+  Moderation = 1 # Timeouts, bans and deletions
+  Reply = 2 # Responses to commands
+  Info = 3 # Informational chat lines (e.g. moderation notices)
+
+@unique
+class LatencyStage(Enum):
+  ServerToParse = auto() # tmi-sent-ts until the line was read from the socket (network and server delay)
+  ParseToVerdict = auto() # message created until all moderation plugins decided
+  VerdictToEgress = auto() # moderation decided until the action was written to the socket
+  CommandToReply = auto() # command message created until the reply was written to the socket
+
+@unique
+class DuplicateMode(Enum):
+  Allow = auto() # Send identical chat lines as they are
+  Suppress = auto() # Drop chat lines identical to one queued or sent within the duplicate window
+  Vary = auto() # Append an invisible character so twitch accepts the line again
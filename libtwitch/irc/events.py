@@ -53,3 +53,27 @@ class RaidEvent(ChannelEvent):
 @dataclass
 class RitualEvent(ChannelEvent):
   typ : RitualType = RitualType.NewChatter
+
+@dataclass
+class ClearChatEvent(ChannelEvent):
+  login : str = None # None if the whole chat was cleared
+  duration : int = -1 # -1 for permanent bans
+
+  @property
+  def is_clear(self) -> bool:
+    return self.login is None
+
+  @property
+  def is_ban(self) -> bool:
+    return self.login is not None and self.duration < 0
+
+@dataclass
+class ClearMessageEvent(ChannelEvent):
+  login : str = None
+  message_id : str = None
+  text : str = None
+
+@dataclass
+class NoticeEvent(ChannelEvent):
+  msg_id : str = None
+  text : str = None
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from typing import Optional
+
+RECV_SIZE = 16384 # bytes per recv syscall
+
+class LineFramer:
+  """
+  incrementally splits a byte stream into CRLF terminated lines
+  every complete line is decoded straight out of a reusable receive buffer,
+  partial lines (including split multi-byte sequences) are kept for the next chunk
+  """
+  def __init__(self, recv_size : int = RECV_SIZE):
+    self._recv_size : int = recv_size
+    self._buffer : bytearray = bytearray(recv_size)
+    self._view : memoryview = memoryview(self._buffer)
+    self._size : int = 0 # Number of valid bytes at the start of the buffer
+
+    self.recv_calls : int = 0
+    self.line_count : int = 0
+
+  @property
+  def recv_size(self) -> int:
+    return self._recv_size
+
+  @property
+  def pending(self) -> int:
+    """
+    the number of buffered bytes that do not form a complete line yet
+    """
+    return self._size
+
+  def _reserve(self, free : int) -> None:
+    if len(self._buffer) - self._size >= free:
+      return
+    capacity = len(self._buffer)
+    while capacity - self._size < free:
+      capacity *= 2
+    self._view.release()
+    self._buffer.extend(bytes(capacity - len(self._buffer)))
+    self._view = memoryview(self._buffer)
+
+  def _extract_lines(self) -> list[str]:
+    lines : list[str] = []
+    buffer = self._buffer
+    view = self._view
+    end = self._size
+    start = 0
+    while True:
+      newline = buffer.find(b'\n', start, end)
+      if newline < 0:
+        break
+      line_end = newline
+      if line_end > start and buffer[line_end - 1] == 0x0D: # \r
+        line_end -= 1
+      if line_end > start:
+        lines.append(str(view[start:line_end], 'utf-8', 'replace'))
+      start = newline + 1
+
+    if start > 0:
+      remaining = end - start
+      view[:remaining] = view[start:end]
+      self._size = remaining
+
+    self.line_count += len(lines)
+    return lines
+
+  def feed(self, data : bytes) -> list[str]:
+    """
+    appends data to the stream
+    :param data: the received bytes
+    :return: every line completed by the data
+    """
+    self._reserve(len(data))
+    self._view[self._size:self._size + len(data)] = data
+    self._size += len(data)
+    return self._extract_lines()
+
+  def recv(self, sock) -> Optional[list[str]]:
+    """
+    receives the next chunk from a socket with a single syscall
+    :param sock: the socket to read from
+    :return: every line completed by the chunk or None if the connection was closed
+    """
+    self._reserve(self._recv_size)
+    received = sock.recv_into(self._view[self._size:self._size + self._recv_size])
+    self.recv_calls += 1
+    if received == 0:
+      return None
+    self._size += received
+    return self._extract_lines()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from libtwitch.irc.enums import LatencyStage
+
+# Upper bounds of the histogram buckets in seconds, a last bucket holds everything slower
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+LATENCY_SAMPLES = 1024 # number of recent durations LatencySamples keeps for the percentiles
+
+# The stage and start time (monotonic) that lines sent from the current context are measured against
+_origin : ContextVar[Optional[tuple[LatencyStage, float]]] = ContextVar("latency_origin", default=None)
+
+class LatencySamples:
+  """
+  counts durations and keeps the most recent ones, percentiles are exact over those
+  used for the time lines wait in the egress queue and the time plugins take to handle events
+  """
+  def __init__(self, samples : int = LATENCY_SAMPLES):
+    self.count : int = 0
+    self.total : float = 0
+    self.max : float = 0
+    self._samples : deque[float] = deque(maxlen=samples)
+
+  def record(self, latency : float) -> None:
+    self.count += 1
+    self.total += latency
+    self.max = max(self.max, latency)
+    self._samples.append(latency)
+
+  @property
+  def mean(self) -> float:
+    if self.count == 0:
+      return 0
+    return self.total / self.count
+
+  def percentile(self, percent : float) -> float:
+    """
+    :param percent: the percentile in the range 0 to 100
+    :return: the percentile over the most recent samples
+    """
+    if len(self._samples) == 0:
+      return 0
+    ordered = sorted(self._samples)
+    index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+    return ordered[index]
+
+class LatencyHistogram:
+  """
+  counts latencies in fixed buckets, percentiles are estimated as the upper bound of the bucket they fall into
+  """
+  def __init__(self, bounds : list[float] = LATENCY_BUCKETS):
+    self.bounds : list[float] = bounds
+    self.buckets : list[int] = [0] * (len(bounds) + 1)
+    self.count : int = 0
+    self.total : float = 0
+    self.max : float = 0
+
+  def record(self, latency : float) -> None:
+    self.buckets[bisect_left(self.bounds, latency)] += 1
+    self.count += 1
+    self.total += latency
+    self.max = max(self.max, latency)
+
+  def merge(self, other : LatencyHistogram) -> None:
+    for index, count in enumerate(other.buckets):
+      self.buckets[index] += count
+    self.count += other.count
+    self.total += other.total
+    self.max = max(self.max, other.max)
+
+  @property
+  def mean(self) -> float:
+    if self.count == 0:
+      return 0
+    return self.total / self.count
+
+  def percentile(self, percent : float) -> float:
+    """
+    :param percent: the percentile in the range 0 to 100
+    """
+    if self.count == 0:
+      return 0
+    rank = self.count * percent / 100
+    seen = 0
+    for index, count in enumerate(self.buckets):
+      seen += count
+      if seen >= rank and count > 0:
+        if index >= len(self.bounds):
+          return self.max
+        return min(self.bounds[index], self.max)
+    return self.max
+
+  def summary(self) -> dict[str, float]:
+    return {
+      "count": self.count,
+      "mean": self.mean,
+      "p50": self.percentile(50),
+      "p90": self.percentile(90),
+      "p99": self.percentile(99),
+      "max": self.max,
+    }
+
+class LatencyStats:
+  """
+  latency histograms per stage and channel, shared by all threads of a connection (or all shards of a pool)
+  """
+  def __init__(self):
+    self._histograms : dict[LatencyStage, dict[str, LatencyHistogram]] = {stage: {} for stage in LatencyStage}
+    self._lock : threading.Lock = threading.Lock()
+
+  def record(self, stage : LatencyStage, channel : str, latency : float) -> None:
+    """
+    :param latency: seconds, negative values (clock skew between twitch and us) are recorded as 0
+    """
+    with self._lock:
+      histogram = self._histograms[stage].get(channel)
+      if histogram is None:
+        histogram = LatencyHistogram()
+        self._histograms[stage][channel] = histogram
+      histogram.record(max(0.0, latency))
+
+  def histograms(self, stage : LatencyStage) -> dict[str, LatencyHistogram]:
+    """
+    :return: a copy of the histograms of every channel
+    """
+    with self._lock:
+      result = {}
+      for channel, histogram in self._histograms[stage].items():
+        copy = LatencyHistogram(histogram.bounds)
+        copy.merge(histogram)
+        result[channel] = copy
+      return result
+
+  def total(self, stage : LatencyStage) -> LatencyHistogram:
+    """
+    :return: the histograms of all channels merged into one
+    """
+    result = LatencyHistogram()
+    with self._lock:
+      for histogram in self._histograms[stage].values():
+        result.merge(histogram)
+    return result
+
+  def report(self) -> dict[str, dict[str, dict[str, float]]]:
+    """
+    :return: stage name -> channel name -> summary, the empty channel name holds all channels together
+    """
+    result = {}
+    for stage in LatencyStage:
+      channels = {channel: histogram.summary() for channel, histogram in self.histograms(stage).items()}
+      channels[''] = self.total(stage).summary()
+      result[stage.name] = channels
+    return result
+
+  def reset(self) -> None:
+    with self._lock:
+      for stage in LatencyStage:
+        self._histograms[stage] = {}
+
+@contextmanager
+def latency_origin(stage : LatencyStage, start : Optional[float]) -> Iterator[None]:
+  """
+  chat lines sent within this context record the time from start (monotonic) until they are written to the socket
+  :param start: None disables the measurement within this context
+  """
+  token = _origin.set(None if start is None else (stage, start))
+  try:
+    yield
+  finally:
+    _origin.reset(token)
+
+def current_origin() -> Optional[tuple[LatencyStage, float]]:
+  return _origin.get()
@@ -2,19 +2,27 @@ from __future__ import annotations
 
 import time
 import datetime
+from time import monotonic
 from typing import Optional
 
 import libtwitch
+from libtwitch.irc.enums import EgressPriority
 from libtwitch.irc.events import MessageEvent, RaidEvent, SubEvent, SubGiftEvent
 
 class IrcMessage:
-  def __init__(self, channel : libtwitch.IrcChannel, author : libtwitch.IrcChatter, text : str, tags : dict[str, str]):
-    self._timestamp : time = time.time() # TODO: Get timestamp form tags
+  def __init__(self, channel : libtwitch.IrcChannel, author : libtwitch.IrcChatter, text : str, tags : dict[str, str],
+               received : Optional[float] = None):
+    """
+    :param received: the unix time the line was read from the socket, now if None
+    """
+    self._received : float = received if received is not None else time.time()
+    self._parsed : float = monotonic()
+    self._sent : Optional[float] = _sent_timestamp(tags) # Set by the server in tmi-sent-ts
     self._channel : libtwitch.IrcChannel = channel
     self._author : libtwitch.IrcChatter = author
     self._text : str = text
     self._tags : dict[str, str] = tags
-    self._id : Optional[int] = -1
+    self._id : Optional[str] = None
     self._event : Optional[MessageEvent] = None
 
   @property
@@ -34,9 +42,7 @@ class IrcMessage:
     return self._event
 
   @property
-  def id(self) -> Optional[int]:
-    if self._id is None or self._id < 0:
-      return None
+  def id(self) -> Optional[str]:
     return self._id
 
   @property
@@ -57,7 +63,26 @@ class IrcMessage:
 
   @property
   def timestamp(self) -> datetime.datetime:
-    return datetime.datetime.utcfromtimestamp(int(self._timestamp) / 1000)
+    """
+    the time the server sent the message or the time it was received if the server did not tell
+    """
+    return datetime.datetime.utcfromtimestamp(self._sent if self._sent is not None else self._received)
+
+  @property
+  def parsed(self) -> float:
+    """
+    the monotonic time the message was created, later latency stages are measured from here
+    """
+    return self._parsed
+
+  @property
+  def server_latency(self) -> Optional[float]:
+    """
+    the seconds between the server sending the message and it being read from the socket or None without tmi-sent-ts
+    """
+    if self._sent is None:
+      return None
+    return self._received - self._sent
 
   def __str__(self):
     return self.text
@@ -66,4 +91,15 @@ class IrcMessage:
     return "<Message author: %s, text: %s>" % (self._author, self.text)
 
   def delete(self) -> None:
-    self.channel.chat(".delete %s" % self.id)
+    self.channel.chat(".delete %s" % self.id, EgressPriority.Moderation, self.author.login)
+
+def _sent_timestamp(tags : Optional[dict[str, str]]) -> Optional[float]:
+  if tags is None:
+    return None
+  sent = tags.get("tmi-sent-ts")
+  if sent is None:
+    return None
+  try:
+    return int(sent) / 1000
+  except ValueError:
+    return None
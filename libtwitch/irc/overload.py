@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+SHED_START_DEPTH = 1000 # waiting lines across all channels
+SHED_START_LAG = 2.0 # seconds the oldest waiting line has been queued
+SHED_STOP_DEPTH = 100
+SHED_STOP_LAG = 0.5
+RAW_INGRESS_SAMPLE = 100 # only every n-th line is passed to on_raw_ingress while shedding
+CHECK_INTERVAL = 0.25 # seconds between backlog checks
+
+class OverloadController:
+  """
+  decides when low value events are dropped because received lines pile up faster than they are handled
+  shedding starts once the backlog or the lag exceeds the start threshold
+  and stops once both are back below the (lower) stop threshold
+  """
+  def __init__(self,
+               start_depth : int = SHED_START_DEPTH, start_lag : float = SHED_START_LAG,
+               stop_depth : int = SHED_STOP_DEPTH, stop_lag : float = SHED_STOP_LAG,
+               raw_ingress_sample : int = RAW_INGRESS_SAMPLE, check_interval : float = CHECK_INTERVAL):
+    self.start_depth : int = start_depth
+    self.start_lag : float = start_lag
+    self.stop_depth : int = stop_depth
+    self.stop_lag : float = stop_lag
+    self.raw_ingress_sample : int = raw_ingress_sample
+    self.check_interval : float = check_interval
+
+    self._shedding : bool = False
+    self._next_check : float = 0.0
+    self._raw_ingress_counter : int = 0
+    self._lock : threading.Lock = threading.Lock()
+
+    self.episodes : int = 0 # How often shedding started
+    self.shed : dict[str, int] = {} # Everything that was shed, per kind
+    self.episode_shed : dict[str, int] = {} # What was shed since shedding started the last time
+
+  @property
+  def is_shedding(self) -> bool:
+    return self._shedding
+
+  def is_check_due(self, depth : int, now : float) -> bool:
+    """
+    a growing backlog is noticed right away, everything else (lag, recovery) is only checked every check_interval
+    """
+    if now >= self._next_check:
+      return True
+    return not self._shedding and depth >= self.start_depth
+
+  def update(self, depth : int, lag : float, now : float) -> Optional[bool]:
+    """
+    :param depth: the number of waiting lines
+    :param lag: the time in seconds the oldest waiting line has been queued
+    :return: True if shedding started, False if it stopped, None if nothing changed
+    """
+    with self._lock:
+      self._next_check = now + self.check_interval
+      if not self._shedding:
+        if depth >= self.start_depth or lag >= self.start_lag:
+          self._shedding = True
+          self.episodes += 1
+          self.episode_shed = {}
+          return True
+      elif depth <= self.stop_depth and lag <= self.stop_lag:
+        self._shedding = False
+        return False
+      return None
+
+  def count(self, kind : str) -> None:
+    with self._lock:
+      self.shed[kind] = self.shed.get(kind, 0) + 1
+      self.episode_shed[kind] = self.episode_shed.get(kind, 0) + 1
+
+  def sample_raw_ingress(self) -> bool:
+    """
+    :return: whether the current line should be passed to on_raw_ingress
+    """
+    self._raw_ingress_counter += 1
+    if self._raw_ingress_counter >= self.raw_ingress_sample:
+      self._raw_ingress_counter = 0
+      return True
+    self.count("raw_ingress")
+    return False
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Optional
+
+class IrcLine:
+  __slots__ = ('tags', 'prefix', 'command', 'params', 'received')
+
+  def __init__(self, tags : Optional[str], prefix : Optional[str], command : str, params : list[str]):
+    self.tags : Optional[str] = tags # The raw tag string without the leading '@'
+    self.prefix : Optional[str] = prefix # The raw prefix without the leading ':'
+    self.command : str = command
+    self.params : list[str] = params # The trailing parameter (if any) is the last element
+    self.received : Optional[float] = None # Unix time the line was read from the socket, set by the connection
+
+  @property
+  def nick(self) -> Optional[str]:
+    if self.prefix is None:
+      return None
+    end = self.prefix.find('!')
+    if end < 0:
+      return self.prefix
+    return self.prefix[:end]
+
+  @property
+  def channel_name(self) -> Optional[str]:
+    if len(self.params) == 0 or not self.params[0].startswith('#'):
+      return None
+    return self.params[0][1:]
+
+  def param(self, index : int) -> Optional[str]:
+    if index >= len(self.params):
+      return None
+    return self.params[index]
+
+  def __repr__(self):
+    return "<IrcLine command: %s, prefix: %s, params: %s>" % (self.command, self.prefix, self.params)
+
+def parse_line(line : str) -> Optional[IrcLine]:
+  """
+  splits a raw IRCv3 line into tags, prefix, command and params in a single pass
+  :param line: the raw line without the trailing CRLF
+  :return: the parsed line or None if the line is malformed
+  """
+  pos = 0
+
+  tags = None
+  if line.startswith('@'):
+    end = line.find(' ')
+    if end < 0:
+      return None
+    tags = line[1:end]
+    pos = end + 1
+
+  prefix = None
+  if line.startswith(':', pos):
+    end = line.find(' ', pos)
+    if end < 0:
+      return None
+    prefix = line[pos + 1:end]
+    pos = end + 1
+
+  trailing_start = line.find(' :', pos)
+  if trailing_start < 0:
+    params = line[pos:].split()
+  else:
+    params = line[pos:trailing_start].split()
+    params.append(line[trailing_start + 2:])
+
+  if len(params) == 0:
+    return None
+
+  command = params.pop(0)
+  return IrcLine(tags, prefix, command, params)
@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import threading
+import traceback
+from typing import Optional, Union
+
+import libtwitch
+from libtwitch.irc.capture import TrafficRecorder
+from libtwitch.irc.connection import HOST, PORT, RATE_USER, IrcConnection, JoinProgress
+from libtwitch.irc.enums import EgressPriority
+from libtwitch.irc.framer import RECV_SIZE
+
+CHANNELS_PER_CONNECTION = 50
+RETRY_SECONDS = 5 # seconds until a failed reconnect for channels that lost their connection is retried
+
+# Hooks the pool raises itself instead of once per shard
+_POOL_HOOKS = ['on_ready', 'on_destruct', 'on_connect', 'on_disconnect', 'on_join_progress']
+_FORWARDED_HOOKS = [name for name in dir(IrcConnection) if name.startswith('on_') and name not in _POOL_HOOKS]
+
+class PooledConnection(IrcConnection):
+  """
+  one shard of a ConnectionPool, all events are forwarded to the pool
+  """
+  def __init__(self, pool : ConnectionPool, nickname, token, recv_size : int = RECV_SIZE):
+    self._pool : ConnectionPool = pool
+    super().__init__(nickname, token, recv_size)
+    for name in _FORWARDED_HOOKS:
+      setattr(self, name, getattr(pool, name))
+    self.latency = pool.latency # Shards record into the histograms of the pool
+    self._egress.stages = pool.latency
+
+  def _adopt_channel(self, channel : libtwitch.IrcChannel) -> None:
+    channel._connection = self
+    channel._joined = False
+    self._channels[channel.name] = channel
+    self._queue_join(channel.name)
+
+  def _abandon(self) -> None:
+    """
+    stops a shard whose connection was lost from within its own ingress thread
+    """
+    self._running = False
+    with self._egress_condition:
+      self._egress_condition.notify_all()
+    self._dispatcher.stop(wait=False) # A worker may be waiting for the pool lock
+    self._socket.close()
+
+  def stop_capture(self) -> None:
+    self._recorder = None # The recorder belongs to the pool
+
+  def on_disconnect(self):
+    self._pool._handle_shard_disconnect(self)
+
+  def on_join_progress(self, progress : JoinProgress):
+    self._pool.on_join_progress(self._pool.join_progress)
+
+class ConnectionPool(IrcConnection):
+  """
+  spreads the joined channels across several connections, each with its own socket, parser and egress budget
+  to the outside the pool behaves like a single IrcConnection
+  """
+  def __init__(self, nickname, token, recv_size : int = RECV_SIZE, channels_per_connection : int = CHANNELS_PER_CONNECTION):
+    self.channels_per_connection : int = channels_per_connection
+    self._shards : list[PooledConnection] = []
+    self._owners : dict[str, PooledConnection] = {} # channel name -> shard
+    self._pool_lock : threading.RLock = threading.RLock()
+    self._host : str = HOST
+    self._port : int = PORT
+    self._connected : bool = False
+    self._recv_size : int = recv_size
+    self._orphans : list[tuple[libtwitch.IrcChannel, PooledConnection]] = [] # channels of lost shards and the shard they were on
+    self._rehome_lock : threading.Lock = threading.Lock() # Only one thread opens connections for orphans at a time
+    self._retry_timer : Optional[threading.Timer] = None
+
+    super().__init__(nickname, token, recv_size)
+
+  @property
+  def connections(self) -> list[PooledConnection]:
+    with self._pool_lock:
+      return list(self._shards)
+
+  def _create_shard(self) -> PooledConnection:
+    """
+    creates, connects and starts a shard without adding it to the pool, connecting blocks
+    """
+    shard = PooledConnection(self, self._nickname, self._token, self._recv_size)
+    shard.dispatch_workers = self.dispatch_workers
+    shard._recorder = self._recorder
+    if self._connected:
+      try:
+        shard.connect(self._host, self._port)
+      except OSError:
+        if shard._socket is not None:
+          shard._socket.close()
+        raise
+    if self._running:
+      shard.start(self.rate)
+    return shard
+
+  def _new_shard(self) -> PooledConnection:
+    shard = self._create_shard()
+    self._shards.append(shard)
+    return shard
+
+  def _find_shard(self) -> Optional[PooledConnection]:
+    """
+    :return: the shard with the fewest channels that can take another one, None if all are full
+    """
+    best = None
+    for shard in self._shards:
+      if len(shard._channels) >= self.channels_per_connection:
+        continue
+      if best is None or len(shard._channels) < len(best._channels):
+        best = shard
+    return best
+
+  def _acquire_shard(self) -> PooledConnection:
+    best = self._find_shard()
+    if best is None:
+      best = self._new_shard()
+    return best
+
+  def connect(self, host : str = HOST, port : int = PORT):
+    with self._pool_lock:
+      self._host = host
+      self._port = port
+      self._connected = True
+      if len(self._shards) == 0:
+        self._new_shard()
+      else:
+        for shard in self._shards:
+          shard.connect(host, port)
+
+    self.on_connect()
+
+  def join_channel(self, name : str):
+    name = name.removeprefix('#').lower()
+    with self._pool_lock:
+      if not name in self._channels:
+        shard = self._acquire_shard()
+        self._owners[name] = shard
+        self._channels[name] = shard.join_channel(name)
+      return self._channels[name]
+
+  def part_channel(self, channel : Union[str, libtwitch.IrcChannel]) -> bool:
+    name = channel if isinstance(channel, str) else channel.name
+    name = name.removeprefix('#').lower()
+    with self._pool_lock:
+      shard = self._owners.pop(name, None)
+      if shard is None:
+        return False
+      self._channels.pop(name, None)
+      return shard.part_channel(name)
+
+  def _get_owner(self, channel_name : Optional[str]) -> Optional[PooledConnection]:
+    with self._pool_lock:
+      if channel_name is not None and channel_name in self._owners:
+        return self._owners[channel_name]
+      if len(self._shards) > 0:
+        return self._shards[0]
+      return None
+
+  def send(self, content : str, priority : Optional[EgressPriority] = None, target : Optional[str] = None) -> None:
+    channel_name = None
+    if content.startswith("PRIVMSG #"):
+      channel_name = content[9:content.find(' ', 9)]
+    shard = self._get_owner(channel_name)
+    if shard is not None:
+      shard.send(content, priority, target)
+
+  def chat(self, channel_name : str, text : str, priority : EgressPriority = EgressPriority.Reply, target : Optional[str] = None) -> None:
+    shard = self._get_owner(channel_name)
+    if shard is not None:
+      shard.chat(channel_name, text, priority, target)
+
+  def _handle_shard_disconnect(self, shard : PooledConnection):
+    with self._pool_lock:
+      if not shard in self._shards:
+        return
+      self._shards.remove(shard)
+      shard._abandon()
+      if not self._running:
+        return
+      self._orphans.extend((channel, shard) for channel in shard._channels.values())
+
+    try:
+      self._rehome_orphans()
+    finally:
+      self.on_disconnect()
+
+  def _rehome_orphans(self) -> None:
+    """
+    moves the channels of lost shards to shards with room and opens new shards for the rest
+    a failed connect is reported through on_error, the channels stay queued and are retried after RETRY_SECONDS
+    """
+    with self._rehome_lock:
+      while True:
+        with self._pool_lock:
+          self._retry_timer = None
+          # Channels parted (or moved) meanwhile are no longer owned by their lost shard
+          self._orphans = [(channel, lost) for channel, lost in self._orphans if self._owners.get(channel.name) is lost]
+          while len(self._orphans) > 0:
+            target = self._find_shard()
+            if target is None:
+              break
+            channel, _ = self._orphans.pop(0)
+            target._adopt_channel(channel)
+            self._owners[channel.name] = target
+          if not self._running or len(self._orphans) == 0:
+            return
+
+        # New connections are opened without the lock, the handshake would stall every other pool operation
+        try:
+          new_shard = self._create_shard()
+        except OSError:
+          self.on_error(traceback.format_exc())
+          self._schedule_rehome()
+          return
+
+        with self._pool_lock:
+          if not self._running:
+            new_shard.stop()
+            return
+          self._shards.append(new_shard) # Filled with orphans by the next pass
+
+  def _schedule_rehome(self) -> None:
+    with self._pool_lock:
+      if not self._running or self._retry_timer is not None:
+        return
+      self._retry_timer = threading.Timer(RETRY_SECONDS, self._rehome_orphans)
+      self._retry_timer.daemon = True
+      self._retry_timer.start()
+
+  def set_join_limit(self, limit : int) -> None:
+    with self._pool_lock:
+      for shard in self._shards:
+        shard.set_join_limit(limit)
+
+  @property
+  def join_progress(self) -> JoinProgress:
+    progress = JoinProgress()
+    for shard in self.connections:
+      shard_progress = shard.join_progress
+      progress.requested += shard_progress.requested
+      progress.pending += shard_progress.pending
+      progress.confirmed += shard_progress.confirmed
+    return progress
+
+  def start_capture(self, path : str) -> TrafficRecorder:
+    recorder = super().start_capture(path)
+    for shard in self.connections:
+      shard._recorder = recorder
+    return recorder
+
+  def stop_capture(self) -> None:
+    for shard in self.connections:
+      shard.stop_capture()
+    super().stop_capture()
+
+  @property
+  def is_shedding(self) -> bool:
+    return any(shard.is_shedding for shard in self.connections)
+
+  @property
+  def dispatch_queue_depth(self) -> dict[str, int]:
+    depth = {}
+    for shard in self.connections:
+      depth.update(shard.dispatch_queue_depth)
+    return depth
+
+  @property
+  def dispatch_lag(self) -> dict[str, float]:
+    lag = {}
+    for shard in self.connections:
+      lag.update(shard.dispatch_lag)
+    return lag
+
+  @property
+  def dispatch_workers(self) -> int:
+    return self._dispatcher.workers
+
+  @dispatch_workers.setter
+  def dispatch_workers(self, workers : int) -> None:
+    self._dispatcher.workers = workers
+    for shard in self.connections:
+      shard.dispatch_workers = workers
+
+  def start(self, rate = RATE_USER):
+    with self._pool_lock:
+      if self._running:
+        return False
+      self.rate = rate
+      self._running = True
+      for shard in self._shards:
+        shard.start(rate)
+      return True
+
+  def stop(self):
+    with self._pool_lock:
+      if not self._running:
+        return False
+      self._running = False
+      shards = list(self._shards)
+      if self._retry_timer is not None:
+        self._retry_timer.cancel()
+        self._retry_timer = None
+    for shard in shards:
+      shard.stop()
+    self.stop_capture()
+    return True
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from typing import Optional
+
+_ESCAPES = {
+  ':': ';',
+  's': ' ',
+  '\\': '\\',
+  'r': '\r',
+  'n': '\n',
+}
+
+def unescape_tag_value(value : str) -> str:
+  """
+  decodes the IRCv3 tag value escapes (\\: \\s \\\\ \\r \\n)
+  """
+  if not '\\' in value:
+    return value
+
+  result = []
+  index = 0
+  length = len(value)
+  while index < length:
+    char = value[index]
+    if char != '\\':
+      result.append(char)
+    elif index + 1 < length:
+      index += 1
+      escaped = value[index]
+      result.append(_ESCAPES.get(escaped, escaped))
+    # A trailing backslash is dropped
+    index += 1
+  return ''.join(result)
+
+def parse_tags(raw : Optional[str]) -> dict[str, str]:
+  """
+  decodes the tag string of an irc line
+  values may contain '=', keys without a value map to an empty string and a duplicated key keeps its last value
+  :param raw: the tag string without the leading '@'
+  """
+  tags : dict[str, str] = {}
+  if not raw:
+    return tags
+  for part in raw.split(';'):
+    key, _, value = part.partition('=')
+    tags[key] = value
+  tags.pop('', None)
+  # Escapes are rare, only decode the values when the line contains any
+  if '\\' in raw:
+    for key, value in tags.items():
+      if '\\' in value:
+        tags[key] = unescape_tag_value(value)
+  return tags
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from libtwitch.metrics.registry import MetricsRegistry, REGISTRY
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+SNAPSHOT_INTERVAL = 60 # seconds between two logged snapshots
+
+class MetricsServer:
+  """
+  serves the metrics of a registry in the prometheus text format on http://host:port/metrics
+  """
+  def __init__(self, registry : MetricsRegistry = REGISTRY, host : str = METRICS_HOST, port : int = METRICS_PORT):
+    self.registry : MetricsRegistry = registry
+    self.host : str = host
+    self.port : int = port
+    self._server : Optional[ThreadingHTTPServer] = None
+    self._thread : Optional[threading.Thread] = None
+
+  def _build_handler(self):
+    registry = self.registry
+
+    class Handler(BaseHTTPRequestHandler):
+      def do_GET(self):
+        if self.path.split('?')[0] not in ("/", "/metrics"):
+          self.send_error(404)
+          return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def log_message(self, format, *args):
+        pass # Scrapes would flood the log
+
+    return Handler
+
+  def start(self) -> bool:
+    if self._server is not None:
+      return False
+    self._server = ThreadingHTTPServer((self.host, self.port), self._build_handler())
+    self.port = self._server.server_address[1] # Port 0 picks a free port
+    self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+    self._thread.start()
+    return True
+
+  def stop(self) -> bool:
+    if self._server is None:
+      return False
+    self._server.shutdown()
+    self._server.server_close()
+    self._thread.join()
+    self._server = None
+    return True
+
+  @property
+  def is_running(self) -> bool:
+    return self._server is not None
+
+class MetricsLogger:
+  """
+  logs a snapshot of all counters, gauges and histogram sums every interval seconds
+  """
+  def __init__(self, logger : logging.Logger, interval : float = SNAPSHOT_INTERVAL, registry : MetricsRegistry = REGISTRY):
+    self.logger : logging.Logger = logger
+    self.interval : float = interval
+    self.registry : MetricsRegistry = registry
+    self._stop : threading.Event = threading.Event()
+    self._thread : Optional[threading.Thread] = None
+
+  def log_snapshot(self) -> None:
+    snapshot = self.registry.snapshot()
+    self.logger.info("Metrics: %s" % ", ".join("%s=%g" % (name, value) for name, value in snapshot.items()))
+
+  def _thread_func(self):
+    while not self._stop.wait(self.interval):
+      self.log_snapshot()
+
+  def start(self) -> bool:
+    if self._thread is not None:
+      return False
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._thread_func, daemon=True)
+    self._thread.start()
+    return True
+
+  def stop(self) -> bool:
+    if self._thread is None:
+      return False
+    self._stop.set()
+    self._thread.join()
+    self._thread = None
+    return True
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import Callable, Iterator, Optional, Union
+
+from libtwitch.irc.latency import LatencyHistogram
+
+# Upper bounds of the histogram buckets in seconds
+DEFAULT_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+Labels = tuple[str, ...]
+GaugeFunction = Callable[[], Union[float, dict[Labels, float]]]
+
+def _format_labels(names : Labels, values : Labels, extra : Optional[tuple[str, str]] = None) -> str:
+  pairs = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+           for name, value in zip(names, values)]
+  if extra is not None:
+    pairs.append('%s="%s"' % extra)
+  if len(pairs) == 0:
+    return ""
+  return "{%s}" % ",".join(pairs)
+
+def _format_value(value : float) -> str:
+  if value == float("inf"):
+    return "+Inf"
+  if float(value).is_integer():
+    return str(int(value))
+  return repr(float(value))
+
+class Metric:
+  kind : str = "untyped"
+
+  def __init__(self, name : str, description : str, labels : Labels = ()):
+    self.name : str = name
+    self.description : str = description
+    self.labels : Labels = labels
+    self._lock : threading.Lock = threading.Lock()
+
+  def samples(self) -> Iterator[tuple[str, Labels, Optional[tuple[str, str]], float]]:
+    """
+    :return: (name, label values, extra label, value) for every sample of the metric
+    """
+    return iter(())
+
+class Counter(Metric):
+  """
+  a value that only goes up, e.g. the number of received lines
+  """
+  kind = "counter"
+
+  def __init__(self, name : str, description : str, labels : Labels = ()):
+    super().__init__(name, description, labels)
+    self._values : dict[Labels, float] = {}
+
+  def inc(self, labels : Labels = (), amount : float = 1) -> None:
+    with self._lock:
+      self._values[labels] = self._values.get(labels, 0) + amount
+
+  def get(self, labels : Labels = ()) -> float:
+    return self._values.get(labels, 0)
+
+  def samples(self):
+    with self._lock:
+      values = list(self._values.items())
+    for labels, value in values:
+      yield self.name + "_total", labels, None, value
+
+class Gauge(Metric):
+  """
+  a value that goes up and down, either set directly or computed by tracked functions when the metrics are collected
+  the values of all tracked functions are added up (e.g. the queue depth of every shard of a pool) or, with
+  aggregate="max", the largest one is kept (e.g. the lag of the slowest shard)
+  """
+  kind = "gauge"
+
+  def __init__(self, name : str, description : str, labels : Labels = (), aggregate : str = "sum"):
+    super().__init__(name, description, labels)
+    if aggregate not in ("sum", "max"):
+      raise ValueError("unknown gauge aggregation %s" % aggregate)
+    self.aggregate : str = aggregate
+    self._values : dict[Labels, float] = {}
+    self._functions : list[Callable[[], Optional[GaugeFunction]]] = []
+
+  def set(self, value : float, labels : Labels = ()) -> None:
+    with self._lock:
+      self._values[labels] = value
+
+  def inc(self, labels : Labels = (), amount : float = 1) -> None:
+    with self._lock:
+      self._values[labels] = self._values.get(labels, 0) + amount
+
+  def dec(self, labels : Labels = (), amount : float = 1) -> None:
+    self.inc(labels, -amount)
+
+  def track(self, function : GaugeFunction) -> None:
+    """
+    :param function: returns the value or a dict of label values -> value, bound methods are only referenced weakly
+    """
+    if hasattr(function, "__self__"):
+      ref = weakref.WeakMethod(function)
+    else:
+      ref = lambda: function
+    with self._lock:
+      self._functions.append(ref)
+
+  def untrack(self, function : GaugeFunction) -> None:
+    with self._lock:
+      self._functions = [ref for ref in self._functions if ref() is not None and ref() != function]
+
+  def get(self, labels : Labels = ()) -> float:
+    return self._collect().get(labels, 0)
+
+  def _collect(self) -> dict[Labels, float]:
+    with self._lock:
+      values = dict(self._values)
+      functions = [ref() for ref in self._functions]
+      self._functions = [ref for ref, function in zip(self._functions, functions) if function is not None]
+    for function in functions:
+      if function is None:
+        continue
+      result = function()
+      if not isinstance(result, dict):
+        result = {(): result}
+      for labels, value in result.items():
+        if labels not in values:
+          values[labels] = value
+        elif self.aggregate == "max":
+          values[labels] = max(values[labels], value)
+        else:
+          values[labels] += value
+    return values
+
+  def samples(self):
+    for labels, value in self._collect().items():
+      yield self.name, labels, None, value
+
+class Histogram(Metric):
+  """
+  counts observations (e.g. durations in seconds) in cumulative buckets, one LatencyHistogram per label values
+  """
+  kind = "histogram"
+
+  def __init__(self, name : str, description : str, labels : Labels = (), buckets : list[float] = DEFAULT_BUCKETS):
+    super().__init__(name, description, labels)
+    self.buckets : list[float] = buckets
+    self._values : dict[Labels, LatencyHistogram] = {}
+
+  def observe(self, value : float, labels : Labels = ()) -> None:
+    with self._lock:
+      histogram = self._values.get(labels)
+      if histogram is None:
+        histogram = LatencyHistogram(self.buckets)
+        self._values[labels] = histogram
+      histogram.record(value)
+
+  def get(self, labels : Labels = ()) -> tuple[int, float]:
+    """
+    :return: the number and the sum of the observations
+    """
+    histogram = self._values.get(labels)
+    if histogram is None:
+      return 0, 0.0
+    return histogram.count, histogram.total
+
+  def percentile(self, percent : float, labels : Labels = ()) -> float:
+    """
+    :param percent: the percentile in the range 0 to 100, estimated from the buckets
+    """
+    histogram = self._values.get(labels)
+    if histogram is None:
+      return 0
+    return histogram.percentile(percent)
+
+  def samples(self):
+    with self._lock:
+      values = []
+      for labels, histogram in self._values.items():
+        copy = LatencyHistogram(histogram.bounds)
+        copy.merge(histogram)
+        values.append((labels, copy))
+    for labels, histogram in values:
+      cumulative = 0
+      for bound, count in zip(self.buckets + [float("inf")], histogram.buckets):
+        cumulative += count
+        yield self.name + "_bucket", labels, ("le", _format_value(bound)), cumulative
+      yield self.name + "_count", labels, None, histogram.count
+      yield self.name + "_sum", labels, None, histogram.total
+
+class MetricsRegistry:
+  """
+  holds all metrics by name, asking for an existing name returns the existing metric so several objects can share it
+  """
+  def __init__(self):
+    self._metrics : dict[str, Metric] = {}
+    self._lock : threading.Lock = threading.Lock()
+
+  def _get_or_create(self, cls, name : str, description : str, labels : Labels, **kwargs) -> Metric:
+    with self._lock:
+      metric = self._metrics.get(name)
+      if metric is None:
+        metric = cls(name, description, labels, **kwargs)
+        self._metrics[name] = metric
+      elif not isinstance(metric, cls) or metric.labels != labels or any(getattr(metric, key) != value for key, value in kwargs.items()):
+        raise ValueError("metric %s is already registered as a different %s" % (name, metric.kind))
+      return metric
+
+  def counter(self, name : str, description : str, labels : Labels = ()) -> Counter:
+    return self._get_or_create(Counter, name, description, labels)
+
+  def gauge(self, name : str, description : str, labels : Labels = (), aggregate : str = "sum") -> Gauge:
+    """
+    :param aggregate: how the values of several tracked functions are combined, "sum" or "max"
+    """
+    return self._get_or_create(Gauge, name, description, labels, aggregate=aggregate)
+
+  def histogram(self, name : str, description : str, labels : Labels = (), buckets : list[float] = DEFAULT_BUCKETS) -> Histogram:
+    return self._get_or_create(Histogram, name, description, labels, buckets=buckets)
+
+  def get(self, name : str) -> Optional[Metric]:
+    return self._metrics.get(name)
+
+  @property
+  def metrics(self) -> list[Metric]:
+    with self._lock:
+      return list(self._metrics.values())
+
+  def render(self) -> str:
+    """
+    :return: all metrics in the prometheus text exposition format
+    """
+    lines = []
+    for metric in sorted(self.metrics, key=lambda metric: metric.name):
+      lines.append("# HELP %s %s" % (metric.name, metric.description))
+      lines.append("# TYPE %s %s" % (metric.name, metric.kind))
+      for name, labels, extra, value in metric.samples():
+        lines.append("%s%s %s" % (name, _format_labels(metric.labels, labels, extra), _format_value(value)))
+    return "\n".join(lines) + "\n"
+
+  def snapshot(self) -> dict[str, float]:
+    """
+    :return: every sample except the histogram buckets, keyed by name and labels
+    """
+    result = {}
+    for metric in sorted(self.metrics, key=lambda metric: metric.name):
+      for name, labels, extra, value in metric.samples():
+        if extra is not None:
+          continue
+        result[name + _format_labels(metric.labels, labels)] = value
+    return result
+
+# The registry the library records into unless told otherwise
+REGISTRY = MetricsRegistry()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+import signal
 
 from redis import Redis
 from dotenv import load_dotenv
@@ -109,6 +110,37 @@ class MyBot(libtwitch.Bot):
   def on_connect(self):
     self.logger.debug("(Re)connected to twitch chat servers.")
 
+  def on_join_progress(self, progress : libtwitch.JoinProgress):
+    if progress.is_done or progress.confirmed % 50 == 0:
+      self.logger.info("Joined %s of %s channels (%s waiting for join budget)." % (progress.confirmed, progress.requested, progress.pending))
+
+  def on_shedding_start(self, queue_depth : int, lag : float):
+    self.logger.warning("Overloaded (%s lines waiting, %.1fs behind), dropping membership events, raw logging and fun plugins." % (queue_depth, lag))
+
+  def on_shedding_stop(self, shed : dict[str, int]):
+    self.logger.warning("Backlog drained, resuming full processing. Shed: %s" % ", ".join("%s %s" % (count, kind) for kind, count in shed.items()))
+
+  def toggle_profiling(self):
+    """
+    starts profiling the plugins or stops it and logs the report, PROFILE_PLUGIN additionally captures one plugin with cProfile
+    """
+    if not self.profiler.enabled:
+      self.profiler.reset()
+      self.profiler.enable()
+      capture_plugin = os.getenv('PROFILE_PLUGIN')
+      if capture_plugin is not None:
+        self.profiler.start_capture(capture_plugin)
+      self.logger.info("Profiling plugins, send the signal again for the report.")
+      return
+
+    self.profiler.disable()
+    self.logger.info("Plugin profile:\n%s" % self.profiler.format_report())
+    capture_plugin = self.profiler.capture_plugin
+    if capture_plugin is not None:
+      path = "./%s.prof" % capture_plugin
+      if self.profiler.stop_capture(path) is not None:
+        self.logger.info("Wrote the cProfile capture of %s to %s" % (capture_plugin, path))
+
   def on_error(self, error : str):
     self.logger.error(error)
     pass
@@ -147,6 +179,26 @@ if __name__ == '__main__':
   # Util
   bot.load_extension("console")
 
+  metrics_port = os.getenv('METRICS_PORT')
+  if metrics_port is not None:
+    libtwitch.MetricsServer(port=int(metrics_port)).start()
+  metrics_interval = os.getenv('METRICS_LOG_INTERVAL')
+  if metrics_interval is not None:
+    libtwitch.MetricsLogger(bot.logger, float(metrics_interval)).start()
+
+  if hasattr(signal, 'SIGUSR1'): # Not available on windows
+    signal.signal(signal.SIGUSR1, lambda signum, frame: bot.toggle_profiling())
+
+  capture_file = os.getenv('CAPTURE_FILE')
+  if capture_file is not None:
+    bot.start_capture(capture_file)
+
   bot.connect()
-  channel = bot.join_channel(os.getenv('CHANNEL'))
-  bot.start(libtwitch.RATE_MODERATOR)
+  channels_file = os.getenv('CHANNELS_FILE')
+  if channels_file is not None:
+    with io.open(channels_file) as f:
+      channel_names = [line.strip() for line in f.readlines()]
+    bot.join_channels([name for name in channel_names if len(name) > 0 and not name.startswith(';')])
+  else:
+    bot.join_channel(os.getenv('CHANNEL'))
+  bot.start()
@@ -1,10 +1,23 @@
 import random
+import re
+import string
 from datetime import datetime
-from typing import Union
+from functools import cached_property
+from typing import Any, Optional, Union
 
-from libtwitch import Bot, IrcChatter, ModerationAction, ModerationActionType
+from libtwitch import Bot, BotMessage, IrcChatter, ModerationAction, ModerationActionType, Plugin
 from src import textutil
 
+URL_REGEX = re.compile(r"((https?://)?(([^\s()<>]+)\.)*([a-z0-9\-.]+)\.([a-z]{2,})([^\s()<>?#]*)(?:\?([^\s()<>=#&]+=[^\s()<>=#&]*)(&([^\s()<>=#&]+=[^\s()<>=#&]*))*)?(?:#([^\s()<>]*))?)", re.IGNORECASE)
+BARCODE_REGEX = re.compile(r"[Il]+")
+_NO_CAPS = str.maketrans('', '', string.ascii_uppercase) # Deletes the upper case letters
+
+def count_caps(text : str) -> int:
+  """
+  :return: the number of upper case letters (A to Z) in the text
+  """
+  return len(text) - len(text.translate(_NO_CAPS))
+
 class ModerationMeta:
   def __init__(self, chatter : IrcChatter, mod : str, count : int, last : datetime):
     self.chatter : IrcChatter = chatter
@@ -19,6 +32,144 @@ class ModerationMeta:
   def save(self, bot : Bot):
     set_moderation_meta(bot, self.chatter, self.mod, self)
 
+class MessageAnalysis:
+  """
+  features of a message the moderation plugins look at, every feature is computed on first use and then shared
+  """
+  def __init__(self, bot : Bot, message : BotMessage):
+    self.bot : Bot = bot
+    self.message : BotMessage = message
+    self.text : str = message.text
+    self.length : int = len(message.text)
+
+  @cached_property
+  def has_emotes(self) -> bool:
+    """
+    whether util.emote is loaded, without it no emotes are found
+    """
+    return self.bot.get_plugin("util.emote") is not None
+
+  @cached_property
+  def emotes(self) -> list[Any]:
+    """
+    the emotes of the message as found by util.emote (see extensions.emote.Emote)
+    """
+    util_emote_plugin = self.bot.get_plugin("util.emote")
+    if util_emote_plugin is None:
+      return []
+    return util_emote_plugin.get_emotes(self.message)
+
+  @cached_property
+  def emote_chars(self) -> int:
+    return sum(emote.end - emote.start + 1 for emote in self.emotes) # The end is inclusive
+
+  @cached_property
+  def emote_spans(self) -> list[tuple[int, int]]:
+    """
+    the sorted start and exclusive end of the text covered by emotes, overlapping emotes are merged
+    """
+    spans = []
+    for start, end in sorted((emote.start, emote.end + 1) for emote in self.emotes):
+      start = max(start, 0)
+      end = min(end, self.length)
+      if len(spans) > 0 and start <= spans[-1][1]:
+        if end > spans[-1][1]:
+          spans[-1] = (spans[-1][0], end)
+      elif start < end:
+        spans.append((start, end))
+    return spans
+
+  def _gaps(self) -> list[str]:
+    """
+    :return: the parts of the text between the emotes
+    """
+    gaps = []
+    position = 0
+    for start, end in self.emote_spans:
+      if start > position:
+        gaps.append(self.text[position:start])
+      position = end
+    if position < self.length:
+      gaps.append(self.text[position:])
+    return gaps
+
+  @cached_property
+  def stripped_text(self) -> str:
+    """
+    the text without the characters of any emote
+    """
+    return ''.join(self._gaps())
+
+  @cached_property
+  def _stripped_counts(self) -> tuple[int, int]:
+    """
+    :return: the number of upper case letters and of characters outside of emotes, counted in one pass over the gaps
+    """
+    caps = 0
+    length = 0
+    for gap in self._gaps():
+      caps += count_caps(gap)
+      length += len(gap)
+    return caps, length
+
+  @cached_property
+  def caps(self) -> int:
+    """
+    the number of upper case letters in the text
+    """
+    return count_caps(self.text)
+
+  @property
+  def stripped_caps(self) -> int:
+    """
+    the number of upper case letters outside of emotes
+    """
+    if self.caps == 0:
+      return 0
+    return self._stripped_counts[0]
+
+  @property
+  def stripped_length(self) -> int:
+    """
+    the number of characters outside of emotes
+    """
+    return self._stripped_counts[1]
+
+  @cached_property
+  def words(self) -> int:
+    return self.text.count(' ') + 1
+
+  @cached_property
+  def symbols(self) -> tuple[bool, Optional[str]]:
+    """
+    :return: whether the text contains symbols and the name of the range of the first one (see textutil.contains_symbols)
+    """
+    return textutil.contains_symbols(self.text)
+
+  @cached_property
+  def urls(self) -> list[tuple[int, int]]:
+    """
+    the start and end of every url in the text
+    """
+    return [match.span() for match in URL_REGEX.finditer(self.text)]
+
+  @cached_property
+  def longest_barcode(self) -> int:
+    """
+    the length of the longest run of I and l in the text
+    """
+    return max((len(match) for match in BARCODE_REGEX.findall(self.text)), default=0)
+
+def get_message_analysis(bot : Bot, message : BotMessage) -> MessageAnalysis:
+  """
+  :return: the analysis shared by all plugins handling the message, stored in its custom_data
+  """
+  analysis = message.custom_data.get("analysis")
+  if analysis is None:
+    analysis = MessageAnalysis(bot, message)
+    message.custom_data["analysis"] = analysis
+  return analysis
+
 def get_moderation_meta(bot : Bot, chatter : IrcChatter, mod : str) -> ModerationMeta:
   count = bot.datastore.get(chatter, "mod.%s.count" % mod, 0)
   time = bot.datastore.get(chatter, "mod.%s.time" % mod, 0)
@@ -81,4 +232,40 @@ def get_tiered_moderation_action(chatter : IrcChatter, actions : dict, count : i
     }
     moderation_action.response = textutil.substitute_variables(text, data)
 
-  return moderation_action
\ No newline at end of file
+  return moderation_action
+
+def get_max_moderation_action(actions : dict) -> ModerationAction:
+  """
+  :return: the harshest action any tier can result in, timeouts that grow with the count last forever
+  """
+  harshest = ModerationAction(ModerationActionType.Nothing)
+  for action in actions:
+    mod_action = action["mod_action"]
+    mod_action_type = mod_action["type"]
+    if mod_action_type == "remove_message":
+      candidate = ModerationAction(ModerationActionType.RemoveMessage)
+    elif mod_action_type == "timeout":
+      duration = mod_action.get("constant", 600)
+      if mod_action.get("linear", 0) > 0 or mod_action.get("quadratic", 0) > 0:
+        duration = float("inf")
+      candidate = ModerationAction(ModerationActionType.Timeout, duration)
+    elif mod_action_type == "ban":
+      candidate = ModerationAction(ModerationActionType.Ban)
+    else:
+      continue
+    if candidate.severity > harshest.severity:
+      harshest = candidate
+  return harshest
+
+class ModerationPlugin(Plugin):
+  """
+  base of the moderation extensions, their config holds the tiered actions under 'actions' once it is loaded
+  """
+  def __init__(self, bot : Bot):
+    super().__init__(bot)
+    self.config : Optional[dict] = None
+
+  def get_max_moderation_action(self) -> Optional[ModerationAction]:
+    if self.config is None or self.config.get('actions') is None:
+      return None # Unknown until the config is loaded, the plugin is never skipped
+    return get_max_moderation_action(self.config['actions'])
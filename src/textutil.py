@@ -1,3 +1,6 @@
+import re
+from bisect import bisect_right
+from functools import lru_cache
 from typing import Any, Optional, Union
 
 def substitute_variables(text : str, data : dict[str, Any]) -> str:
@@ -25,104 +28,137 @@ def substitute_variables(text : str, data : dict[str, Any]) -> str:
 
   return result
 
-def _is_in_range(char : chr, start : Union[int, chr], end : Union[int, chr]):
+# Source: https://unicode-table.com/en/blocks/emoticons/
+SYMBOL_RANGES = {
+  # Arrows
+  "Simple arrows": ['←', '↙'],
+  "Arrows with modifications": ['↚', '↯'],
+  "Arrows with bent tips": ['↰', '↳'],
+  "Keyboard symbols and circle arrows": ['↴', '↻'],
+  "Harpoons": ['↼', '⇃'],
+  "Paired arrows and harpoons": ['⇄', '⇌'],
+  "Double arrows": ['⇍', '⇙'],
+  "Miscellaneous arrows and keyboard symbols": ['⇚', '⇥'],
+  "White arrows and keyboard symbols": ['⇦', '⇳'],
+  "Miscellaneous arrows": ['⇴', '⇿'],
+
+  # Supplemental Arrows-A
+  "Arrows": ['⟰', '⟴'],
+  "Long arrows": ['⟵', '⟿'],
+
+  # Supplemental Arrows-B
+  "Miscellaneous arrows 2": ['⤀', '⤘'],
+  "Arrow tails": ['⤙', '⤜'],
+  "Miscellaneous arrows 3": ['⤝', '⤦'],
+  "Crossing arrows for knot theory": ['⤧', '⤲'],
+  "Miscellaneous curved arrows": ['⤳', '⥁'],
+  "Arrows combined with operators": ['⥂', '⥉'],
+  "Double-barbed harpoons": ['⥊', '⥑'],
+  "Modified harpoons": ['⥒', '⥡'],
+  "Paired harpoons": ['⥢', '⥯'],
+  "Miscellaneous arrow": ['⥰', '⥰'],
+  "Arrows combined with relations": ['⥱', '⥻'],
+  "Fish tails": ['⥼', '⥿'],
+
+  # OCR
+  "OCR-A": ['⑀', '⑅'],
+  "MICR": ['⑆', '⑉'],
+  "OCR": ['⑊', 0x245F],
+
+  # Enclosed Alphanumerics
+  "Circled numbers": ['①', '⑳'],
+  "Parenthesized numbers": ['⑴', '⒇'],
+  "Numbers period": ['⒈', '⒛'],
+  "Parenthesized Latin letters": ['⒜', '⒵'],
+  "Circled Latin letters": ['Ⓐ', 'ⓩ'],
+  "Additional circled number": ['⓪', '⓪'],
+  "White on black circled numbers": ['⓫', '⓴'],
+  "Double circled numbers": ['⓵', '⓾'],
+  "Additional white on black circled number": ['⓿', '⓿'],
+
+  # Box Drawing
+  "Light and heavy solid lines": ['─', '┃'],
+  "Light and heavy dashed lines": ['┄', '┋'],
+  "Light and heavy line box components": ['┌', '╋'],
+  "Light and heavy dashed lines 2": ['╌', '╏'],
+  "Double lines": ['═', '║'],
+  "Light and double line box components": ['╒', '╬'],
+  "Character cell arcs": ['╭', '╰'],
+  "Character cell diagonals": ['╱', '╳'],
+  "Light and heavy half lines": ['╴', '╻'],
+  "Mixed light and heavy lines": ['╼', '╿'],
+
+  # Block Elements
+  "Block elements": ['▀', '▐'],
+  "Shade characters": ['░', '▓'],
+  "Block elements 2": ['▔', '▕'],
+  "Terminal graphic characters": ['▖', '▟'],
+
+  # Geometric shapes
+  "Geometric shapes": ['■', '◯'],
+  "Control code graphics": ['◰', '◷'],
+  "Geometric shapes 2": ['◸', '◿'],
+
+  # Miscellaneous Symbols
+  "Miscellaneous Symbols": ['☀', '⛿'],
+  "Dingbats": ['✀', '➿'],
+  "Mahjong Tiles": ['🀀', '🀯'],
+  "Domino Tiles": ['🀰', '🂟'],
+  "Playing Cards": ['🂠', '🃿'],
+  "Chess Symbols": ['🨀', '🩟'],
+  "Xiangqi symbols": ['🩠', '🩯'],
+
+  # Braille Patterns
+  "Braille patterns": ['⠀', '⣿']
+}
+
+def _codepoint(char : Union[int, str]) -> int:
+  if isinstance(char, int):
+    return char
+  return ord(char)
+
+_SYMBOL_CODEPOINTS = [(name, _codepoint(start), _codepoint(end)) for name, (start, end) in SYMBOL_RANGES.items()]
+# Matches any character of any symbol range
+_SYMBOL_PATTERN = re.compile("[%s]" % "".join("%s-%s" % (re.escape(chr(start)), re.escape(chr(end))) for _, start, end in _SYMBOL_CODEPOINTS))
+
+@lru_cache(maxsize=4096)
+def _get_symbol_range(char : str) -> Optional[str]:
+  """
+  :return: the name of the first range containing the character or None, cached per character
+  """
   c = ord(char)
-
-  if not isinstance(start, int):
-    start = ord(start)
-  if not isinstance(end, int):
-    end = ord(end)
-
-  return start <= c <= end
+  for name, start, end in _SYMBOL_CODEPOINTS:
+    if start <= c <= end:
+      return name
+  return None
 
 def contains_symbols(raw : str) -> (bool, Optional[str]):
-  # Source: https://unicode-table.com/en/blocks/emoticons/
-
-  ranges = {
-    # Arrows
-    "Simple arrows": ['←', '↙'],
-    "Arrows with modifications": ['↚', '↯'],
-    "Arrows with bent tips": ['↰', '↳'],
-    "Keyboard symbols and circle arrows": ['↴', '↻'],
-    "Harpoons": ['↼', '⇃'],
-    "Paired arrows and harpoons": ['⇄', '⇌'],
-    "Double arrows": ['⇍', '⇙'],
-    "Miscellaneous arrows and keyboard symbols": ['⇚', '⇥'],
-    "White arrows and keyboard symbols": ['⇦', '⇳'],
-    "Miscellaneous arrows": ['⇴', '⇿'],
-
-    # Supplemental Arrows-A
-    "Arrows": ['⟰', '⟴'],
-    "Long arrows": ['⟵', '⟿'],
-
-    # Supplemental Arrows-B
-    "Miscellaneous arrows 2": ['⤀', '⤘'],
-    "Arrow tails": ['⤙', '⤜'],
-    "Miscellaneous arrows 3": ['⤝', '⤦'],
-    "Crossing arrows for knot theory": ['⤧', '⤲'],
-    "Miscellaneous curved arrows": ['⤳', '⥁'],
-    "Arrows combined with operators": ['⥂', '⥉'],
-    "Double-barbed harpoons": ['⥊', '⥑'],
-    "Modified harpoons": ['⥒', '⥡'],
-    "Paired harpoons": ['⥢', '⥯'],
-    "Miscellaneous arrow": ['⥰', '⥰'],
-    "Arrows combined with relations": ['⥱', '⥻'],
-    "Fish tails": ['⥼', '⥿'],
-
-    # OCR
-    "OCR-A": ['⑀', '⑅'],
-    "MICR": ['⑆', '⑉'],
-    "OCR": ['⑊', 0x245F],
-
-    # Enclosed Alphanumerics
-    "Circled numbers": ['①', '⑳'],
-    "Parenthesized numbers": ['⑴', '⒇'],
-    "Numbers period": ['⒈', '⒛'],
-    "Parenthesized Latin letters": ['⒜', '⒵'],
-    "Circled Latin letters": ['Ⓐ', 'ⓩ'],
-    "Additional circled number": ['⓪', '⓪'],
-    "White on black circled numbers": ['⓫', '⓴'],
-    "Double circled numbers": ['⓵', '⓾'],
-    "Additional white on black circled number": ['⓿', '⓿'],
-
-    # Box Drawing
-    "Light and heavy solid lines": ['─', '┃'],
-    "Light and heavy dashed lines": ['┄', '┋'],
-    "Light and heavy line box components": ['┌', '╋'],
-    "Light and heavy dashed lines 2": ['╌', '╏'],
-    "Double lines": ['═', '║'],
-    "Light and double line box components": ['╒', '╬'],
-    "Character cell arcs": ['╭', '╰'],
-    "Character cell diagonals": ['╱', '╳'],
-    "Light and heavy half lines": ['╴', '╻'],
-    "Mixed light and heavy lines": ['╼', '╿'],
-
-    # Block Elements
-    "Block elements": ['▀', '▐'],
-    "Shade characters": ['░', '▓'],
-    "Block elements 2": ['▔', '▕'],
-    "Terminal graphic characters": ['▖', '▟'],
-
-    # Geometric shapes
-    "Geometric shapes": ['■', '◯'],
-    "Control code graphics": ['◰', '◷'],
-    "Geometric shapes 2": ['◸', '◿'],
-
-    # Miscellaneous Symbols
-    "Miscellaneous Symbols": ['☀', '⛿'],
-    "Dingbats": ['✀', '➿'],
-    "Mahjong Tiles": ['🀀', '🀯'],
-    "Domino Tiles": ['🀰', '🂟'],
-    "Playing Cards": ['🂠', '🃿'],
-    "Chess Symbols": ['🨀', '🩟'],
-    "Xiangqi symbols": ['🩠', '🩯'],
-
-    # Braille Patterns
-    "Braille patterns": ['⠀', '⣿']
-  }
-
-  for char in raw:
-    for name, symbol_range in ranges.items():
-      if _is_in_range(char, symbol_range[0], symbol_range[1]):
-        return True, name
-  return False, None
+  match = _SYMBOL_PATTERN.search(raw)
+  if match is None:
+    return False, None
+  return True, _get_symbol_range(match.group())
+
+def contains_symbols_batch(texts : list[str]) -> list[tuple[bool, Optional[str]]]:
+  """
+  classifies many texts (e.g. a replayed capture) at once, texts without symbols are skipped by a single search
+  :return: the result of contains_symbols for every text
+  """
+  results : list[tuple[bool, Optional[str]]] = [(False, None)] * len(texts)
+  starts = []
+  offset = 0
+  for text in texts:
+    starts.append(offset)
+    offset += len(text) + 1
+  joined = "\n".join(texts) # No symbol range contains the separator
+
+  position = 0
+  while True:
+    match = _SYMBOL_PATTERN.search(joined, position)
+    if match is None:
+      break
+    index = bisect_right(starts, match.start()) - 1
+    results[index] = (True, _get_symbol_range(match.group()))
+    if index + 1 >= len(starts):
+      break
+    position = starts[index + 1] # Only the first symbol of every text matters
+  return results